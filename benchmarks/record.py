@@ -0,0 +1,61 @@
+"""Records a fixture for benchmarks/run.py (needs recgov installed).
+
+From the live site (RIDB needs an API key, as usual)::
+
+    python benchmarks/record.py fixtures/moraine.json.gz \\
+        --asset 232463 --months 2021-07 2021-08
+
+Or made up, for a campground of a given size::
+
+    python benchmarks/record.py fixtures/synthetic-100x2.json.gz \\
+        --synthetic 100 2
+"""
+import argparse
+from datetime import datetime
+
+from replay import RecordingAdapter, save_fixture, synthetic
+
+from recgov._requests import get_anonymous_session, get_session
+from recgov.availability import Availability
+
+
+def record(asset_id: int, months: list, apikey: str = None) -> dict:
+    """Fetches an asset's campsites and months, keeping the responses.
+
+    :rtype: dict
+    """
+    ridb, anonymous = get_session(apikey), get_anonymous_session()
+    recorder = RecordingAdapter()
+    for sess in (ridb, anonymous):
+        sess.mount("https://", recorder)
+    av = Availability(asset_id, session=anonymous, ridb_session=ridb)
+    av.retrieve_months(months, {}, max_workers=1)
+    return {"source": "live", "asset_id": asset_id,
+            "months": [x.date().isoformat() for x in months],
+            "responses": recorder.responses}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="where to write the fixture")
+    parser.add_argument("--asset", type=int, help="asset to record")
+    parser.add_argument("--months", nargs="+", default=[],
+                        help="months to record, e.g. 2021-07")
+    parser.add_argument("--apikey", help="RIDB key (or $RECREATION_GOV_KEY)")
+    parser.add_argument("--synthetic", nargs=2, type=int,
+                        metavar=("SITES", "MONTHS"),
+                        help="make up a campground instead")
+    args = parser.parse_args(argv)
+    if args.synthetic:
+        fixture = synthetic(args.asset or 1, *args.synthetic)
+    elif args.asset and args.months:
+        fixture = record(args.asset,
+                         [datetime.strptime(x, "%Y-%m") for x in args.months],
+                         args.apikey)
+    else:
+        parser.error("give --asset and --months, or --synthetic")
+    save_fixture(args.output, fixture)
+
+
+if __name__ == "__main__":
+    main()
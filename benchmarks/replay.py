@@ -0,0 +1,121 @@
+"""Records month and RIDB responses, and plays them back offline.
+
+A fixture is a gzipped JSON file::
+
+    {"source": "live" or "synthetic", "asset_id": 232463,
+     "months": ["2021-07-01", ...],
+     "responses": {"<full request URL>": "<response body>", ...}}
+
+ReplayAdapter answers requests from a fixture, so the real session code
+(pagination, streaming JSON, retries) runs without the network.
+"""
+import gzip
+import json
+from datetime import datetime
+from io import BytesIO
+
+from requests import Request, Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from recgov._requests import SessionPaginator
+from recgov.availability import Availability
+from recgov.campsites import campsites_url
+from recgov.synthetic import campsite_records, month_responses, \
+    ridb_pages
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers GETs with recorded bodies, or 404 if there isn't one."""
+
+    def __init__(self, responses: dict):
+        super().__init__()
+        self.responses = responses
+
+    def send(self, request, **kwargs) -> Response:
+        body = self.responses.get(request.url)
+        resp = Response()
+        resp.status_code = 200 if body is not None else 404
+        resp.reason = "OK" if body is not None else "Not Found"
+        resp.headers = CaseInsensitiveDict(
+            {"Content-Type": "application/json"})
+        resp.raw = BytesIO(body.encode("utf-8") if body is not None else b"")
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Sends requests for real and keeps every good response's body."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.responses = {}
+
+    def send(self, request, **kwargs) -> Response:
+        resp = super().send(request, **kwargs)
+        if resp.status_code == 200:
+            self.responses[request.url] = resp.content.decode("utf-8")
+        return resp
+
+
+def replay_session(responses: dict) -> SessionPaginator:
+    """A session (plain: no cache or retries) that replays responses."""
+    sess = SessionPaginator()
+    sess.mount("https://", ReplayAdapter(responses))
+    return sess
+
+
+def _url(url: str, params: dict) -> str:
+    return Request("GET", url, params=params).prepare().url
+
+
+def synthetic_fixture(asset_id: int, records: list, months: dict,
+                      page_size: int = SessionPaginator.page_size) -> dict:
+    """The fixture recording would give for synthetic data.
+
+    :param records: from recgov.synthetic.campsite_records
+    :type records: [dict]
+    :param months: from recgov.synthetic.month_responses
+    :type months: dict
+    :rtype: dict
+    """
+    fetcher = Availability(asset_id, campsites={})
+    responses = {}
+    for page in ridb_pages(records, page_size):
+        params = {"limit": page_size,
+                  "offset": page["METADATA"]["SEARCH_PARAMETERS"]["OFFSET"]}
+        responses[_url(campsites_url(asset_id), params)] = json.dumps(page)
+    for month, response in months.items():
+        responses[_url(*fetcher.month_request(month))] = json.dumps(response)
+    return {"source": "synthetic", "asset_id": asset_id,
+            "months": [x.date().isoformat() for x in months],
+            "responses": responses}
+
+
+def synthetic(asset_id: int, sites: int, months: int) -> dict:
+    """A synthetic fixture for a made-up asset."""
+    records = campsite_records(sites, asset_id)
+    return synthetic_fixture(asset_id, records,
+                             month_responses(records, months))
+
+
+def save_fixture(path: str, fixture: dict) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        json.dump(fixture, fh)
+
+
+def load_fixture(path: str) -> dict:
+    """Loads a fixture, with its months as datetimes.
+
+    :rtype: dict
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        fixture = json.load(fh)
+    fixture["months"] = [datetime.strptime(x, "%Y-%m-%d")
+                         for x in fixture["months"]]
+    return fixture
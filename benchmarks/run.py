@@ -0,0 +1,273 @@
+"""Benchmarks recgov's hot paths.
+
+Each benchmark runs on synthetic campgrounds (recgov.synthetic) for every
+combination of --sites and --months, and then on every recorded fixture in
+benchmarks/fixtures (see record.py), replayed offline.  Results are JSON:
+the median and best time over --repeat runs, and the peak memory of one
+more run under tracemalloc.  With recgov installed (``pip install -e .``),
+save a run per commit and compare them::
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --sites 10 1000 --months 1 --only filter_dates
+    python benchmarks/run.py --compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from glob import glob
+from os import path
+from statistics import median
+from time import perf_counter
+
+from replay import load_fixture, replay_session, synthetic_fixture
+
+import recgov
+from recgov.availability import Availability
+from recgov.campsites import CampsiteSet, campsites_url, get_campsites
+from recgov.synthetic import campsite_records, month_responses
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+ASSET_ID = 1
+
+# Synthetic benchmarks: name to a function that takes a Dataset and returns
+# the operation to time.
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+class Dataset:
+    """A synthetic campground, with the pieces benchmarks need built on
+    first use.
+    """
+
+    def __init__(self, sites: int, months: int):
+        self.sites = sites
+        self.months = months
+        self.records = campsite_records(sites, ASSET_ID)
+        self.responses = month_responses(self.records, months)
+        self._availability = self._campsites = self._fixture = None
+
+    @property
+    def campsites(self) -> CampsiteSet:
+        if self._campsites is None:
+            self._campsites = CampsiteSet.from_list(self.records)
+        return self._campsites
+
+    @property
+    def availability(self) -> Availability:
+        if self._availability is None:
+            self._availability = merged(self.responses)
+        return self._availability
+
+    @property
+    def fixture(self) -> dict:
+        if self._fixture is None:
+            self._fixture = synthetic_fixture(ASSET_ID, self.records,
+                                              self.responses)
+        return self._fixture
+
+
+def merged(responses: dict) -> Availability:
+    av = Availability(ASSET_ID, campsites=CampsiteSet())
+    for response in responses.values():
+        av.merge_availabilities(response["campsites"])
+    return av
+
+
+@benchmark
+def campsite_availabilities(data: Dataset):
+    sites = list(data.availability.values())
+    return lambda: [x.availabilities for x in sites]
+
+
+@benchmark
+def filter_dates(data: Dataset):
+    first = min(data.responses).replace(tzinfo=timezone.utc)
+    last = max(data.responses).replace(tzinfo=timezone.utc)
+    start, end = first + timedelta(days=7), last + timedelta(days=20)
+    av = data.availability
+    return lambda: av.filter_start_date(start).filter_end_date(end)
+
+
+@benchmark
+def merge_availabilities(data: Dataset):
+    return lambda: merged(data.responses)
+
+
+# A typical campsite_filters from config.yml.
+CAMPSITE_FILTERS = {
+    "filter_by_campsite_type": {"args": ["STANDARD NONELECTRIC",
+                                         "STANDARD ELECTRIC",
+                                         "RV NONELECTRIC"]},
+    "filter_by_equipment": {"args": ["Trailer", 25]},
+    "exclude_by_campsite_type": {"args": ["RV NONELECTRIC"]}}
+
+
+@benchmark
+def apply_filters(data: Dataset):
+    """Filtering a set that has been filtered before."""
+    sites = data.campsites
+    return lambda: sites.apply_filters(CAMPSITE_FILTERS)
+
+
+@benchmark
+def apply_filters_cold(data: Dataset):
+    """Filtering a set for the first time."""
+    sites = data.campsites
+    return lambda: CampsiteSet(sites).apply_filters(CAMPSITE_FILTERS)
+
+
+@benchmark
+def paginate(data: Dataset):
+    sess = replay_session(data.fixture["responses"])
+    return lambda: list(sess.get_record_iterator(campsites_url(ASSET_ID)))
+
+
+@benchmark
+def retrieve_months(data: Dataset):
+    sess = replay_session(data.fixture["responses"])
+
+    def run():
+        av = Availability(ASSET_ID, session=sess, campsites=CampsiteSet())
+        av.retrieve_months(list(data.responses), {}, max_workers=1)
+    return run
+
+
+def replay(fixture: dict):
+    """Everything a scan does for one recorded campground."""
+    sess = replay_session(fixture["responses"])
+
+    def run():
+        campsites = get_campsites(fixture["asset_id"], session=sess)
+        av = Availability(fixture["asset_id"], session=sess,
+                          campsites=campsites)
+        av.retrieve_months(fixture["months"], {}, max_workers=1)
+        campsites.apply_filters(CAMPSITE_FILTERS).ingest_availability(av)
+    return run
+
+
+def measure(func, repeat: int) -> dict:
+    """Times func repeat times, then runs it once more for peak memory."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": median(times), "min_seconds": min(times),
+            "repeat": repeat, "peak_bytes": peak}
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=path.dirname(FIXTURES),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sites: list, months: list, only: list = None, repeat: int = 5,
+        fixtures: list = None, log=sys.stderr) -> dict:
+    """Runs the benchmarks.
+
+    :return: {"meta": {...}, "results": [...]}, ready for json.dump.
+    :rtype: dict
+    """
+    results = []
+    names = [x for x in BENCHMARKS if not only or x in only]
+    for n_sites in sites if names else []:
+        for n_months in months:
+            data = Dataset(n_sites, n_months)
+            for name in names:
+                print(f"{name} sites={n_sites} months={n_months}", file=log)
+                result = {"benchmark": name, "sites": n_sites,
+                          "months": n_months}
+                result.update(measure(BENCHMARKS[name](data), repeat))
+                results.append(result)
+    if fixtures is None:
+        fixtures = sorted(glob(path.join(FIXTURES, "*.json.gz")))
+    if not only or "replay" in only:
+        for filename in fixtures:
+            print(f"replay {filename}", file=log)
+            fixture = load_fixture(filename)
+            result = {"benchmark": "replay",
+                      "fixture": path.basename(filename),
+                      "months": len(fixture["months"])}
+            result.update(measure(replay(fixture), repeat))
+            results.append(result)
+    return {"meta": {"commit": _commit(), "version": recgov.__version__,
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "time": datetime.now(timezone.utc).isoformat()},
+            "results": results}
+
+
+def _key(result: dict) -> tuple:
+    return (result["benchmark"], result.get("fixture"), result.get("sites"),
+            result.get("months"))
+
+
+def compare(before: dict, after: dict, out=sys.stdout) -> None:
+    """Prints how each benchmark's time and memory changed."""
+    old = {_key(x): x for x in before["results"]}
+    print(f"{'benchmark':<40} {'before s':>10} {'after s':>10} {'ratio':>6} "
+          f"{'before MiB':>10} {'after MiB':>10}", file=out)
+    for result in after["results"]:
+        base = old.get(_key(result))
+        if base is None:
+            continue
+        name = " ".join(str(x) for x in _key(result) if x is not None)
+        ratio = result["seconds"] / base["seconds"] \
+            if base["seconds"] else float("inf")
+        print(f"{name:<40} {base['seconds']:>10.4f} {result['seconds']:>10.4f}"
+              f" {ratio:>6.2f} {base['peak_bytes'] / 2**20:>10.1f} "
+              f"{result['peak_bytes'] / 2**20:>10.1f}", file=out)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", nargs="+", type=int,
+                        default=[10, 100, 1000, 10000])
+    parser.add_argument("--months", nargs="+", type=int, default=[1, 12])
+    parser.add_argument("--only", nargs="+",
+                        choices=sorted(BENCHMARKS) + ["replay"],
+                        help="just these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fixtures", nargs="*",
+                        help="fixtures to replay, defaults to fixtures/*")
+    parser.add_argument("--output", help="write JSON here, not stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two saved runs instead")
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+    results = run(args.sites, args.months, args.only, args.repeat,
+                  args.fixtures)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
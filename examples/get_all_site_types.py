@@ -1,19 +1,16 @@
 """Checks availability at a set of sites I'm interested in staying at.
 """
 
-from recgov.availability import Availability
-from recgov._requests import get_session
+from recgov.cache import CampsiteCache
+from recgov.campsites import get_campsites
 from os import path, environ
-from yaml import load, FullLoader, dump
-from pprint import pprint
-import requests
-from gzip import open as gzopen
+from yaml import load, FullLoader
 
 BASEDIR=path.dirname(__file__)
 APIKEY=environ.get('RECREATION_GOV_KEY')
 
 def main():
-    sess = get_session(apikey=APIKEY)
+    cache = CampsiteCache(path.join(BASEDIR, "cache"))
 
     # Load the config file.
     with open(path.join(BASEDIR, 'config.yml'), 'rb') as fh:
@@ -22,14 +19,11 @@ def main():
     assets = [task.get('asset_id') for task in config['tasks']]
 
     campsite_types = set()
-    sites = []
 
     for asset in assets:
-        resp = sess.get_record_iterator(f"https://ridb.recreation.gov/api/v1/facilities/{asset}/campsites")
-        sites += [x for x in resp]
-        campsite_types = campsite_types.union(set([x['CampsiteType'] for x in sites]))
-    with gzopen(path.join(BASEDIR, "cache", f"campsites.yaml.gz"), 'wt') as fh:
-        dump(sites, fh)
+        # Only goes to RIDB when the cached copy is missing or stale.
+        sites = get_campsites(asset, apikey=APIKEY, cache=cache)
+        campsite_types |= sites.unique_campsite_types
 
     print (campsite_types)
 
@@ -2,4 +2,6 @@
 __version__="0.1.4"
 
 from .availability import Availability
-from .campsites import Campsite, CampsiteSet, get_campsites
\ No newline at end of file
+from .campsites import Campsite, CampsiteSet, get_campsites
+from .cache import CampsiteCache
+from .scanner import BatchScanner
@@ -1,29 +1,622 @@
-from os import environ
-from requests import Session
-from fake_useragent import UserAgent
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from hashlib import sha1
+from io import BytesIO
+import os
+from os import environ, fdopen, listdir, makedirs, path, remove, replace, \
+    stat, utime
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dump, load
+from random import uniform
+from tempfile import mkstemp
+from threading import Lock
+from time import monotonic, perf_counter, sleep, time
+from urllib.parse import urlsplit
 
+from requests import Request, Response, Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from requests.structures import CaseInsensitiveDict
 
-class SessionPaginator(Session):
+from .instrumentation import CacheEvent, RequestEvent, emit, enabled, \
+    response_bytes
+from .streaming import JSONStream
 
-    def get_record_iterator(self, *args, params=None, **kwargs):
+# A cached response body and the headers we need to revalidate it.
+CacheEntry = namedtuple("CacheEntry", ["content", "headers", "stored_at"])
 
+# Only these response headers are kept with a cache entry.
+_CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class MemoryCacheBackend:
+    """Keeps up to maxsize cache entries in memory, least recently used out.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> CacheEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheBackend:
+    """Keeps up to maxsize cache entries on disk, one pickle file per key,
+    least recently used out.
+    """
+    suffix = ".response"
+
+    def __init__(self, directory: str, maxsize: int = 4096):
+        self.directory = directory
+        self.maxsize = maxsize
+        self._lock = Lock()
+        makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        name = sha1(key.encode("utf-8")).hexdigest()
+        return path.join(self.directory, name + self.suffix)
+
+    def get(self, key: str) -> CacheEntry:
+        filename = self._path(key)
+        try:
+            with open(filename, "rb") as fh:
+                entry = CacheEntry(*load(fh))
+            # Touch the file so eviction knows it was used recently.
+            utime(filename)
+        except FileNotFoundError:
+            return None
+        except (UnpicklingError, EOFError, TypeError, ValueError):
+            # Truncated or corrupt; treat it as a miss.
+            self.delete(key)
+            return None
+        return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        fd, tmpname = mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with fdopen(fd, "wb") as fh:
+                dump(tuple(entry), fh, protocol=HIGHEST_PROTOCOL)
+            replace(tmpname, self._path(key))
+        except BaseException:
+            remove(tmpname)
+            raise
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        """Removes least recently used entries until there are maxsize."""
+        with self._lock:
+            entries = []
+            for name in listdir(self.directory):
+                if not name.endswith(self.suffix):
+                    continue
+                filename = path.join(self.directory, name)
+                try:
+                    entries.append((stat(filename).st_mtime, filename))
+                except FileNotFoundError:
+                    continue
+            entries.sort()
+            for _, filename in entries[:max(0, len(entries) - self.maxsize)]:
+                try:
+                    remove(filename)
+                except FileNotFoundError:
+                    pass
+
+
+class ResponseCache:
+    """Caches GET responses per URL and params for a short time.
+
+    Fresh entries are served without touching the network.  Once an entry
+    goes stale, we revalidate it with If-None-Match / If-Modified-Since when
+    the server gave us an ETag or Last-Modified, and reuse the body on a 304.
+
+    Attach one to a session from get_session or get_anonymous_session::
+
+        sess = get_anonymous_session(response_cache=ResponseCache(ttl=30))
+
+    and pass that session to Availability to cache the month requests.
+    """
+
+    def __init__(self, backend=None, ttl: float = 30):
+        """
+        :param backend: Where entries live, defaults to a MemoryCacheBackend
+        :type backend: MemoryCacheBackend or DiskCacheBackend, optional
+        :param ttl: How long (seconds) an entry is served without asking the
+            server, defaults to 30
+        :type ttl: float, optional
+        """
+        self.backend = backend if backend is not None \
+            else MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        """The cache key: the full URL with its (encoded) query string."""
+        return Request("GET", url, params=params).prepare().url
+
+    @property
+    def stats(self) -> dict:
+        """Hit/miss counts, so the TTL can be tuned against freshness.
+
+        Revalidated responses (304s) count as hits.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _outcome(key: str, outcome: str) -> None:
+        if enabled():
+            emit(CacheEvent(urlsplit(key).netloc, outcome))
+
+    def fetch(self, key: str, send) -> Response:
+        """Gets a response from the cache, or by calling send.
+
+        :param key: The cache key (see ResponseCache.key)
+        :type key: str
+        :param send: Called with any extra (conditional) request headers;
+            performs the request and returns the Response.
+        :type send: Callable[[dict], Response]
+        :rtype: Response
+        """
+        entry = self.backend.get(key)
+        if entry is not None and time() - entry.stored_at < self.ttl:
+            self._count("hits")
+            self._outcome(key, "hit")
+            return self._to_response(entry, key)
+
+        headers = {}
+        if entry is not None:
+            if "ETag" in entry.headers:
+                headers["If-None-Match"] = entry.headers["ETag"]
+            if "Last-Modified" in entry.headers:
+                headers["If-Modified-Since"] = entry.headers["Last-Modified"]
+        resp = send(headers)
+
+        if headers and resp.status_code == 304:
+            entry = entry._replace(stored_at=time())
+            self.backend.set(key, entry)
+            self._count("hits")
+            self._count("revalidations")
+            self._outcome(key, "revalidated")
+            return self._to_response(entry, key)
+
+        self._count("misses")
+        self._outcome(key, "miss")
+        if resp.status_code == 200:
+            self.backend.set(key, CacheEntry(
+                resp.content,
+                {k: resp.headers[k] for k in _CACHED_HEADERS
+                 if k in resp.headers},
+                time()))
+        return resp
+
+    @staticmethod
+    def _to_response(entry: CacheEntry, url: str) -> Response:
+        resp = Response()
+        resp.status_code = 200
+        resp.reason = "OK"
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(entry.headers)
+        resp._content = entry.content
+        # The body is all here; iter_content (so JSONStream) reads it from
+        # raw if it isn't marked consumed.
+        resp._content_consumed = True
+        resp.raw = BytesIO(entry.content)
+        return resp
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request to a host that keeps failing."""
+
+
+class CircuitBreaker:
+    """Stops sending requests to a host after too many failures in a row.
+
+    Once open, requests fail fast for reset_timeout seconds.  Then one
+    request is let through: if it succeeds the circuit closes again,
+    otherwise it stays open for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30, clock=monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.reset_timeout:
+                # Half open: let this one through, and hold the rest off
+                # for another reset_timeout in case it fails too.
+                self.opened_at = self.clock()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class RetryPolicy:
+    """How a RecgovSession copes with an unreliable or throttling server.
+
+    * Every request gets a timeout.
+    * Connection errors, timeouts, and retry_statuses (429 and 5xx) are
+      retried up to max_retries times, waiting as long as the server's
+      Retry-After header asks, or else a random ("full jitter") time up to
+      backoff_factor * 2**attempt seconds.
+    * Each host has a CircuitBreaker, shared by every session using this
+      policy, so a host that keeps failing isn't hammered.  A request counts
+      as one failure once it runs out of retries; 429s never count.
+    """
+    retry_statuses = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, timeout=(5, 30), max_retries: int = 4,
+                 backoff_factor: float = 0.5, max_backoff: float = 30,
+                 max_retry_after: float = 300, failure_threshold: int = 5,
+                 reset_timeout: float = 30, sleep=sleep):
+        """
+        :param timeout: requests timeout, (connect, read) seconds,
+            defaults to (5, 30)
+        :param max_retries: Retries after the first attempt, defaults to 4
+        :type max_retries: int, optional
+        :param backoff_factor: Scales the backoff, defaults to 0.5
+        :type backoff_factor: float, optional
+        :param max_backoff: Longest backoff (seconds), defaults to 30
+        :type max_backoff: float, optional
+        :param max_retry_after: Longest Retry-After we honor (seconds),
+            defaults to 300
+        :type max_retry_after: float, optional
+        :param failure_threshold: Failures in a row that open a host's
+            circuit, defaults to 5
+        :type failure_threshold: int, optional
+        :param reset_timeout: How long (seconds) a circuit stays open,
+            defaults to 30
+        :type reset_timeout: float, optional
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self._breakers = {}
+        self._lock = Lock()
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        """The circuit breaker for a host."""
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def backoff(self, attempt: int, headers=None) -> float:
+        """How long to wait before retry number attempt + 1.
+
+        :param headers: The failed response's headers, if there was one
+        :type headers: Mapping, optional
+        :rtype: float
+        """
+        if headers is not None and "Retry-After" in headers:
+            delay = _retry_after(headers["Retry-After"])
+            if delay is not None:
+                return min(delay, self.max_retry_after)
+        return uniform(0, min(self.max_backoff,
+                              self.backoff_factor * 2 ** attempt))
+
+    def admit(self, host: str) -> None:
+        """Checks that a request to host may be sent now.
+
+        :raises CircuitOpenError: If the host's circuit is open.
+        """
+        if not self.breaker(host).allow():
+            raise CircuitOpenError(f"Too many failures from {host}; "
+                                   f"not trying again yet.")
+
+    def retry_delay(self, host: str, attempt: int, status: int = None,
+                    headers=None) -> float:
+        """Records how an attempt went and decides whether to retry.
+
+        :param host: The host, for its circuit breaker
+        :type host: str
+        :param attempt: 0 for the first attempt, 1 for the first retry...
+        :type attempt: int
+        :param status: The response status, or None if the request failed
+            with a connection error or timeout
+        :type status: int, optional
+        :param headers: The response headers, if there was a response
+        :type headers: Mapping, optional
+        :return: Seconds to wait before retrying, or None to stop here.
+        :rtype: float
+        """
+        breaker = self.breaker(host)
+        if status is not None and status not in self.retry_statuses:
+            breaker.record_success()
+            return None
+        if attempt < self.max_retries:
+            return self.backoff(attempt, headers)
+        # Only a request that failed for good counts against the circuit,
+        # and a throttled (429) one doesn't: the host is up, just busy.
+        if status != 429:
+            breaker.record_failure()
+        return None
+
+    def send(self, host: str, do_request) -> Response:
+        """Sends a request, retrying as needed.
+
+        :param host: The host, for its circuit breaker
+        :type host: str
+        :param do_request: Sends the request and returns the Response
+        :type do_request: Callable[[], Response]
+        :raises CircuitOpenError: If the host's circuit is open.
+        :return: The first good response, or the last bad one once we run
+            out of retries.
+        :rtype: Response
+        """
+        attempt = 0
+        while True:
+            self.admit(host)
+            try:
+                resp = do_request()
+            except (ConnectionError, Timeout):
+                delay = self.retry_delay(host, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(host, attempt, resp.status_code,
+                                         resp.headers)
+                if delay is None:
+                    return resp
+                resp.close()
+            self.sleep(delay)
+            attempt += 1
+
+
+def _retry_after(value: str) -> float:
+    """Parses a Retry-After header: either seconds or an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+# Shared by every session the factories below make, so they share circuit
+# breakers too.
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class RecgovSession(Session):
+    """A Session that can serve GETs from a ResponseCache and retries
+    requests according to a RetryPolicy.
+    """
+    response_cache = None
+    retry_policy = None
+
+    def request(self, method, url, *args, **kwargs):
+        policy = self.retry_policy
+        if policy is not None:
+            kwargs.setdefault("timeout", policy.timeout)
+
+        def do_request() -> Response:
+            send = super(RecgovSession, self).request
+            if not enabled():
+                return send(method, url, *args, **kwargs)
+            start, resp = perf_counter(), None
+
+            def report() -> None:
+                parts = urlsplit(url)
+                emit(RequestEvent(
+                    method.upper(), parts.netloc, parts.path,
+                    None if resp is None else resp.status_code,
+                    perf_counter() - start,
+                    None if resp is None else response_bytes(resp)))
+
+            try:
+                resp = send(method, url, *args, **kwargs)
+            except BaseException:
+                report()
+                raise
+            if not kwargs.get("stream"):
+                report()
+                return resp
+            # The body hasn't been read yet; report once it's closed.
+            close = resp.close
+
+            def close_and_report() -> None:
+                resp.close = close
+                try:
+                    # Before raw is closed, while it can still say how
+                    # much it read.
+                    report()
+                finally:
+                    close()
+
+            resp.close = close_and_report
+            return resp
+
+        if policy is None:
+            return do_request()
+        return policy.send(urlsplit(url).netloc, do_request)
+
+    def get(self, url, params=None, **kwargs):
+        if self.response_cache is None:
+            return super().get(url, params=params, **kwargs)
+        request_headers = kwargs.pop("headers", None) or {}
+
+        def send(headers: dict) -> Response:
+            return super(RecgovSession, self).get(
+                url, params=params, headers=dict(request_headers, **headers),
+                **kwargs)
+
+        return self.response_cache.fetch(
+            self.response_cache.key(url, params), send)
+
+
+class SessionPaginator(RecgovSession):
+    """A Session that can walk through paginated RIDB listings."""
+    # RIDB won't return more than 50 records per request.
+    page_size = 50
+    # How many pages are requested at once after the first one.
+    max_workers = 4
+
+    def get_record_iterator(self, *args, params=None, page_size: int = None,
+                            max_workers: int = None, **kwargs):
+        """Iterates over every record in a paginated RIDB listing.
+
+        The first page tells us TOTAL_COUNT, so the remaining offsets are
+        requested concurrently on up to max_workers threads.  Records are
+        still yielded in offset order.
+
+        :param params: Query parameters for the request, defaults to None
+        :type params: dict, optional
+        :param page_size: Records per request, defaults to self.page_size
+        :type page_size: int, optional
+        :param max_workers: Concurrent page requests, defaults to
+            self.max_workers
+        :type max_workers: int, optional
+        :raises ValueError: If the number of records read doesn't match
+            TOTAL_COUNT.
+        :yield: The records, in order.
+        :rtype: Iterator[dict]
+        """
         params = params or {}
-        total_count = None
-        current_count = 0
-        while not (current_count == total_count):
-            params.update({"limit": 50, "offset": current_count})
-            resp = self.get(*args, params=params, **kwargs).json()
-            for rec in resp['RECDATA']:
-                yield rec
-            current_count += resp['METADATA']['RESULTS']['CURRENT_COUNT']
-            total_count = resp['METADATA']['RESULTS']['TOTAL_COUNT']
-            if current_count > total_count:
-                raise ValueError(f"Total records was supposed to be "
-                                 f"{total_count}, but we somehow read "
-                                 f"{current_count}!")
-
-
-def get_session(apikey: str = None) -> SessionPaginator:
+        page_size = page_size or self.page_size
+        max_workers = max_workers or self.max_workers
+
+        def get_page(offset: int) -> Response:
+            page_params = dict(params, limit=page_size, offset=offset)
+            resp = self.get(*args, params=page_params, stream=True, **kwargs)
+            resp.raise_for_status()
+            return resp
+
+        def read_page(offset: int) -> (list, dict):
+            with get_page(offset) as resp:
+                stream = JSONStream.from_response(resp)
+                return list(stream.iter_field('RECDATA')), stream.rest
+
+        # The first page's records are handed out as they're parsed.
+        with get_page(0) as resp:
+            stream = JSONStream.from_response(resp)
+            yield from stream.iter_field('RECDATA')
+        current_count, total_count = page_counts(stream.rest)
+        offsets = remaining_offsets(current_count, total_count)
+        if offsets:
+            with ThreadPoolExecutor(
+                    max_workers=min(max_workers, len(offsets))) as pool:
+                # pool.map yields in submission (offset) order.
+                for records, rest in pool.map(read_page, offsets):
+                    yield from records
+                    current_count += page_counts(rest)[0]
+        check_record_count(current_count, total_count)
+
+
+def page_counts(page: dict) -> (int, int):
+    """Gets (CURRENT_COUNT, TOTAL_COUNT) from a RIDB page."""
+    results = page['METADATA']['RESULTS']
+    return results['CURRENT_COUNT'], results['TOTAL_COUNT']
+
+
+def remaining_offsets(first_count: int, total_count: int) -> range:
+    """The offsets still to request after a first page of first_count.
+
+    Steps by what the server actually returned, in case it capped the page
+    size below what we asked for.
+    """
+    if not first_count:
+        return range(0)
+    return range(first_count, total_count, first_count)
+
+
+def check_record_count(current_count: int, total_count: int) -> None:
+    """Makes sure we read as many records as RIDB said there were.
+
+    :raises ValueError: If we didn't.
+    """
+    if current_count != total_count:
+        raise ValueError(f"Total records was supposed to be "
+                         f"{total_count}, but we somehow read "
+                         f"{current_count}!")
+
+
+def _mount_pool(sess: Session, pool_maxsize: int) -> None:
+    """Lets sess keep up to pool_maxsize connections open per host."""
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+
+
+def get_session(apikey: str = None,
+                response_cache: ResponseCache = None,
+                pool_maxsize: int = None,
+                retry_policy: RetryPolicy = None) -> SessionPaginator:
     """Gets a session with an apikey set in the headers.
 
     apikey can be provided either as an input parameter or read from the
@@ -31,6 +624,14 @@ def get_session(apikey: str = None) -> SessionPaginator:
 
     :param apikey: The API Key (from ridb.recreation.gov)., defaults to None
     :type apikey: str, optional
+    :param response_cache: Serve GETs from this cache, defaults to None
+    :type response_cache: ResponseCache, optional
+    :param pool_maxsize: Connections to keep per host, for sessions shared
+        by many threads, defaults to requests' default (10)
+    :type pool_maxsize: int, optional
+    :param retry_policy: Timeouts, retries, and circuit breakers, defaults
+        to DEFAULT_RETRY_POLICY
+    :type retry_policy: RetryPolicy, optional
     :raises RuntimeError: If you don't provide an apikey as described above.
     :return: a requests Session that's authenticated.
     :rtype: requests.Session
@@ -44,11 +645,98 @@ def get_session(apikey: str = None) -> SessionPaginator:
     headers = {"apikey": apikey}
     sess = SessionPaginator()
     sess.headers.update(headers)
+    sess.response_cache = response_cache
+    sess.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+    if pool_maxsize:
+        _mount_pool(sess, pool_maxsize)
     return sess
 
 
-def get_anonymous_session():
-    HEADERS = {'User-Agent': UserAgent().random}
-    sess = Session()
+_user_agent = None
+_user_agent_lock = Lock()
+_default_sessions = {}
+_default_lock = Lock()
+
+
+def _reset_default_sessions() -> None:
+    """Forked children must not share their parent's connections."""
+    global _default_lock, _user_agent_lock
+    _default_lock, _user_agent_lock = Lock(), Lock()
+    _default_sessions.clear()
+
+
+# Windows can't fork (and has no register_at_fork).
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_default_sessions)
+
+
+def random_user_agent() -> str:
+    """Picks a random browser User-Agent string.
+
+    fake_useragent loads its data when first used, so we don't import it
+    until somebody actually needs a User-Agent.
+
+    :rtype: str
+    """
+    global _user_agent
+    with _user_agent_lock:
+        if _user_agent is None:
+            from fake_useragent import UserAgent
+            _user_agent = UserAgent()
+    return _user_agent.random
+
+
+def get_anonymous_session(response_cache: ResponseCache = None,
+                          pool_maxsize: int = None,
+                          retry_policy: RetryPolicy = None) -> RecgovSession:
+    """Gets a session with a random browser User-Agent.
+
+    :param response_cache: Serve GETs from this cache, defaults to None
+    :type response_cache: ResponseCache, optional
+    :param pool_maxsize: Connections to keep per host, for sessions shared
+        by many threads, defaults to requests' default (10)
+    :type pool_maxsize: int, optional
+    :param retry_policy: Timeouts, retries, and circuit breakers, defaults
+        to DEFAULT_RETRY_POLICY
+    :type retry_policy: RetryPolicy, optional
+    :rtype: RecgovSession
+    """
+    HEADERS = {'User-Agent': random_user_agent()}
+    sess = RecgovSession()
     sess.headers.update(HEADERS)
+    sess.response_cache = response_cache
+    sess.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+    if pool_maxsize:
+        _mount_pool(sess, pool_maxsize)
+    return sess
+
+
+def _get_default(key, factory):
+    sess = _default_sessions.get(key)
+    if sess is None:
+        with _default_lock:
+            sess = _default_sessions.get(key)
+            if sess is None:
+                sess = _default_sessions[key] = factory()
     return sess
+
+
+def default_anonymous_session() -> RecgovSession:
+    """The shared anonymous session, built the first time it's needed.
+
+    :rtype: RecgovSession
+    """
+    return _get_default(None, get_anonymous_session)
+
+
+def default_session(apikey: str = None) -> SessionPaginator:
+    """The shared RIDB session for an apikey, built the first time it's
+    needed.
+
+    :param apikey: The API Key, defaults to $RECREATION_GOV_KEY
+    :type apikey: str, optional
+    :rtype: SessionPaginator
+    """
+    apikey = apikey or environ.get("RECREATION_GOV_KEY")
+    return _get_default(("ridb", apikey),
+                        lambda: get_session(apikey=apikey))
@@ -0,0 +1,347 @@
+"""asyncio counterparts of Availability, get_campsites and SessionPaginator.
+
+These need aiohttp (``pip install recgov[async]``).  Requests and parsing
+are shared with the blocking versions, so results are identical; only the
+I/O differs.  A single event loop can keep as many requests in flight as the
+session's connection limit allows::
+
+    async with get_async_anonymous_session() as session:
+        av = await AsyncAvailability.create(232463, session=session)
+        result = await av.apply_filters(filters)
+"""
+import asyncio
+from os import environ
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from ._requests import DEFAULT_RETRY_POLICY, RetryPolicy, \
+    check_record_count, page_counts, random_user_agent, remaining_offsets
+from .availability import Availability
+from .campsites import CampsiteSet, campsites_url
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits for the same key share
+    one call.  A caller that's cancelled doesn't cancel the call for the
+    others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args, **kwargs) -> tuple:
+        """Awaits func(*args, **kwargs), or the call already running for
+        key.
+
+        :return: (result, shared), where shared is True if another caller
+            started the call.
+        :rtype: tuple
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if not shared:
+            call = self._calls[key] = asyncio.ensure_future(
+                func(*args, **kwargs))
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(call), shared
+
+
+_campsite_flights = AsyncSingleFlight()
+_month_flights = AsyncSingleFlight()
+
+
+def _require_aiohttp() -> None:
+    if aiohttp is None:
+        raise RuntimeError("recgov.aio needs aiohttp: "
+                           "pip install recgov[async]")
+
+
+class AsyncSessionPaginator:
+    """Wraps an aiohttp ClientSession with our RetryPolicy and RIDB
+    pagination.
+    """
+    # RIDB won't return more than 50 records per request.
+    page_size = 50
+    # How many pages are requested at once after the first one.
+    max_workers = 4
+
+    def __init__(self, client, retry_policy: RetryPolicy = None):
+        """
+        :param client: The aiohttp session to send requests with
+        :type client: aiohttp.ClientSession
+        :param retry_policy: Retries and circuit breakers, defaults to
+            DEFAULT_RETRY_POLICY
+        :type retry_policy: RetryPolicy, optional
+        """
+        self.client = client
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def get_json(self, url: str, params: dict = None) -> dict:
+        """GETs a URL and parses the JSON response, retrying like
+        RecgovSession does.
+
+        :raises aiohttp.ClientResponseError: If the server still says no
+            after our retries.
+        :rtype: dict
+        """
+        policy = self.retry_policy
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            policy.admit(host)
+            try:
+                async with self.client.get(url, params=params) as resp:
+                    delay = policy.retry_delay(host, attempt, resp.status,
+                                               resp.headers)
+                    if delay is None:
+                        resp.raise_for_status()
+                        return await resp.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                delay = policy.retry_delay(host, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_record_iterator(self, url: str, params: dict = None,
+                                  page_size: int = None,
+                                  max_workers: int = None):
+        """Iterates over every record in a paginated RIDB listing.
+
+        Like SessionPaginator.get_record_iterator, the remaining pages are
+        requested concurrently (at most max_workers at once) once the first
+        page tells us TOTAL_COUNT, and records come out in order.
+
+        :raises ValueError: If the number of records read doesn't match
+            TOTAL_COUNT.
+        :rtype: AsyncIterator[dict]
+        """
+        params = params or {}
+        page_size = page_size or self.page_size
+        semaphore = asyncio.Semaphore(max_workers or self.max_workers)
+
+        async def get_page(offset: int) -> dict:
+            async with semaphore:
+                return await self.get_json(
+                    url, dict(params, limit=page_size, offset=offset))
+
+        page = await get_page(0)
+        for rec in page['RECDATA']:
+            yield rec
+        current_count, total_count = page_counts(page)
+        tasks = [asyncio.ensure_future(get_page(x))
+                 for x in remaining_offsets(current_count, total_count)]
+        try:
+            for task in tasks:
+                page = await task
+                for rec in page['RECDATA']:
+                    yield rec
+                current_count += page_counts(page)[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+        check_record_count(current_count, total_count)
+
+
+def _client(headers: dict, retry_policy: RetryPolicy,
+            limit: int) -> "aiohttp.ClientSession":
+    _require_aiohttp()
+    timeout = (retry_policy or DEFAULT_RETRY_POLICY).timeout
+    if isinstance(timeout, tuple):
+        timeout = aiohttp.ClientTimeout(sock_connect=timeout[0],
+                                        sock_read=timeout[1])
+    else:
+        timeout = aiohttp.ClientTimeout(total=timeout)
+    return aiohttp.ClientSession(
+        headers=headers, timeout=timeout,
+        connector=aiohttp.TCPConnector(limit=limit))
+
+
+def get_async_session(apikey: str = None, retry_policy: RetryPolicy = None,
+                      limit: int = 100) -> AsyncSessionPaginator:
+    """The async get_session: a RIDB session with an apikey.
+
+    :param apikey: The API Key, defaults to $RECREATION_GOV_KEY
+    :type apikey: str, optional
+    :param limit: Most connections open at once, defaults to 100
+    :type limit: int, optional
+    :raises RuntimeError: If there's no apikey.
+    :rtype: AsyncSessionPaginator
+    """
+    apikey = apikey or environ.get("RECREATION_GOV_KEY")
+    if apikey is None:
+        raise RuntimeError("apikey must be provided to get_requests either"
+                           "as an input parameter or as an environment "
+                           "variable ('RECREATION_GOV_KEY')")
+    return AsyncSessionPaginator(
+        _client({"apikey": apikey}, retry_policy, limit), retry_policy)
+
+
+def get_async_anonymous_session(retry_policy: RetryPolicy = None,
+                                limit: int = 100) -> AsyncSessionPaginator:
+    """The async get_anonymous_session: a random browser User-Agent.
+
+    :param limit: Most connections open at once, defaults to 100
+    :type limit: int, optional
+    :rtype: AsyncSessionPaginator
+    """
+    return AsyncSessionPaginator(
+        _client({"User-Agent": random_user_agent()}, retry_policy, limit),
+        retry_policy)
+
+
+async def get_campsites_async(asset: int, apikey=None, cache=None,
+                              session: AsyncSessionPaginator = None,
+                              store=None) -> CampsiteSet:
+    """The async get_campsites.
+
+    :param session: The RIDB session to use, defaults to a new one for
+        apikey (closed when we're done)
+    :type session: AsyncSessionPaginator, optional
+    :param store: Look the asset up in this local copy of RIDB's export
+        first, defaults to None
+    :type store: recgov.ridb.RIDBStore, optional
+    :rtype: CampsiteSet
+    """
+    if store is not None:
+        campsites = store.get(asset)
+        if campsites is not None:
+            return campsites
+    if cache is not None:
+        campsites = cache.get(asset)
+        if campsites is not None:
+            return campsites
+    url = campsites_url(asset)
+    campsites, shared = await _campsite_flights.do(
+        (id(session) if session is not None else apikey, url),
+        _fetch_campsites, url, apikey, session)
+    if shared:
+        return CampsiteSet(campsites)
+    if cache is not None:
+        cache.put(asset, campsites)
+    return campsites
+
+
+async def _fetch_campsites(url: str, apikey,
+                           session: AsyncSessionPaginator) -> CampsiteSet:
+    owned = session is None
+    if owned:
+        session = get_async_session(apikey)
+    try:
+        return CampsiteSet.from_list(
+            [x async for x in session.get_record_iterator(url)])
+    finally:
+        if owned:
+            await session.close()
+
+
+class AsyncAvailability(Availability):
+    """Availability, with coroutines for everything that does I/O.
+
+    Build one with ``await AsyncAvailability.create(asset_id)``, or pass
+    campsites you already have to the constructor.
+    """
+
+    def __init__(self, asset_id: int, headers=None, max_workers: int = None,
+                 session: AsyncSessionPaginator = None,
+                 campsites: CampsiteSet = None):
+        """
+        :param session: Session for the month endpoint, defaults to a new
+            anonymous one
+        :type session: AsyncSessionPaginator, optional
+        :param campsites: The asset's campsites
+        :type campsites: CampsiteSet
+        :raises ValueError: Without campsites; fetching them would block,
+            so use create() for that.
+        """
+        if campsites is None:
+            raise ValueError("AsyncAvailability needs campsites; use "
+                             "await AsyncAvailability.create(asset_id) to "
+                             "fetch them")
+        super().__init__(asset_id, headers=headers, max_workers=max_workers,
+                         session=session, campsites=campsites)
+
+    @classmethod
+    async def create(cls, asset_id: int, apikey: str = None,
+                     campsite_cache=None,
+                     ridb_session: AsyncSessionPaginator = None,
+                     store=None, **kwargs) -> "AsyncAvailability":
+        """Fetches the asset's campsites, then builds the object.
+
+        Other keyword arguments go to the constructor.
+
+        :rtype: AsyncAvailability
+        """
+        campsites = await get_campsites_async(
+            asset_id, apikey=apikey, cache=campsite_cache,
+            session=ridb_session, store=store)
+        return cls(asset_id, campsites=campsites, **kwargs)
+
+    @property
+    def session(self) -> AsyncSessionPaginator:
+        """The session used for the month endpoint.  If you didn't give us
+        one, we make one; close it with close().
+        """
+        if self._session is None:
+            self._session = get_async_anonymous_session()
+            self._owns_session = True
+        return self._session
+
+    async def close(self) -> None:
+        """Closes the session, if we made it."""
+        if getattr(self, "_owns_session", False):
+            await self._session.close()
+            self._session = None
+            self._owns_session = False
+
+    async def get_month_dict(self, month) -> dict:
+        url, params = self.month_request(month)
+        return (await _month_flights.do(
+            (id(self.session), url, params['start_date']),
+            self.session.get_json, url, params))[0]
+
+    async def iter_month(self, month):
+        """The async iter_month.  aiohttp reads the whole body, so this
+        just goes through get_month_dict's campsites.
+
+        :yield: (site id, site) pairs, ready for merge_availabilities.
+        """
+        for item in (await self.get_month_dict(month))['campsites'].items():
+            yield item
+
+    async def retrieve_month(self, month, filters: dict) -> None:
+        self.merge_availabilities((await self.get_month_dict(month))
+                                  ['campsites'])
+
+    async def retrieve_months(self, months: list, filters: dict,
+                              max_workers: int = None) -> None:
+        """Fetches months concurrently (at most max_workers at once) and
+        merges them in month order.
+        """
+        semaphore = asyncio.Semaphore(max_workers or self.max_workers)
+
+        async def get_month(month) -> dict:
+            async with semaphore:
+                return await self.get_month_dict(month)
+
+        months = await asyncio.gather(*[get_month(x) for x in months])
+        for month_dict in months:
+            self.merge_availabilities(month_dict['campsites'])
+
+    async def apply_filters(self, filters: dict, max_workers: int = None):
+        await self.retrieve_months(self.months_for(filters), filters,
+                                   max_workers=max_workers)
+        return self.filter(filters)
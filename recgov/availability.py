@@ -2,38 +2,103 @@
 These classes interface with select components in the recreation.gov API.
 
 """
-from copy import deepcopy
-from datetime import datetime
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timezone
+from os import environ
 
-from ._requests import get_anonymous_session
-from .campsites import Campsite, get_campsites
-from .utils import next_month
+from ._requests import default_anonymous_session
+from .calendars import SiteCalendar, find_stays
+from .campsites import Campsite, CampsiteSet, get_campsites
+from .export import StatusMatrix, status_matrix
+from .instrumentation import stage, timed
+from .snapshots import snapshot_month
+from .streaming import JSONStream
+from .utils import SingleFlight, month_range, next_month
 
-API_URL = "https://www.recreation.gov/api/recommendation/recommend"
-RECGOV = "https://www.recreation.gov"
-sess = get_anonymous_session()
+# Where recreation.gov is.  Point it somewhere else (like recgov.fakeserver)
+# with $RECGOV_URL, or by setting it here; it's read on every request.
+RECGOV = environ.get("RECGOV_URL", "https://www.recreation.gov")
+API_URL = RECGOV + "/api/recommendation/recommend"
+
+
+def __getattr__(name):
+    # The module used to build `sess` at import time; keep the name working
+    # without paying for it on import.
+    if name == "sess":
+        return default_anonymous_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Availability(dict):
     """This class  uses the month api to obtain availability for a campground.
     """
-    _URL_MONTH = RECGOV+"/api/camps/availability/campground/{asset_id}/month"
-    _CLICK_URL = RECGOV+"/camping/campgrounds/{asset_id}"
+    _URL_MONTH = "{recgov}/api/camps/availability/campground/{asset_id}/month"
+    _CLICK_URL = "{recgov}/camping/campgrounds/{asset_id}"
     datefmt = '%Y-%m-%dT%H:%M:%S%z'
+    # How many months are fetched at once by default.
+    max_workers = 4
+    # Concurrent get_month_dict calls for the same month share one request.
+    _month_flights = SingleFlight()
 
-    def __init__(self, asset_id: int, headers=None):
+    def __init__(self, asset_id: int, headers=None, max_workers: int = None,
+                 campsite_cache=None, session=None, ridb_session=None,
+                 campsites: CampsiteSet = None):
+        """
+        :param asset_id: the asset id from recreation.gov
+        :type asset_id: int
+        :param max_workers: How many months to fetch at once
+        :type max_workers: int, optional
+        :param campsite_cache: Passed on to get_campsites
+        :type campsite_cache: recgov.cache.CampsiteCache, optional
+        :param session: Session for the month endpoint, defaults to the
+            shared anonymous session
+        :type session: requests.Session, optional
+        :param ridb_session: Session for RIDB, passed on to get_campsites
+        :type ridb_session: SessionPaginator, optional
+        :param campsites: The asset's campsites, if you already have them;
+            otherwise they're fetched with get_campsites
+        :type campsites: CampsiteSet, optional
+        """
         self.asset_id = asset_id
-        self.campsites = get_campsites(asset_id)
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self._session = session
+        if campsites is None:
+            campsites = get_campsites(asset_id, cache=campsite_cache,
+                                      session=ridb_session)
+        self.campsites = campsites
         super().__init__()
 
-    def apply_filters(self, filters: dict):
+    @property
+    def session(self):
+        """The session used for the month endpoint."""
+        if self._session is None:
+            self._session = default_anonymous_session()
+        return self._session
+
+    def apply_filters(self, filters: dict, max_workers: int = None):
         """Checks all months  for availability, filters the result, and
            returns their results as a dict
 
+        :param max_workers: How many months to fetch concurrently, defaults
+            to self.max_workers
+        :type max_workers: int, optional
         :raises RuntimeError: If required filters missing (start_date)
         :yield: month string, dict
         :rtype: Iterator[(str, dict)]
         """
+        self.retrieve_months(self.months_for(filters), filters,
+                             max_workers=max_workers)
+        return self.filter(filters)
+
+    @staticmethod
+    def months_for(filters: dict) -> [datetime]:
+        """The months apply_filters needs to retrieve for these filters.
+
+        :raises RuntimeError: If required filters missing (start_date)
+        :rtype: [datetime]
+        """
         if 'start_date' in filters:
             sd = filters['start_date']
             start_month = datetime(sd.year, sd.month, 1)
@@ -45,41 +110,71 @@ class Availability(dict):
         else:
             # If there's no end_month, don't go forever.
             end_month = next_month(start_month)
+        return month_range(start_month, end_month)
 
-        mo = start_month
-
-        while mo <= end_month:
-            self.retrieve_month(mo, filters)
-            mo = next_month(mo)
-        return self.filter(filters)
-
+    @timed("month_fetch")
     def get_month_dict(self, month: datetime) -> dict:
         """Gets the month json object
 
         :param month: The month to get (day, hour, minute, and second squashed)
         :type month: datetime
-        :return: The monthly availability data object
+        :raises requests.HTTPError: If the server still says no after the
+            session's retries.
+        :return: The monthly availability data object.  Threads that ask
+            for the same month at the same time share one request and get
+            the same dict, so don't change it.
         :rtype: dict
         """
+        url, params = self.month_request(month)
+        key = (id(self.session), url, params['start_date'])
+        return self._month_flights.do(key, self._fetch_month, url,
+                                      params)[0]
+
+    def _fetch_month(self, url: str, params: dict) -> dict:
+        resp = self.session.get(url, params=params)
+        resp.raise_for_status()
+        with stage("json_decode"):
+            return resp.json()
+
+    def month_request(self, month: datetime) -> (str, dict):
+        """The URL and query parameters for a month.
+
+        :param month: The month to get (day, hour, minute, and second squashed)
+        :type month: datetime
+        :raises ValueError: If month isn't the first of the month at midnight
+        :rtype: (str, dict)
+        """
         # Clobber day, hour, minute, second
         if not all([month.day == 1, month.hour == 0,
                     month.minute == 0, month.second == 0]):
             raise ValueError("Month must have day=1 and h/m/s=0")
         params = {'start_date': month.isoformat() + ".000Z"}
-        resp = sess.get(self._URL_MONTH.format(
-            asset_id=self.asset_id), params=params)
-        return resp.json()
+        return self._URL_MONTH.format(recgov=RECGOV,
+                                      asset_id=self.asset_id), params
 
+    @timed("merge")
     def merge_availabilities(self, other):
-        for k, v in other.items():
+        """Merges campsites from a month response into this object.
+
+        Each site's availabilities are kept as a SiteCalendar, one byte per
+        night, rather than the dict of ISO strings the endpoint sends.
+
+        :param other: The "campsites" object from the month endpoint, or
+            its (site id, site) pairs as they're parsed
+        :type other: dict or Iterable[tuple]
+        """
+        if isinstance(other, Mapping):
+            other = other.items()
+        for k, v in other:
             if k in self:
-                if 'availabilities' in self[k]:
-                    self[k]['availabilities'].update(v['availabilities'])
-                else:
-                    self[k].merge(v)
+                self[k].setdefault('availabilities', SiteCalendar()).update(
+                    v.get('availabilities', {}))
             else:
-                self[k] = Campsite(v)
+                site = self[k] = Campsite(v)
+                site['availabilities'] = SiteCalendar(
+                    v.get('availabilities'))
 
+    @timed("month_fetch")
     def retrieve_month(self, month: datetime, filters: dict) -> list:
         """Retrieves availabilities for a month
 
@@ -88,12 +183,65 @@ class Availability(dict):
         :return: List of sites that are available, if any.
         :rtype: list
         """
-        self.merge_availabilities(self.get_month_dict(month)['campsites'])
+        self.merge_availabilities(self.iter_month(month))
+
+    def iter_month(self, month: datetime):
+        """Streams a month's campsites from the month endpoint, parsing each
+        one as it arrives rather than loading the whole response.
+
+        :param month: The month to get
+        :type month: datetime
+        :raises requests.HTTPError: If the month endpoint says no.
+        :yield: (site id, site) pairs, ready for merge_availabilities.
+        """
+        url, params = self.month_request(month)
+        with self.session.get(url, params=params, stream=True) as resp:
+            resp.raise_for_status()
+            yield from JSONStream.from_response(resp).iter_field('campsites')
+
+    def retrieve_months(self, months: list, filters: dict,
+                        max_workers: int = None) -> None:
+        """Retrieves availabilities for several months concurrently.
+
+        The month requests run on a pool of at most max_workers threads.
+        Results are merged in the order the months were given, so the
+        outcome doesn't depend on which request finishes first.
+
+        :param months: The months to check.
+        :type months: list
+        :param max_workers: How many months to fetch at once, defaults to
+            self.max_workers
+        :type max_workers: int, optional
+        """
+        months = list(months)
+        if max_workers is None:
+            max_workers = self.max_workers
+        max_workers = max(1, min(max_workers, len(months)))
+        if max_workers == 1:
+            for month in months:
+                self.retrieve_month(month, filters)
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # pool.map yields in submission order.
+            for month_dict in pool.map(self.get_month_dict, months):
+                self.merge_availabilities(month_dict['campsites'])
 
     def filter(self, filters: dict):
+        """Applies filters, returning a new object.
+
+        start_date and end_date are applied together in a single pass.
+
+        :param filters: filter name to filter parameters
+        :type filters: dict
+        :rtype: Availability
+        """
         obj = self
+        if 'start_date' in filters or 'end_date' in filters:
+            obj = obj.filter_dates(filters.get('start_date'),
+                                   filters.get('end_date'))
         for filter in filters.items():
-            obj = obj._apply_filter(filter)
+            if filter[0] not in ('start_date', 'end_date'):
+                obj = obj._apply_filter(filter)
         return obj
 
     def _apply_filter(self, filter: tuple):
@@ -110,38 +258,112 @@ class Availability(dict):
             raise RuntimeError(f"Unrecognized filter name: {filter_name}")
         return filter_function(filter_params)
 
-    def filter_start_date(self, start):
-        """Filters the object on start dates
+    def _projection(self) -> "Availability":
+        """An empty Availability sharing this one's settings and campsites.
+        """
+        obj = type(self).__new__(type(self))
+        obj.__dict__.update(self.__dict__)
+        return obj
+
+    @timed("filter_dates")
+    def filter_dates(self, start: datetime = None,
+                     end: datetime = None) -> "Availability":
+        """Keeps the nights from start through end (inclusive).
 
-        :param start: [description]
-        :type start: [type]
-        """
-        obj = deepcopy(self)
-        for data in obj.values():
-            data['availabilities'] = \
-                {
-                    k: v
-                    for k, v in data['availabilities'].items()
-                    if datetime.strptime(k, self.datefmt) >= start
-                }
+        Like the month endpoint's keys, nights are midnight UTC, so start
+        and end must be timezone aware.  Nothing is deep copied: each site
+        is a shallow copy whose calendar is a slice of the original.
+
+        :param start: earliest night to keep, defaults to None
+        :type start: datetime, optional
+        :param end: latest night to keep, defaults to None
+        :type end: datetime, optional
+        :rtype: Availability
+        """
+        lo = hi = None
+        if start is not None:
+            lo, midnight = _utc_night(start)
+            if not midnight:
+                lo += 1
+        if end is not None:
+            hi = _utc_night(end)[0] + 1
+        obj = self._projection()
+        for k, data in self.items():
+            site = obj[k] = Campsite(data)
+            site['availabilities'] = data.calendar.window(lo, hi)
         return obj
 
+    def snapshot(self, month: datetime):
+        """A compact fingerprint of one month, for change detection.
+
+        :param month: Any date in the month
+        :type month: datetime
+        :rtype: recgov.snapshots.MonthSnapshot
+        """
+        return snapshot_month(self, month)
+
+    def find_stays(self, **kwargs) -> list:
+        """Finds runs of consecutive available nights at every site.
+
+        Takes the same keyword arguments as recgov.calendars.find_stays
+        (min_nights, max_nights, arrival_start, arrival_end, weekdays,
+        limit).
+
+        :return: Stays, longest first, then by arrival.
+        :rtype: [recgov.calendars.Stay]
+        """
+        return search_stays([self], **kwargs)
+
+    def status_matrix(self, first: date = None,
+                      last: date = None) -> StatusMatrix:
+        """Every site's nights as a matrix of status codes, for export.
+        See recgov.export.status_matrix.
+
+        :rtype: recgov.export.StatusMatrix
+        """
+        return status_matrix(self, first, last)
+
+    def filter_start_date(self, start: datetime):
+        """Filters the object on start dates
+
+        :param start: earliest night to keep (timezone aware)
+        :type start: datetime
+        """
+        return self.filter_dates(start=start)
+
     def filter_end_date(self, end: datetime):
         """Filters the object on end dates
 
-        :param start: [description]
-        :type start: [type]
+        :param end: latest night to keep (timezone aware)
+        :type end: datetime
         """
-        obj = deepcopy(self)
+        return self.filter_dates(end=end)
 
-        def check_time(time: datetime):
-            return datetime.strptime(time, self.datefmt) <= end
 
-        for data in obj.values():
-            data['availabilities'] = {
-                k: v
-                for k, v in data['availabilities'].items()
-                if check_time(k)
-                }
+def search_stays(availabilities, **kwargs) -> list:
+    """Finds stays across several campgrounds in one scan.
 
-        return obj
+    Takes the same keyword arguments as recgov.calendars.find_stays.
+
+    :param availabilities: Availability objects, one per asset
+    :type availabilities: Iterable[Availability]
+    :return: Stays, longest first, then by arrival.
+    :rtype: [recgov.calendars.Stay]
+    """
+    return find_stays(((av.asset_id, k, v.calendar)
+                       for av in availabilities for k, v in av.items()),
+                      **kwargs)
+
+
+def _utc_night(when: datetime) -> tuple:
+    """Finds the UTC night a datetime falls on.
+
+    :raises TypeError: If when isn't a timezone aware datetime.
+    :return: (date ordinal, is when exactly midnight?)
+    :rtype: tuple
+    """
+    if not isinstance(when, datetime) or when.utcoffset() is None:
+        raise TypeError("Date filters must be timezone aware datetimes, "
+                        f"not {when!r}")
+    utc = when.astimezone(timezone.utc)
+    return utc.toordinal(), utc.time() == time(0)
@@ -0,0 +1,144 @@
+"""An on-disk cache for RIDB campsite metadata.
+
+Campsite listings almost never change, so there's no need to page through
+RIDB every time we build an Availability.  Entries are keyed by asset id,
+expire after a TTL, and the least recently used entries are evicted when the
+cache directory grows past max_bytes.
+"""
+from os import environ, fdopen, listdir, makedirs, path, remove, replace, \
+    stat, utime
+from pickle import UnpicklingError
+from struct import Struct, error as StructError
+from tempfile import mkstemp
+from threading import Lock
+from time import time
+from zlib import error as ZlibError
+
+from .campsites import CampsiteSet
+
+# Each file starts with the time it was stored (a double).
+_HEADER = Struct("<d")
+
+
+def default_cache_dir() -> str:
+    """Where the cache lives if you don't say otherwise.
+
+    :return: $XDG_CACHE_HOME/recgov, or ~/.cache/recgov
+    :rtype: str
+    """
+    base = environ.get("XDG_CACHE_HOME",
+                       path.join(path.expanduser("~"), ".cache"))
+    return path.join(base, "recgov")
+
+
+class CampsiteCache:
+    """Stores CampsiteSets on disk, one file per asset.
+    """
+    suffix = ".campsites"
+
+    def __init__(self, directory: str = None, ttl: float = 7 * 24 * 3600,
+                 max_bytes: int = 64 * 2**20):
+        """
+        :param directory: Where to keep the files, defaults to
+            default_cache_dir()
+        :type directory: str, optional
+        :param ttl: How long an entry stays fresh (seconds), defaults to a
+            week
+        :type ttl: float, optional
+        :param max_bytes: Evict entries once the cache is bigger than this,
+            defaults to 64 MiB
+        :type max_bytes: int, optional
+        """
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        makedirs(self.directory, exist_ok=True)
+
+    def _path(self, asset: int) -> str:
+        return path.join(self.directory, f"{int(asset)}{self.suffix}")
+
+    def get(self, asset: int) -> CampsiteSet:
+        """Gets the cached campsites for an asset.
+
+        :param asset: the asset id from recreation.gov
+        :type asset: int
+        :return: the campsites, or None if missing, stale or unreadable.
+        :rtype: CampsiteSet
+        """
+        filename = self._path(asset)
+        try:
+            with open(filename, "rb") as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return None
+        try:
+            (stored_at, ) = _HEADER.unpack_from(data)
+            if time() - stored_at > self.ttl:
+                return None
+            campsites = CampsiteSet.loads(data[_HEADER.size:])
+        except (StructError, ZlibError, UnpicklingError, EOFError):
+            # Truncated or corrupt; it's only a cache.
+            self.invalidate(asset)
+            return None
+        try:
+            # Touch the file so eviction knows it was used recently.
+            utime(filename)
+        except FileNotFoundError:
+            # Evicted since we read it; what we read is still good.
+            pass
+        return campsites
+
+    def put(self, asset: int, campsites: CampsiteSet) -> None:
+        """Stores the campsites for an asset, then trims the cache.
+
+        :param asset: the asset id from recreation.gov
+        :type asset: int
+        :param campsites: the campsites to store.
+        :type campsites: CampsiteSet
+        """
+        fd, tmpname = mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with fdopen(fd, "wb") as fh:
+                fh.write(_HEADER.pack(time()))
+                fh.write(campsites.dumps())
+            replace(tmpname, self._path(asset))
+        except BaseException:
+            remove(tmpname)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until we fit in max_bytes.
+        """
+        with self._lock:
+            entries = []
+            for name in listdir(self.directory):
+                if not name.endswith(self.suffix):
+                    continue
+                filename = path.join(self.directory, name)
+                try:
+                    st = stat(filename)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, filename))
+            total = sum(x[1] for x in entries)
+            for _, size, filename in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    remove(filename)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def invalidate(self, asset: int) -> None:
+        """Forgets an asset.
+
+        :param asset: the asset id from recreation.gov
+        :type asset: int
+        """
+        try:
+            remove(self._path(asset))
+        except FileNotFoundError:
+            pass
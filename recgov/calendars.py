@@ -0,0 +1,372 @@
+"""Compact per-night availability calendars.
+
+The month endpoint describes each campsite's nights as a dict of ISO
+timestamps to status strings, e.g. ``{"2021-03-01T00:00:00Z": "Available"}``.
+Every site repeats the same keys, so instead we keep one byte per night:
+a SiteCalendar is the ordinal of its first night plus a bytearray of small
+integer status codes.  It still behaves like the dict it replaces.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from collections.abc import Mapping, MutableMapping
+from datetime import date, timedelta
+from functools import lru_cache
+from heapq import nsmallest
+from re import compile as re_compile
+from re import escape
+from threading import Lock
+
+# Status codes are indexes into this list.  0 means we know nothing about
+# that night.  Statuses we haven't seen before are appended as they show up.
+_STATUS_NAMES = [None, "Available", "Reserved", "Not Available",
+                 "Not Reservable", "Not Reservable Management", "Open",
+                 "Closed", "Lottery"]
+_STATUS_CODES = {name: code for code, name in enumerate(_STATUS_NAMES)
+                 if name is not None}
+_status_lock = Lock()
+
+NO_DATA = 0
+AVAILABLE = _STATUS_CODES["Available"]
+
+# Every key the month endpoint hands us is midnight UTC.
+_KEY_SUFFIX = "T00:00:00Z"
+
+
+def status_code(status: str) -> int:
+    """Gets the code for a status string, assigning one if it's new.
+
+    :param status: e.g. "Available"
+    :type status: str
+    :raises ValueError: If we run out of single byte codes.
+    :rtype: int
+    """
+    code = _STATUS_CODES.get(status)
+    if code is None:
+        with _status_lock:
+            code = _STATUS_CODES.get(status)
+            if code is None:
+                code = len(_STATUS_NAMES)
+                if code > 255:
+                    raise ValueError(f"Too many distinct statuses to "
+                                     f"add {status!r}")
+                _STATUS_NAMES.append(status)
+                _STATUS_CODES[status] = code
+    return code
+
+
+def status_name(code: int) -> str:
+    """Gets the status string for a code.
+
+    :param code: a code from status_code
+    :type code: int
+    :rtype: str
+    """
+    return _STATUS_NAMES[code]
+
+
+def status_names() -> tuple:
+    """All the statuses we know about, indexed by code.
+
+    :rtype: tuple
+    """
+    return tuple(_STATUS_NAMES)
+
+
+@lru_cache(maxsize=4096)
+def key_ordinal(key: str) -> int:
+    """Parses a month endpoint key ("2021-03-01T00:00:00Z") to a date
+    ordinal.  Each distinct key is only parsed once.
+
+    :rtype: int
+    """
+    return date.fromisoformat(key[:10]).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def night_key(ordinal: int) -> str:
+    """Formats a date ordinal the way the month endpoint does.
+
+    :rtype: str
+    """
+    return date.fromordinal(ordinal).isoformat() + _KEY_SUFFIX
+
+
+# Most sites in a month response have the same keys in the same order, so
+# we remember where each key sequence lands.
+_layouts = {}
+
+
+def _layout(keys: tuple) -> tuple:
+    """Gets (first ordinal, ordinals, contiguous?) for a sequence of keys.
+    """
+    layout = _layouts.get(keys)
+    if layout is None:
+        ordinals = [key_ordinal(k) for k in keys]
+        first = ordinals[0]
+        contiguous = ordinals == list(range(first, first + len(ordinals)))
+        layout = (first, ordinals, contiguous)
+        if len(_layouts) > 256:
+            _layouts.clear()
+        _layouts[keys] = layout
+    return layout
+
+
+def _runs(code: int):
+    """A compiled pattern that matches runs of one status code."""
+    return re_compile(escape(bytes([code])) + b"+")
+
+
+_AVAILABLE_RUNS = _runs(AVAILABLE)
+
+
+class SiteCalendar(MutableMapping):
+    """One campsite's nights: a status code per night from `start`.
+
+    Keys and values look just like the month endpoint's availabilities dict.
+    """
+    __slots__ = ("start", "codes")
+
+    def __init__(self, availabilities: Mapping = None, start: int = 0,
+                 codes: bytearray = None):
+        """
+        :param availabilities: month endpoint style dict to load,
+            defaults to None
+        :type availabilities: Mapping, optional
+        :param start: date ordinal of the first code, defaults to 0
+        :type start: int, optional
+        :param codes: status codes, one per night, defaults to None
+        :type codes: bytearray, optional
+        """
+        self.start = start
+        self.codes = bytearray() if codes is None else codes
+        if availabilities:
+            self.update(availabilities)
+
+    @property
+    def end(self) -> int:
+        """The ordinal just past the last night."""
+        return self.start + len(self.codes)
+
+    def _span(self, lo: int, hi: int) -> None:
+        """Grows codes so that ordinals lo through hi - 1 fit."""
+        if not self.codes:
+            self.start = lo
+            self.codes = bytearray(hi - lo)
+            return
+        if lo < self.start:
+            self.codes[0:0] = bytes(self.start - lo)
+            self.start = lo
+        if hi > self.end:
+            self.codes.extend(bytes(hi - self.end))
+
+    def _index(self, key: str) -> int:
+        i = key_ordinal(key) - self.start
+        if i < 0 or i >= len(self.codes) or not self.codes[i]:
+            raise KeyError(key)
+        return i
+
+    def __getitem__(self, key: str) -> str:
+        return _STATUS_NAMES[self.codes[self._index(key)]]
+
+    def __setitem__(self, key: str, status: str) -> None:
+        ordinal = key_ordinal(key)
+        self._span(ordinal, ordinal + 1)
+        self.codes[ordinal - self.start] = status_code(status)
+
+    def __delitem__(self, key: str) -> None:
+        self.codes[self._index(key)] = NO_DATA
+
+    def __iter__(self):
+        start = self.start
+        for i, code in enumerate(self.codes):
+            if code:
+                yield night_key(start + i)
+
+    def __len__(self) -> int:
+        return len(self.codes) - self.codes.count(NO_DATA)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __copy__(self) -> "SiteCalendar":
+        return SiteCalendar(start=self.start, codes=bytearray(self.codes))
+
+    copy = __copy__
+
+    def __deepcopy__(self, memo) -> "SiteCalendar":
+        return self.__copy__()
+
+    def update(self, other=(), **kwargs) -> None:
+        """Merges in nights from another calendar or availabilities dict.
+
+        Whole months are copied as one slice rather than night by night.
+        """
+        if isinstance(other, SiteCalendar):
+            if other.codes:
+                self._span(other.start, other.end)
+                offset = other.start - self.start
+                if NO_DATA not in other.codes:
+                    self.codes[offset:offset + len(other.codes)] = \
+                        other.codes
+                else:
+                    for i, code in enumerate(other.codes, offset):
+                        if code:
+                            self.codes[i] = code
+        elif isinstance(other, Mapping) and other:
+            first, ordinals, contiguous = _layout(tuple(other))
+            try:
+                codes = bytes(map(_STATUS_CODES.__getitem__, other.values()))
+            except KeyError:
+                codes = bytes(map(status_code, other.values()))
+            if contiguous:
+                self._span(first, first + len(codes))
+                self.codes[first - self.start:
+                           first - self.start + len(codes)] = codes
+            else:
+                self._span(min(ordinals), max(ordinals) + 1)
+                for ordinal, code in zip(ordinals, codes):
+                    self.codes[ordinal - self.start] = code
+        elif other:
+            super().update(other)
+        if kwargs:
+            super().update(kwargs)
+
+    def count(self, status: str) -> int:
+        """How many nights have the given status."""
+        code = _STATUS_CODES.get(status)
+        return self.codes.count(code) if code else 0
+
+    def available_ranges(self) -> [(date, date)]:
+        """The runs of consecutive available nights.
+
+        :return: (first night, last night) of each run, in order.
+        :rtype: [(date, date)]
+        """
+        start = self.start
+        return [(date.fromordinal(start + m.start()),
+                 date.fromordinal(start + m.end() - 1))
+                for m in _AVAILABLE_RUNS.finditer(self.codes)]
+
+    def nights(self, lo: int, hi: int) -> bytes:
+        """The codes for ordinals lo up to hi, padded with NO_DATA.
+
+        :rtype: bytes
+        """
+        start = max(lo, self.start)
+        end = min(hi, self.end)
+        if end <= start:
+            return bytes(hi - lo)
+        return b"".join((bytes(start - lo),
+                         self.codes[start - self.start:end - self.start],
+                         bytes(hi - end)))
+
+    def window(self, lo: int = None, hi: int = None) -> "SiteCalendar":
+        """The nights from ordinal lo up to (not including) hi.
+
+        :param lo: first ordinal to keep, defaults to None (no limit)
+        :type lo: int, optional
+        :param hi: ordinal to stop at, defaults to None (no limit)
+        :type hi: int, optional
+        :return: a new calendar holding a slice of the codes.
+        :rtype: SiteCalendar
+        """
+        start = self.start if lo is None else max(lo, self.start)
+        end = self.end if hi is None else min(hi, self.end)
+        if end <= start:
+            return SiteCalendar()
+        return SiteCalendar(start=start, codes=self.codes[
+            start - self.start:end - self.start])
+
+
+class Stay(namedtuple("Stay", ["asset_id", "site_id", "arrival", "nights"])):
+    """A run of available nights at one site, starting on arrival.
+    """
+    __slots__ = ()
+
+    @property
+    def departure(self) -> date:
+        return self.arrival + timedelta(days=self.nights)
+
+
+def _stay_rank(stay: Stay) -> tuple:
+    # Longest stays first, then the earliest arrivals.
+    return (-stay.nights, stay.arrival, str(stay.asset_id),
+            str(stay.site_id))
+
+
+def find_stays(rows, min_nights: int = 1, max_nights: int = None,
+               arrival_start: date = None, arrival_end: date = None,
+               weekdays=None, limit: int = None) -> [Stay]:
+    """Finds stays of consecutive available nights across many sites.
+
+    All the calendars are joined into one buffer (separated by a "no data"
+    night) and scanned with a single regular expression for runs of at
+    least min_nights available nights, so there's no Python loop over
+    sites or nights; only over the stays that are found.
+
+    Each allowed arrival night in a run gives one stay, as long as the run
+    allows (capped at max_nights).
+
+    :param rows: (asset_id, site_id, SiteCalendar) for each site
+    :type rows: Iterable[tuple]
+    :param min_nights: shortest stay, defaults to 1
+    :type min_nights: int, optional
+    :param max_nights: longest stay to report, defaults to None (no limit)
+    :type max_nights: int, optional
+    :param arrival_start: earliest arrival, defaults to None
+    :type arrival_start: date, optional
+    :param arrival_end: latest arrival, defaults to None
+    :type arrival_end: date, optional
+    :param weekdays: allowed arrival weekdays (Monday is 0), defaults to
+        None (any day)
+    :type weekdays: Iterable[int], optional
+    :param limit: only return this many of the best stays, defaults to
+        None (all of them)
+    :type limit: int, optional
+    :return: Stays, longest first, then by arrival.
+    :rtype: [Stay]
+    """
+    if min_nights < 1:
+        raise ValueError("min_nights must be at least 1")
+    if max_nights is not None and max_nights < min_nights:
+        raise ValueError("max_nights must be at least min_nights")
+    lo = None if arrival_start is None else arrival_start.toordinal()
+    hi = None
+    if arrival_end is not None and max_nights is not None:
+        hi = arrival_end.toordinal() + max_nights
+    last_arrival = None if arrival_end is None else arrival_end.toordinal()
+    weekdays = None if weekdays is None else frozenset(weekdays)
+
+    keys, starts, offsets, chunks = [], [], [], []
+    offset = 0
+    for asset_id, site_id, calendar in rows:
+        if lo is not None or hi is not None:
+            calendar = calendar.window(lo, hi)
+        keys.append((asset_id, site_id))
+        starts.append(calendar.start)
+        offsets.append(offset)
+        chunks.append(calendar.codes)
+        offset += len(calendar.codes) + 1
+    buffer = bytes([NO_DATA]).join(chunks)
+    pattern = re_compile(escape(bytes([AVAILABLE])) + b"{%d,}" % min_nights)
+
+    def stays():
+        for m in pattern.finditer(buffer):
+            row = bisect_right(offsets, m.start()) - 1
+            first = starts[row] + m.start() - offsets[row]
+            end = first + m.end() - m.start()
+            last = end - min_nights
+            if last_arrival is not None:
+                last = min(last, last_arrival)
+            for arrival in range(first, last + 1):
+                day = date.fromordinal(arrival)
+                if weekdays is not None and day.weekday() not in weekdays:
+                    continue
+                nights = end - arrival
+                if max_nights is not None:
+                    nights = min(nights, max_nights)
+                yield Stay(*keys[row], day, nights)
+
+    if limit is None:
+        return sorted(stays(), key=_stay_rank)
+    return nsmallest(limit, stays(), key=_stay_rank)
@@ -1,13 +1,115 @@
-from datetime import date
-from itertools import groupby
+from bisect import bisect_left
+from itertools import chain
 from json import dumps
+from operator import itemgetter
+from os import environ
+from pickle import HIGHEST_PROTOCOL
+from pickle import dumps as pickle_dumps
+from pickle import loads as pickle_loads
+from sys import intern
+from zlib import compress, decompress
 
-from ._requests import get_session
+from ._requests import default_session
+from .calendars import SiteCalendar
+from .export import CAMPSITE_FIELDS, campsite_columns
+from .instrumentation import timed
+from .utils import SingleFlight
+
+# Where RIDB is.  Point it somewhere else (like recgov.fakeserver) with
+# $RIDB_URL, or by setting it here; it's read on every request.
+RIDB = environ.get("RIDB_URL", "https://ridb.recreation.gov/api/v1")
+
+# Values that repeat across thousands of sites.  They're interned so every
+# site shares one copy of each string.
+_INTERNED_FIELDS = ("CampsiteType", "Loop", "campsite_type", "loop",
+                    "type_of_use")
+_INTERNED_LIST_FIELDS = {"ATTRIBUTES": ("AttributeName", "AttributeValue"),
+                         "PERMITTEDEQUIPMENT": ("EquipmentName", )}
+
+
+def _intern_value(value):
+    return intern(value) if type(value) is str else value
 
 
 class Campsite(dict):
     """Describes a campsite object from recreation.gov
+
+    It's still the RIDB record (or month endpoint site), but the repeated
+    strings in it are interned and the derived maps and sort key are worked
+    out once.  Those caches are forgotten whenever the record changes.
     """
+    __slots__ = ("_attributes", "_equipment", "_sort_key")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._forget()
+        if args and isinstance(args[0], Campsite):
+            # Already interned; keep the caches that still apply.
+            other = args[0]
+            if 'ATTRIBUTES' not in kwargs:
+                self._attributes = getattr(other, '_attributes', None)
+            if 'PERMITTEDEQUIPMENT' not in kwargs:
+                self._equipment = getattr(other, '_equipment', None)
+            fields = kwargs
+        else:
+            fields = self
+        for field in [x for x in fields if x in _INTERNED_FIELDS or
+                      x in _INTERNED_LIST_FIELDS]:
+            self._intern(field)
+
+    def _intern(self, field: str) -> None:
+        value = self[field]
+        if field in _INTERNED_FIELDS:
+            dict.__setitem__(self, field, _intern_value(value))
+        elif isinstance(value, list):
+            names = _INTERNED_LIST_FIELDS[field]
+            for item in value:
+                if isinstance(item, dict):
+                    for name in names:
+                        if name in item:
+                            item[name] = _intern_value(item[name])
+
+    def _forget(self) -> None:
+        self._attributes = self._equipment = self._sort_key = None
+
+    def __setitem__(self, key, value) -> None:
+        self._forget()
+        super().__setitem__(key, value)
+        if key in _INTERNED_FIELDS or key in _INTERNED_LIST_FIELDS:
+            self._intern(key)
+
+    def __delitem__(self, key) -> None:
+        self._forget()
+        super().__delitem__(key)
+
+    def clear(self) -> None:
+        self._forget()
+        super().clear()
+
+    def pop(self, *args):
+        self._forget()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._forget()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs) -> None:
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def __ior__(self, other) -> 'Campsite':
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        # Pickle just the record; the caches are rebuilt when needed.
+        return (type(self), (dict(self), ))
 
     @property
     def id(self):
@@ -27,29 +129,33 @@ class Campsite(dict):
 
     @property
     def attributes(self):
-        return {x['AttributeName']: x['AttributeValue']
+        """AttributeName to AttributeValue.  Worked out once, so don't
+        change the dict you get back.
+        """
+        attributes = getattr(self, '_attributes', None)
+        if attributes is None:
+            attributes = self._attributes = {
+                x['AttributeName']: x['AttributeValue']
                 for x in self['ATTRIBUTES']}
+        return attributes
 
     @property
-    def availabilities(self):
-        avail = [date.fromisoformat(k[:10])
-                 for k, v in self.get('availabilities', dict()).items()
-                 if v == "Available"]
-        # Consolidate to ranges of dates. Adapted from
-        #   See https://docs.python.org/2.6/library/itertools.html#examples
-
-        def delta(ndx):
-            return ndx[0] - ndx[1].toordinal()
-
-        consecutive_days = [[x[1] for x in g]
-                            for k, g in groupby(enumerate(avail), delta)]
+    def calendar(self) -> SiteCalendar:
+        """The availabilities as a SiteCalendar (empty if there are none).
+        """
+        avail = self.get('availabilities', None)
+        if isinstance(avail, SiteCalendar):
+            return avail
+        return SiteCalendar(avail)
 
-        def cleanup_sets(dayset: list) -> str:
-            if len(dayset) == 1:
-                return dayset[0].isoformat()
-            return dayset[0].isoformat() + " to " + dayset[-1].isoformat()
+    @property
+    def availabilities(self):
+        def cleanup_sets(first, last) -> str:
+            if first == last:
+                return first.isoformat()
+            return first.isoformat() + " to " + last.isoformat()
 
-        return [cleanup_sets(x) for x in consecutive_days]
+        return [cleanup_sets(*x) for x in self.calendar.available_ranges()]
 
     @property
     def available_nights(self) -> int:
@@ -58,15 +164,19 @@ class Campsite(dict):
         :return: Number of nights available
         :rtype: int
         """
-        avail = [x for x in self.get(
-            'availabilities').values() if x == "Available"]
-        if avail is not None:
-            return len(avail)
+        return self.calendar.count("Available")
 
     @property
     def permitted_equipment_lengths(self):
-        return {x['EquipmentName']: x['MaxLength']
+        """EquipmentName to MaxLength.  Worked out once, so don't change
+        the dict you get back.
+        """
+        equipment = getattr(self, '_equipment', None)
+        if equipment is None:
+            equipment = self._equipment = {
+                x['EquipmentName']: x['MaxLength']
                 for x in self['PERMITTEDEQUIPMENT']}
+        return equipment
 
     def supports_equipment(self,
                            equipment_name: str,
@@ -85,17 +195,26 @@ class Campsite(dict):
     def site_url(self):
         return f"https://www.recreation.gov/camping/campsites/{self.id}"
 
+    @property
+    def sort_key(self) -> str:
+        """What sites are sorted by: the loop, then the name."""
+        key = getattr(self, '_sort_key', None)
+        if key is None:
+            key = self._sort_key = self.loop + self.name
+        return key
+
     def __gt__(self, other: "Campsite") -> bool:
-        return self.loop+self.name > other.loop+other.name
+        return self.sort_key > other.sort_key
 
     def __lt__(self, other: "Campsite") -> bool:
-        return self.loop+self.name < other.loop+other.name
+        return self.sort_key < other.sort_key
 
 
 class CampsiteSet(dict):
     """A set of Campsite objects indexed on their site id.
     """
 
+    @timed("ingest")
     def ingest_availability(self, availability: dict) -> None:
         """ingests availability data to the campsites.
 
@@ -104,7 +223,9 @@ class CampsiteSet(dict):
         """
         for k, v in availability.items():
             if k in self:
-                self[k]['availabilities'] = v['availabilities']
+                # Copy the site, since other sets may share it.
+                self[k] = Campsite(self[k],
+                                   availabilities=v['availabilities'])
 
     @staticmethod
     def from_list(campsites: list) -> 'CampsiteSet':
@@ -115,6 +236,133 @@ class CampsiteSet(dict):
         """
         return CampsiteSet({x['CampsiteID']: Campsite(x) for x in campsites})
 
+    def dumps(self) -> bytes:
+        """Serializes the campsites to a compact binary form.
+
+        :return: compressed pickle of the raw campsite records.
+        :rtype: bytes
+        """
+        return compress(pickle_dumps([dict(x) for x in self.values()],
+                                     protocol=HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def loads(data: bytes) -> 'CampsiteSet':
+        """Rebuilds a CampsiteSet from the output of dumps.
+
+        :param data: bytes from CampsiteSet.dumps
+        :type data: bytes
+        :rtype: CampsiteSet
+        """
+        return CampsiteSet.from_list(pickle_loads(decompress(data)))
+
+    # Filters apply_filters can answer from the indexes, and the method
+    # that gives the matching site ids for each.
+    _INDEXED_FILTERS = {"filter_by_equipment": "_equipment_ids",
+                        "filter_by_campsite_type": "_type_ids",
+                        "exclude_by_campsite_type": "_excluded_type_ids",
+                        "filter_by_loop": "_loop_ids"}
+
+    # The indexes are built the first time a filter needs them and thrown
+    # away whenever the set changes.
+    def _changed(self) -> None:
+        self.__dict__.pop('_indexes', None)
+
+    def __setitem__(self, key, value) -> None:
+        self._changed()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        self._changed()
+        super().__delitem__(key)
+
+    def clear(self) -> None:
+        self._changed()
+        super().clear()
+
+    def pop(self, *args):
+        self._changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._changed()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self._changed()
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs) -> None:
+        self._changed()
+        super().update(*args, **kwargs)
+
+    def __ior__(self, other) -> 'CampsiteSet':
+        self.update(other)
+        return self
+
+    def _index(self, name: str) -> dict:
+        """Gets (building it if needed) one of the indexes.
+
+        "position" maps site id to where it is in the set, "type" and
+        "loop" map a value to the ids that have it, and "equipment" maps an
+        equipment name to (sorted max lengths, ids in the same order).
+        """
+        indexes = self.__dict__.setdefault('_indexes', {})
+        index = indexes.get(name)
+        if index is None:
+            index = indexes[name] = getattr(self, f"_build_{name}_index")()
+        return index
+
+    def _build_position_index(self) -> dict:
+        return {k: i for i, k in enumerate(self)}
+
+    def _group_by(self, field: str) -> dict:
+        index = {}
+        for k, v in self.items():
+            index.setdefault(v.get(field), []).append(k)
+        return index
+
+    def _build_type_index(self) -> dict:
+        return self._group_by('CampsiteType')
+
+    def _build_loop_index(self) -> dict:
+        return self._group_by('Loop')
+
+    def _build_equipment_index(self) -> dict:
+        by_name = {}
+        for k, v in self.items():
+            for name, length in v.permitted_equipment_lengths.items():
+                by_name.setdefault(name, []).append((length, k))
+        index = {}
+        for name, pairs in by_name.items():
+            pairs.sort(key=itemgetter(0))
+            index[name] = ([x[0] for x in pairs], [x[1] for x in pairs])
+        return index
+
+    def _equipment_ids(self, equipment_name: str,
+                       equipment_length: float) -> set:
+        lengths, ids = self._index('equipment').get(equipment_name, ([], []))
+        return set(ids[bisect_left(lengths, equipment_length):])
+
+    def _values_ids(self, index: str, values) -> set:
+        index = self._index(index)
+        return set(chain.from_iterable(index.get(x, ()) for x in values))
+
+    def _type_ids(self, *types) -> set:
+        return self._values_ids('type', types)
+
+    def _excluded_type_ids(self, *types) -> set:
+        return self.keys() - self._type_ids(*types)
+
+    def _loop_ids(self, *loops) -> set:
+        return self._values_ids('loop', loops)
+
+    def _subset(self, ids) -> 'CampsiteSet':
+        """The sites with the given ids, in this set's order.  The Campsite
+        objects are shared, not copied.
+        """
+        ids = sorted(ids, key=self._index('position').__getitem__)
+        return CampsiteSet({k: self[k] for k in ids})
+
     def filter_by_equipment(self,
                             equipment_name: str,
                             equipment_length: float) -> 'CampsiteSet':
@@ -123,15 +371,12 @@ class CampsiteSet(dict):
         :return: the filtered set of campsites based on the specified equipment
         :rtype: CampsiteSet
         """
-        return CampsiteSet({x['CampsiteID']: Campsite(x)
-                            for x in self.values()
-                            if x.supports_equipment(equipment_name,
-                                                    equipment_length)
-                            })
+        return self._subset(self._equipment_ids(equipment_name,
+                                                equipment_length))
 
     @property
     def unique_campsite_types(self):
-        return set([x['CampsiteType'] for x in self.values()])
+        return set(self._index('type'))
 
     def filter_by_campsite_type(self, *types) -> 'CampsiteSet':
         """Returns a smaller set filtered by the campsite type(s)
@@ -140,8 +385,7 @@ class CampsiteSet(dict):
         :return: The filtered set
         :rtype: CampsiteSet
         """
-        return CampsiteSet({x['CampsiteID']: Campsite(x) for x in self.values()
-                            if x['CampsiteType'] in types})
+        return self._subset(self._type_ids(*types))
 
     def exclude_by_campsite_type(self, *types) -> 'CampsiteSet':
         """Returns a smaller set by excluding by the given campsite type(s)
@@ -150,34 +394,108 @@ class CampsiteSet(dict):
         :return: The filtered set
         :rtype: CampsiteSet
         """
-        return CampsiteSet({x['CampsiteID']: Campsite(x) for x in self.values()
-                            if x['CampsiteType'] not in types})
+        return self._subset(self._excluded_type_ids(*types))
+
+    def filter_by_loop(self, *loops) -> 'CampsiteSet':
+        """Returns a smaller set with only the sites in the given loop(s)
+
+        :param loops: loop names, e.g. "A"
+        :return: The filtered set
+        :rtype: CampsiteSet
+        """
+        return self._subset(self._loop_ids(*loops))
 
+    @timed("campsite_filters")
     def apply_filters(self, filters: dict) -> 'CampsiteSet':
-        result = self
+        """Applies several filters, e.g. campsite_filters from config.yml.
+
+        The filters that have an index are answered by intersecting id
+        sets from this set's indexes, so the set is only copied once.
+
+        :raises ValueError: If a filter doesn't exist.
+        :rtype: CampsiteSet
+        """
+        ids = None
+        others = []
         for filter, params in filters.items():
             if not hasattr(self, filter):
                 raise ValueError(f"Unknown filter, {filter}")
-            result = getattr(result, filter)(
-                *params.get('args', []), **params.get('kwargs', {}))
+            args = params.get('args', [])
+            kwargs = params.get('kwargs', {})
+            if filter in self._INDEXED_FILTERS:
+                found = getattr(self, self._INDEXED_FILTERS[filter])(
+                    *args, **kwargs)
+                ids = found if ids is None else ids & found
+            else:
+                others.append((filter, args, kwargs))
+        result = self if ids is None else self._subset(ids)
+        for filter, args, kwargs in others:
+            result = getattr(result, filter)(*args, **kwargs)
         return CampsiteSet(result)
 
     def with_availability(self) -> 'CampsiteSet':
         return CampsiteSet({k: v for k, v in self.items()
                             if v.available_nights > 0})
 
+    def columns(self, fields=CAMPSITE_FIELDS) -> dict:
+        """The campsites' metadata as columns, for export.  See
+        recgov.export.campsite_columns.
+
+        :rtype: dict
+        """
+        return campsite_columns(self, fields)
+
+
+# Concurrent get_campsites calls for the same listing share one fetch.
+_campsite_flights = SingleFlight()
+
+
+def campsites_url(asset: int) -> str:
+    """The RIDB listing of an asset's campsites."""
+    return f"{RIDB}/facilities/{asset}/campsites"
+
 
-def get_campsites(asset: int, apikey=None) -> CampsiteSet:
+@timed("get_campsites")
+def get_campsites(asset: int, apikey=None, cache=None,
+                  session=None, store=None) -> CampsiteSet:
     """Gets a CampsiteSet for the given asset.
 
     :param asset: the asset id from recreation.gov
     :type asset: int
     :param apikey: An API Key if you haven't set the environment variable
     :type apikey: str
-    :return: a CampsiteSet you can filter.
+    :param cache: Only ask RIDB when this cache's entry is missing or stale,
+        defaults to None
+    :type cache: recgov.cache.CampsiteCache, optional
+    :param session: The RIDB session to use, defaults to the shared one for
+        apikey
+    :type session: SessionPaginator, optional
+    :param store: Look the asset up in this local copy of RIDB's export
+        first, and only ask RIDB if it isn't there, defaults to None
+    :type store: recgov.ridb.RIDBStore, optional
+    :return: a CampsiteSet you can filter.  Callers that asked at the same
+        time as another get their own set of the same Campsites.
     :rtype: CampsiteSet
     """
-    sess = get_session(apikey=apikey)
-    resp = sess.get_record_iterator(
-        f"https://ridb.recreation.gov/api/v1/facilities/{asset}/campsites")
+    if store is not None:
+        campsites = store.get(asset)
+        if campsites is not None:
+            return campsites
+    if cache is not None:
+        campsites = cache.get(asset)
+        if campsites is not None:
+            return campsites
+    sess = session if session is not None else default_session(apikey)
+    campsites, shared = _campsite_flights.do(
+        (id(sess), campsites_url(asset)), _fetch_campsites, sess, asset)
+    if shared:
+        # Sets get changed (ingest_availability), so each caller gets one.
+        return CampsiteSet(campsites)
+    if cache is not None:
+        cache.put(asset, campsites)
+    return campsites
+
+
+def _fetch_campsites(sess, asset: int) -> CampsiteSet:
+    resp = sess.get_record_iterator(campsites_url(asset))
     return CampsiteSet({x['CampsiteID']: Campsite(x) for x in resp})
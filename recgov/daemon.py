@@ -0,0 +1,263 @@
+"""Sweeps the tasks in a config file over and over, keeping state warm.
+
+examples/check_availability.py does one sweep and exits, so every cron run
+pays for imports, new sessions, RIDB metadata and parsing the config.  The
+daemon pays once:
+
+* One BatchScanner, so one pooled session, for its whole life.
+* Each asset's CampsiteSet is kept in memory and only fetched again after
+  metadata_ttl (campsite listings hardly ever change).
+* The config is re-read when the file changes (or on SIGHUP).
+* SIGTERM and SIGINT finish the sweep in progress, then exit.
+
+so a sweep costs just the month requests it needs.  After each sweep the
+config is written to the status file with each task's results, like the
+example's status.yml.  Run it with::
+
+    recgov-daemon examples/config.yml --status status.yml --interval 300
+
+It needs PyYAML (``pip install recgov[daemon]``).
+"""
+import argparse
+import logging
+import signal
+from datetime import datetime, timezone
+from os import fdopen, path, remove, replace, stat
+from tempfile import mkstemp
+from threading import Event, Lock
+from time import monotonic
+
+from .campsites import CampsiteSet, get_campsites
+from .scanner import BatchScanner
+
+log = logging.getLogger(__name__)
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("The daemon needs PyYAML: "
+                           "pip install recgov[daemon]")
+    return yaml
+
+
+class _WarmScanner(BatchScanner):
+    """A BatchScanner that remembers each asset's campsites for a while."""
+
+    def __init__(self, metadata_ttl: float, store=None, **kwargs):
+        super().__init__(**kwargs)
+        self.metadata_ttl = metadata_ttl
+        self.store = store
+        self._metadata = {}
+        self._lock = Lock()
+
+    def get_campsites(self, asset_id: int) -> CampsiteSet:
+        with self._lock:
+            entry = self._metadata.get(asset_id)
+        if entry is not None and monotonic() - entry[1] < self.metadata_ttl:
+            return entry[0]
+        campsites = get_campsites(asset_id, apikey=self.apikey,
+                                  cache=self.campsite_cache,
+                                  session=self.ridb_session,
+                                  store=self.store)
+        with self._lock:
+            self._metadata[asset_id] = (campsites, monotonic())
+        return campsites
+
+    def forget(self, keep) -> None:
+        """Drops the metadata of assets not in keep."""
+        with self._lock:
+            for asset_id in set(self._metadata) - set(keep):
+                del self._metadata[asset_id]
+
+
+class Daemon:
+    """Runs the config's tasks every interval seconds until stopped.
+    """
+
+    def __init__(self, config_path: str, status_path: str = None,
+                 interval: float = 300, metadata_ttl: float = 24 * 3600,
+                 max_workers: int = 8, apikey: str = None,
+                 campsite_cache=None, store=None, session=None,
+                 ridb_session=None):
+        """
+        :param config_path: A config like examples/config.yml
+        :type config_path: str
+        :param status_path: Where to write results after each sweep,
+            defaults to status.yml next to the config
+        :type status_path: str, optional
+        :param interval: Seconds from the start of one sweep to the next,
+            defaults to 300
+        :type interval: float, optional
+        :param metadata_ttl: How long to keep an asset's campsites (seconds),
+            defaults to a day
+        :type metadata_ttl: float, optional
+        :param max_workers: Passed on to BatchScanner, defaults to 8
+        :type max_workers: int, optional
+        :param campsite_cache: Passed on to get_campsites
+        :type campsite_cache: recgov.cache.CampsiteCache, optional
+        :param store: Passed on to get_campsites
+        :type store: recgov.ridb.RIDBStore, optional
+        """
+        self.config_path = config_path
+        self.status_path = status_path or \
+            path.join(path.dirname(config_path), "status.yml")
+        self.interval = interval
+        self.scanner = _WarmScanner(
+            metadata_ttl, store=store, max_workers=max_workers,
+            session=session, ridb_session=ridb_session,
+            campsite_cache=campsite_cache, apikey=apikey)
+        self.config = None
+        self.sweeps = 0
+        self.stop_event = Event()
+        self._config_mtime = None
+        self._reload = False
+
+    def stop(self, *args) -> None:
+        """Stops after the sweep in progress (a signal handler, too)."""
+        self.stop_event.set()
+
+    def reload(self, *args) -> None:
+        """Re-reads the config before the next sweep (a signal handler,
+        too).
+        """
+        self._reload = True
+
+    def load_config(self) -> bool:
+        """Reads the config if it changed since we last did.
+
+        A config that won't parse is logged and the old one kept.
+
+        :return: whether it was (re)loaded
+        :rtype: bool
+        """
+        mtime = stat(self.config_path).st_mtime_ns
+        if self.config is not None and not self._reload and \
+                mtime == self._config_mtime:
+            return False
+        self._reload = False
+        yaml = _yaml()
+        try:
+            with open(self.config_path, "rb") as fh:
+                config = yaml.load(fh, Loader=yaml.FullLoader)
+            tasks = config["tasks"]
+        except Exception:
+            if self.config is None:
+                raise
+            log.exception("Keeping the old config; %s didn't load",
+                          self.config_path)
+            self._config_mtime = mtime
+            return False
+        self.config = config
+        self._config_mtime = mtime
+        self.scanner.forget(x["asset_id"] for x in tasks)
+        log.info("Loaded %d tasks from %s", len(tasks), self.config_path)
+        return True
+
+    def sweep(self) -> int:
+        """Runs every task once and writes the status file.
+
+        :return: how many tasks failed
+        :rtype: int
+        """
+        self.load_config()
+        started = datetime.now(timezone.utc)
+        failures = 0
+        for result in self.scanner.scan(self.config["tasks"]):
+            task = result.task
+            if result.error is not None:
+                failures += 1
+                log.error("%s failed: %r", task.get("name"), result.error)
+                task["status"] = {"check_completed": datetime.now(
+                    timezone.utc), "error": repr(result.error)}
+                continue
+            task["status"] = {
+                "check_completed": datetime.now(timezone.utc),
+                "duration": (datetime.now(timezone.utc) -
+                             started).total_seconds(),
+                "available_campsites": [
+                    {"site_id": val.id,
+                     "loop": val.loop,
+                     "name": val.name,
+                     "availabilities": val.availabilities,
+                     "link": val.site_url}
+                    for val in sorted(
+                        result.campsites.with_availability().values())]}
+        self.write_status()
+        self.sweeps += 1
+        return failures
+
+    def write_status(self) -> None:
+        fd, tmpname = mkstemp(suffix=".tmp", dir=path.dirname(
+            path.abspath(self.status_path)))
+        try:
+            with fdopen(fd, "wt") as fh:
+                _yaml().dump(self.config, fh)
+            replace(tmpname, self.status_path)
+        except BaseException:
+            remove(tmpname)
+            raise
+
+    def run(self, sweeps: int = None) -> None:
+        """Sweeps every interval until stopped.
+
+        :param sweeps: Stop after this many, defaults to None (until
+            stop() is called)
+        :type sweeps: int, optional
+        """
+        while not self.stop_event.is_set():
+            started = monotonic()
+            try:
+                failures = self.sweep()
+            except Exception:
+                log.exception("Sweep failed")
+            else:
+                log.info("Sweep %d took %.1fs, %d tasks failed", self.sweeps,
+                         monotonic() - started, failures)
+            if sweeps is not None and self.sweeps >= sweeps:
+                break
+            self.stop_event.wait(
+                max(0, self.interval - (monotonic() - started)))
+
+    def install_signal_handlers(self) -> None:
+        """SIGTERM and SIGINT stop; SIGHUP reloads the config."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.reload)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Checks recreation.gov availability continuously.")
+    parser.add_argument("config", help="tasks, like examples/config.yml")
+    parser.add_argument("--status", help="where to write results, defaults "
+                        "to status.yml next to the config")
+    parser.add_argument("--interval", type=float, default=300,
+                        help="seconds between sweeps")
+    parser.add_argument("--metadata-ttl", type=float, default=24 * 3600,
+                        help="seconds to keep campsite metadata")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--apikey", help="RIDB key (or $RECREATION_GOV_KEY)")
+    parser.add_argument("--ridb-store", help="an RIDBStore database to read "
+                        "campsites from first")
+    parser.add_argument("--once", action="store_true",
+                        help="sweep once and exit")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else
+                        logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    store = None
+    if args.ridb_store:
+        from .ridb import RIDBStore
+        store = RIDBStore(args.ridb_store)
+    daemon = Daemon(args.config, args.status, args.interval,
+                    args.metadata_ttl, args.workers, args.apikey, store=store)
+    daemon.install_signal_handlers()
+    daemon.run(sweeps=1 if args.once else None)
+
+
+if __name__ == "__main__":
+    main()
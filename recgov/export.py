@@ -0,0 +1,181 @@
+"""Exports campsites and availability as columns, for analytics.
+
+Everything here works on a dict of columns: column name to a sequence of
+values, all the same length.  campsite_columns builds one from a
+CampsiteSet, and status_matrix lays the nights of one or more
+Availabilities out as a (site x night) matrix of status codes, one byte
+each, built from the calendars' bytes without a Python object per night.
+
+From there, write_csv writes any of them, to_numpy makes a NumPy structured
+array and to_arrow/write_parquet an Arrow table or Parquet file.  NumPy and
+pyarrow are optional (``pip install recgov[export]``)::
+
+    matrix = status_matrix([av1, av2])
+    codes = matrix.to_numpy()        # uint8, one row per site
+    write_parquet(matrix.columns(), "nights.parquet")
+"""
+import csv
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import date
+from importlib import import_module
+
+from .calendars import status_names
+
+# The RIDB fields campsite_columns exports by default.
+CAMPSITE_FIELDS = ("CampsiteID", "FacilityID", "CampsiteName", "CampsiteType",
+                   "TypeOfUse", "Loop", "CampsiteAccessible",
+                   "CampsiteLatitude", "CampsiteLongitude")
+
+
+def _require(module: str, extra: str = "export"):
+    try:
+        return import_module(module)
+    except ImportError:
+        raise RuntimeError(f"This needs {module.split('.')[0]}: "
+                           f"pip install recgov[{extra}]") from None
+
+
+def campsite_columns(campsites, fields=CAMPSITE_FIELDS) -> dict:
+    """The campsites' metadata as columns.
+
+    :param campsites: the campsites to export
+    :type campsites: CampsiteSet or Iterable[Campsite]
+    :param fields: which RIDB fields to export (missing ones are None),
+        defaults to CAMPSITE_FIELDS
+    :type fields: Iterable[str], optional
+    :return: field name to a list of values, one per site.
+    :rtype: dict
+    """
+    if isinstance(campsites, Mapping):
+        campsites = campsites.values()
+    sites = list(campsites)
+    return {field: [x.get(field) for x in sites] for field in fields}
+
+
+class StatusMatrix(namedtuple("StatusMatrix",
+                              ["keys", "start", "nights", "codes"])):
+    """Status codes for many sites over the same nights.
+
+    keys is (asset_id, site_id) for each row; codes holds ``nights`` bytes
+    per row, row after row, for the nights from ordinal start.  A 0 means no
+    data; recgov.calendars.status_name turns the others into strings.
+    """
+    __slots__ = ()
+
+    @property
+    def dates(self) -> [date]:
+        return [date.fromordinal(self.start + i) for i in range(self.nights)]
+
+    def row(self, i: int) -> bytes:
+        return self.codes[i * self.nights:(i + 1) * self.nights]
+
+    def column(self, i: int) -> bytes:
+        """The codes of every site on the i'th night."""
+        return self.codes[i::self.nights]
+
+    def columns(self, names: bool = False) -> dict:
+        """The matrix in wide form: asset_id and site_id columns, then one
+        column per night named by its ISO date.
+
+        :param names: give status strings ("" for no data) rather than
+            codes, defaults to False
+        :type names: bool, optional
+        :rtype: dict
+        """
+        columns = {"asset_id": [x[0] for x in self.keys],
+                   "site_id": [x[1] for x in self.keys]}
+        lookup = [x or "" for x in status_names()] if names else None
+        for i, night in enumerate(self.dates):
+            column = self.column(i) if self.keys else b""
+            if lookup is not None:
+                column = [lookup[x] for x in column]
+            columns[night.isoformat()] = column
+        return columns
+
+    def to_numpy(self):
+        """The codes as a (sites x nights) uint8 array.  It shares memory
+        with codes, so it's read-only.
+
+        :rtype: numpy.ndarray
+        """
+        numpy = _require("numpy")
+        return numpy.frombuffer(self.codes, dtype=numpy.uint8).reshape(
+            len(self.keys), self.nights)
+
+
+def status_matrix(availabilities, first: date = None,
+                  last: date = None) -> StatusMatrix:
+    """Lays out the nights of one or more Availabilities as a matrix.
+
+    :param availabilities: the campgrounds to export
+    :type availabilities: Availability or Iterable[Availability]
+    :param first: first night, defaults to the earliest night with data
+    :type first: date, optional
+    :param last: last night, defaults to the latest night with data
+    :type last: date, optional
+    :rtype: StatusMatrix
+    """
+    if isinstance(availabilities, Mapping):
+        availabilities = [availabilities]
+    keys, calendars = [], []
+    for av in availabilities:
+        for site_id, site in av.items():
+            keys.append((av.asset_id, site_id))
+            calendars.append(site.calendar)
+    spans = [x for x in calendars if x.codes]
+    lo = first.toordinal() if first is not None else \
+        min([x.start for x in spans], default=0)
+    hi = last.toordinal() + 1 if last is not None else \
+        max([x.end for x in spans], default=lo)
+    hi = max(hi, lo)
+    codes = b"".join(x.nights(lo, hi) for x in calendars)
+    return StatusMatrix(keys, lo, hi - lo, codes)
+
+
+def write_csv(columns: dict, fh) -> None:
+    """Writes columns as CSV, with a header row.
+
+    :param fh: a text file, opened with ``newline=""``
+    :type fh: file
+    """
+    writer = csv.writer(fh)
+    writer.writerow(columns)
+    writer.writerows(zip(*columns.values()))
+
+
+def to_numpy(columns: dict):
+    """Makes a NumPy structured array from columns.  Code columns (bytes)
+    become uint8 fields.
+
+    :rtype: numpy.recarray
+    """
+    numpy = _require("numpy")
+    arrays = [numpy.frombuffer(x, dtype=numpy.uint8)
+              if isinstance(x, (bytes, bytearray)) else numpy.asarray(x)
+              for x in columns.values()]
+    return numpy.rec.fromarrays(arrays, names=list(columns))
+
+
+def to_arrow(columns: dict):
+    """Makes an Arrow table from columns.  Code columns (bytes) become
+    uint8 columns without being copied.
+
+    :rtype: pyarrow.Table
+    """
+    pyarrow = _require("pyarrow")
+    arrays = [pyarrow.Array.from_buffers(pyarrow.uint8(), len(x),
+                                         [None, pyarrow.py_buffer(x)])
+              if isinstance(x, (bytes, bytearray)) else pyarrow.array(x)
+              for x in columns.values()]
+    return pyarrow.table(arrays, names=list(columns))
+
+
+def write_parquet(columns: dict, where) -> None:
+    """Writes columns to a Parquet file.
+
+    :param where: a path or binary file
+    :type where: str or file
+    """
+    parquet = _require("pyarrow.parquet")
+    parquet.write_table(to_arrow(columns), where)
@@ -0,0 +1,229 @@
+"""Finds campgrounds near a place.
+
+A FacilityCatalog holds RIDB facilities in a grid of latitude/longitude
+cells, so a radius or bounding box query only looks at the facilities in
+the cells it overlaps, however many thousands there are.  The results turn
+into BatchScanner tasks, so only campgrounds in range get polled::
+
+    catalog = FacilityCatalog.from_store(RIDBStore())
+    near = catalog.within(40.34, -105.68, miles=60)
+    tasks = catalog.tasks(near, {"start_date": start, "end_date": end})
+    for result in BatchScanner().scan(tasks):
+        ...
+"""
+from collections import namedtuple
+from math import asin, ceil, cos, floor, radians, sin, sqrt
+
+from . import campsites
+from ._requests import default_session
+
+Facility = namedtuple("Facility", ["facility_id", "name", "latitude",
+                                   "longitude", "type", "reservable"])
+
+EARTH_RADIUS_MILES = 3958.8
+# Miles per degree of latitude (and of longitude at the equator).
+_MILES_PER_DEGREE = 69.09
+
+
+def distance_miles(lat1: float, lon1: float, lat2: float,
+                   lon2: float) -> float:
+    """The great circle distance between two points (haversine).
+
+    :rtype: float
+    """
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + \
+        cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * asin(min(1.0, sqrt(a)))
+
+
+def _coordinate(value) -> float:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+class FacilityCatalog:
+    """Facilities indexed by where they are.
+    """
+
+    def __init__(self, facilities, cell_degrees: float = 0.5):
+        """
+        :param facilities: Facility tuples; ones without a location (RIDB
+            uses 0, 0 for those) are left out
+        :type facilities: Iterable[Facility]
+        :param cell_degrees: The grid's cell size, defaults to 0.5 (about 35
+            miles north to south)
+        :type cell_degrees: float, optional
+        """
+        self.cell_degrees = cell_degrees
+        self._columns = ceil(360 / cell_degrees)
+        self.facilities = {}
+        self._grid = {}
+        for facility in facilities:
+            if facility.latitude is None or facility.longitude is None or \
+                    (facility.latitude == 0 and facility.longitude == 0):
+                continue
+            self.facilities[facility.facility_id] = facility
+            self._grid.setdefault(
+                self._cell(facility.latitude, facility.longitude),
+                []).append(facility)
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+    def __contains__(self, facility_id) -> bool:
+        return facility_id in self.facilities
+
+    def _row(self, latitude: float) -> int:
+        return floor((latitude + 90) / self.cell_degrees)
+
+    def _column(self, longitude: float) -> int:
+        return floor((longitude + 180) / self.cell_degrees) % self._columns
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        return self._row(latitude), self._column(longitude)
+
+    def _columns_between(self, west: float, east: float) -> [int]:
+        """Grid columns from west to east, across the antimeridian if
+        west > east.
+        """
+        first, last = self._column(west), self._column(east)
+        if east - west >= 360 or (west > east and first == last):
+            # All the way around.
+            return list(range(self._columns))
+        return [(first + i) % self._columns
+                for i in range((last - first) % self._columns + 1)]
+
+    def _candidates(self, south: float, west: float, north: float,
+                    east: float):
+        """Facilities in the cells a box overlaps."""
+        rows = range(self._row(max(-90, south)), self._row(min(90, north)) + 1)
+        for column in self._columns_between(west, east):
+            for row in rows:
+                yield from self._grid.get((row, column), ())
+
+    def in_bbox(self, south: float, west: float, north: float,
+                east: float) -> [Facility]:
+        """Facilities inside a bounding box.
+
+        :param west: Western edge; if it's east of east, the box crosses the
+            antimeridian
+        :type west: float
+        :rtype: [Facility]
+        """
+        found = []
+        for facility in self._candidates(south, west, north, east):
+            lon = facility.longitude
+            in_lon = west <= lon <= east if west <= east else \
+                lon >= west or lon <= east
+            if south <= facility.latitude <= north and in_lon:
+                found.append(facility)
+        return sorted(found, key=lambda x: x.facility_id)
+
+    def within(self, latitude: float, longitude: float,
+               miles: float) -> [Facility]:
+        """Facilities within a distance of a point.
+
+        :return: nearest first
+        :rtype: [Facility]
+        """
+        found = self.within_distances(latitude, longitude, miles)
+        return [x for _, x in found]
+
+    def within_distances(self, latitude: float, longitude: float,
+                         miles: float) -> [(float, Facility)]:
+        """Like within, with each facility's distance (in miles).
+
+        :rtype: [(float, Facility)]
+        """
+        dlat = miles / _MILES_PER_DEGREE
+        south, north = latitude - dlat, latitude + dlat
+        # How far a degree of longitude is shrinks toward the poles; near
+        # one (or for huge radii) every longitude is in range.
+        widest = max(abs(south), abs(north))
+        if widest >= 90 or \
+                miles >= _MILES_PER_DEGREE * 180 * cos(radians(widest)):
+            west, east = -180, 180
+        else:
+            dlon = dlat / cos(radians(widest))
+            west = (longitude - dlon + 180) % 360 - 180
+            east = (longitude + dlon + 180) % 360 - 180
+        found = []
+        for facility in self._candidates(south, west, north, east):
+            distance = distance_miles(latitude, longitude, facility.latitude,
+                                      facility.longitude)
+            if distance <= miles:
+                found.append((distance, facility))
+        found.sort(key=lambda x: (x[0], x[1].facility_id))
+        return found
+
+    @staticmethod
+    def tasks(facilities, availability_filters: dict,
+              campsite_filters: dict = None) -> [dict]:
+        """BatchScanner tasks for some facilities.
+
+        :param facilities: e.g. from within or in_bbox
+        :type facilities: Iterable[Facility]
+        :param availability_filters: For every task, e.g. start_date and
+            end_date
+        :type availability_filters: dict
+        :param campsite_filters: For every task, defaults to None
+        :type campsite_filters: dict, optional
+        :rtype: [dict]
+        """
+        return [{"name": x.name, "asset_id": x.facility_id,
+                 "campsite_filters": campsite_filters or {},
+                 "availability_filters": availability_filters}
+                for x in facilities]
+
+    @classmethod
+    def from_records(cls, records, **kwargs) -> "FacilityCatalog":
+        """Builds a catalog from RIDB facility records (as the API gives
+        them).
+
+        :type records: Iterable[dict]
+        :rtype: FacilityCatalog
+        """
+        return cls((Facility(int(x["FacilityID"]), x.get("FacilityName"),
+                             _coordinate(x.get("FacilityLatitude")),
+                             _coordinate(x.get("FacilityLongitude")),
+                             x.get("FacilityTypeDescription"),
+                             x.get("Reservable"))
+                    for x in records), **kwargs)
+
+    @classmethod
+    def from_store(cls, store, campgrounds: bool = True,
+                   **kwargs) -> "FacilityCatalog":
+        """Builds a catalog from an RIDBStore.
+
+        :param store: A loaded RIDB export
+        :type store: recgov.ridb.RIDBStore
+        :param campgrounds: Only facilities with campsites, defaults to True
+        :type campgrounds: bool, optional
+        :rtype: FacilityCatalog
+        """
+        return cls((Facility(x["facility_id"], x["name"], x["latitude"],
+                             x["longitude"], x["type"],
+                             None if x["reservable"] is None
+                             else bool(x["reservable"]))
+                    for x in store.facilities()
+                    if x["campsites"] or not campgrounds), **kwargs)
+
+    @classmethod
+    def from_ridb(cls, apikey: str = None, session=None, params: dict = None,
+                  **kwargs) -> "FacilityCatalog":
+        """Builds a catalog by listing facilities from RIDB.
+
+        :param params: RIDB query parameters, e.g. {"state": "CO",
+            "activity": "CAMPING"}, defaults to None (everything)
+        :type params: dict, optional
+        :param session: The RIDB session to use, defaults to the shared one
+            for apikey
+        :type session: SessionPaginator, optional
+        :rtype: FacilityCatalog
+        """
+        sess = session if session is not None else default_session(apikey)
+        return cls.from_records(sess.get_record_iterator(
+            f"{campsites.RIDB}/facilities", params=params), **kwargs)
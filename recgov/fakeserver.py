@@ -0,0 +1,286 @@
+"""A local stand-in for recreation.gov and RIDB, for load and scale testing.
+
+It serves the month endpoint and RIDB's paginated campsites listing with
+made-up campgrounds (see recgov.synthetic), in exactly the shapes the
+library parses, and can be told to misbehave: add latency, answer 429
+(with Retry-After), or return short RIDB pages so the counts don't match.
+Responses carry an ETag and honour If-None-Match, so ResponseCache
+revalidation works against it too.
+
+Use it from Python::
+
+    with FakeRecgov(assets=1000, sites=200, latency=0.05) as server, \\
+            server.pointed_at():
+        BatchScanner().scan(tasks)
+
+or run it and point other processes at it with $RECGOV_URL and $RIDB_URL::
+
+    python -m recgov.fakeserver --port 8080 --assets 1000 --throttle 0.01
+"""
+import argparse
+import json
+import re
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from hashlib import blake2b
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+
+from . import availability, campsites
+from .synthetic import campsite_records, month_response, ridb_pages
+
+_MONTH_PATH = re.compile(r"^/api/camps/availability/campground/(\d+)/month$")
+_RIDB_PATH = re.compile(r"^/api/v1/facilities/(\d+)/campsites$")
+# RIDB won't return more than this many records per page.
+_MAX_PAGE = 50
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, headers, body = self.server.fake.respond(
+            self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRecgov:
+    """A fake recreation.gov on a background thread.
+    """
+
+    def __init__(self, assets: int = 10, sites: int = 100,
+                 first_asset: int = 1, host: str = "127.0.0.1",
+                 port: int = 0, latency=0, throttle: float = 0,
+                 retry_after: float = 1, page_shortfall: int = 0,
+                 seed: int = 0):
+        """
+        :param assets: How many campgrounds there are, defaults to 10
+        :type assets: int, optional
+        :param sites: Campsites at each campground, defaults to 100
+        :type sites: int, optional
+        :param first_asset: The first asset id; the rest follow it,
+            defaults to 1
+        :type first_asset: int, optional
+        :param port: defaults to 0 (any free port)
+        :type port: int, optional
+        :param latency: Seconds to wait before answering, or a (low, high)
+            range to pick from, defaults to 0
+        :type latency: float or tuple, optional
+        :param throttle: Fraction of requests to answer with a 429,
+            defaults to 0
+        :type throttle: float, optional
+        :param retry_after: The Retry-After sent with 429s (seconds),
+            defaults to 1
+        :type retry_after: float, optional
+        :param page_shortfall: Drop this many records from every RIDB page
+            after the first, so TOTAL_COUNT doesn't add up, defaults to 0
+        :type page_shortfall: int, optional
+        :param seed: Change this to change every month's statuses,
+            defaults to 0
+        :type seed: int, optional
+        """
+        self.assets = range(first_asset, first_asset + assets)
+        self.sites = sites
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.page_shortfall = page_shortfall
+        self.seed = seed
+        self.hits = Counter()
+        self._records = {}
+        self._bodies = {}
+        self._lock = Lock()
+        self._random = Random(seed)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Where recreation.gov is (what availability.RECGOV should be)."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ridb_url(self) -> str:
+        """Where RIDB is (what campsites.RIDB should be)."""
+        return self.url + "/api/v1"
+
+    def start(self) -> "FakeRecgov":
+        if self._thread is None:
+            self._thread = Thread(target=self._httpd.serve_forever,
+                                  name="FakeRecgov", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeRecgov":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @contextmanager
+    def pointed_at(self):
+        """Points availability.RECGOV and campsites.RIDB here for a while.
+        """
+        old = availability.RECGOV, campsites.RIDB
+        availability.RECGOV, campsites.RIDB = self.url, self.ridb_url
+        try:
+            yield self
+        finally:
+            availability.RECGOV, campsites.RIDB = old
+
+    def records(self, asset_id: int) -> list:
+        """The RIDB campsite records of an asset."""
+        with self._lock:
+            records = self._records.get(asset_id)
+            if records is None:
+                records = self._records[asset_id] = campsite_records(
+                    self.sites, asset_id, self.seed)
+            return records
+
+    def _cached(self, key: tuple, build) -> bytes:
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is None:
+            body = json.dumps(build()).encode("utf-8")
+            with self._lock:
+                if len(self._bodies) > 4096:
+                    self._bodies.clear()
+                self._bodies[key] = body
+        return body
+
+    def _month(self, asset_id: int, query: dict) -> (int, bytes):
+        try:
+            month = datetime.strptime(query["start_date"][0],
+                                      "%Y-%m-%dT%H:%M:%S.000Z")
+        except (KeyError, ValueError):
+            return 400, b'{"error": "bad start_date"}'
+        if month.day != 1:
+            return 400, b'{"error": "start_date must be a first"}'
+        self.hits["month"] += 1
+        return 200, self._cached(
+            ("month", asset_id, month, self.seed),
+            lambda: month_response(self.records(asset_id), month,
+                                   self.seed * 1000003 + asset_id))
+
+    def _campsites(self, asset_id: int, query: dict) -> (int, bytes):
+        try:
+            limit = min(int(query.get("limit", [_MAX_PAGE])[0]), _MAX_PAGE)
+            offset = int(query.get("offset", [0])[0])
+        except ValueError:
+            return 400, b'{"error": "bad limit or offset"}'
+        self.hits["ridb"] += 1
+
+        def build() -> dict:
+            records = self.records(asset_id)
+            page = ridb_pages(records[offset:offset + limit], limit)[0]
+            if offset and self.page_shortfall:
+                page["RECDATA"] = page["RECDATA"][self.page_shortfall:]
+            page["METADATA"]["RESULTS"] = {
+                "CURRENT_COUNT": len(page["RECDATA"]),
+                "TOTAL_COUNT": len(records)}
+            page["METADATA"]["SEARCH_PARAMETERS"]["OFFSET"] = offset
+            return page
+
+        return 200, self._cached(("ridb", asset_id, limit, offset,
+                                  self.page_shortfall, self.seed), build)
+
+    def respond(self, target: str, headers) -> (int, dict, bytes):
+        """Works out the answer to a GET.
+
+        :param target: the request path and query
+        :type target: str
+        :param headers: the request headers
+        :type headers: Mapping
+        :return: status, headers, body
+        :rtype: (int, dict, bytes)
+        """
+        with self._lock:
+            self.hits["requests"] += 1
+            latency = self.latency
+            if isinstance(latency, tuple):
+                latency = self._random.uniform(*latency)
+            throttled = self._random.random() < self.throttle
+        if latency:
+            sleep(latency)
+        if throttled:
+            self.hits["throttled"] += 1
+            return 429, {"Retry-After": str(self.retry_after)}, b""
+
+        parts = urlsplit(target)
+        query = parse_qs(parts.query)
+        for pattern, endpoint in ((_MONTH_PATH, self._month),
+                                  (_RIDB_PATH, self._campsites)):
+            match = pattern.match(parts.path)
+            if match is not None:
+                break
+        else:
+            return 404, {}, b""
+        asset_id = int(match.group(1))
+        if asset_id not in self.assets:
+            return 404, {}, b""
+        status, body = endpoint(asset_id, query)
+        response_headers = {"Content-Type": "application/json"}
+        if status == 200:
+            etag = '"' + blake2b(body, digest_size=8).hexdigest() + '"'
+            response_headers["ETag"] = etag
+            if headers.get("If-None-Match") == etag:
+                self.hits["not_modified"] += 1
+                return 304, {"ETag": etag}, b""
+        return status, response_headers, body
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serves a fake recreation.gov and RIDB.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--assets", type=int, default=10)
+    parser.add_argument("--first-asset", type=int, default=1)
+    parser.add_argument("--sites", type=int, default=100)
+    parser.add_argument("--latency", type=float, nargs="+", default=[0],
+                        help="seconds, or a low and high to pick from")
+    parser.add_argument("--throttle", type=float, default=0,
+                        help="fraction of requests to answer with 429")
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--page-shortfall", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    latency = args.latency[0] if len(args.latency) == 1 \
+        else tuple(args.latency[:2])
+    server = FakeRecgov(args.assets, args.sites, args.first_asset,
+                        args.host, args.port, latency, args.throttle,
+                        args.retry_after, args.page_shortfall, args.seed)
+    print(f"export RECGOV_URL={server.url}")
+    print(f"export RIDB_URL={server.ridb_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
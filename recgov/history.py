@@ -0,0 +1,411 @@
+"""A history of availability, kept in SQLite.
+
+Every poll is recorded with HistoryStore.record, but only what changed is
+written: each site's latest month of status codes is kept as one blob, and
+a row is added for each night whose status differs from it.  Months that
+haven't changed at all are skipped by their digest.  So five-minute polling
+of hundreds of campgrounds grows the database with cancellations and
+bookings, not with polls::
+
+    history = HistoryStore()
+    av.retrieve_months(months, {})
+    history.record(av)
+
+and later::
+
+    history.changes(232463, since=last_week, to_status="Available")
+    history.open_counts(232463, weekday=4)    # Fridays opened, per site
+    history.availability(232463, at=yesterday).filter_dates(start, end)
+"""
+import sqlite3
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from os import makedirs, path
+from threading import Lock
+from time import time
+
+from .availability import Availability
+from .cache import default_cache_dir
+from .calendars import SiteCalendar, status_code, status_names
+from .campsites import Campsite, CampsiteSet
+from .snapshots import Transition, covered_months, snapshot_month
+from .utils import this_month
+
+# A Transition, and when it was seen (an aware UTC datetime).
+Change = namedtuple("Change", Transition._fields + ("observed_at",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS statuses (
+    code INTEGER PRIMARY KEY,
+    name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS sites (
+    site_key INTEGER PRIMARY KEY,
+    asset_id INTEGER,
+    site_id TEXT,
+    UNIQUE (asset_id, site_id));
+CREATE TABLE IF NOT EXISTS months (
+    asset_id INTEGER,
+    month INTEGER,
+    digest BLOB,
+    PRIMARY KEY (asset_id, month)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest (
+    site_key INTEGER,
+    month INTEGER,
+    codes BLOB,
+    PRIMARY KEY (site_key, month)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS observations (
+    site_key INTEGER,
+    night INTEGER,
+    observed_at REAL,
+    before INTEGER,
+    after INTEGER,
+    PRIMARY KEY (site_key, night, observed_at)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_time ON observations (observed_at);
+"""
+
+
+def _timestamp(when) -> float:
+    if when is None or isinstance(when, (int, float)):
+        return when
+    return when.timestamp()
+
+
+def _when(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _connect(filename: str) -> sqlite3.Connection:
+    """A connection shared by threads (HistoryStore takes turns with it),
+    with write-ahead logging so other processes can read while we write.
+    """
+    db = sqlite3.connect(filename, check_same_thread=False)
+    if filename != ":memory:":
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def _calendar(pieces: dict) -> SiteCalendar:
+    """Joins {first ordinal: codes} into one SiteCalendar."""
+    start = min(pieces)
+    end = max(k + len(v) for k, v in pieces.items())
+    codes = bytearray(end - start)
+    for first, piece in pieces.items():
+        codes[first - start:first - start + len(piece)] = piece
+    return SiteCalendar(start=start, codes=codes)
+
+
+class HistoryStore:
+    """Status changes for every site and night we've polled.
+
+    Nights, months and times are stored as date ordinals and timestamps;
+    statuses get their own codes, so they don't depend on the order a
+    process happened to see them in.
+    """
+
+    def __init__(self, filename: str = None):
+        """
+        :param filename: The database file, defaults to history.sqlite3 in
+            default_cache_dir()
+        :type filename: str, optional
+        """
+        self.filename = filename or \
+            path.join(default_cache_dir(), "history.sqlite3")
+        if self.filename != ":memory:":
+            makedirs(path.dirname(path.abspath(self.filename)),
+                     exist_ok=True)
+        self._lock = Lock()
+        self._db = _connect(self.filename)
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+        self._load_codes()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _load_codes(self) -> None:
+        """Reads the status codes again; other stores on the same file
+        (other processes, say) may have added some.
+        """
+        self._codes = {name: code for code, name in
+                       self._db.execute("SELECT code, name FROM statuses")}
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            self._db.execute("INSERT OR IGNORE INTO statuses (name) "
+                             "VALUES (?)", (name,))
+            self._load_codes()
+            code = self._codes[name]
+        return code
+
+    def _to_store(self) -> bytes:
+        """A bytes.translate table from our status codes to the store's."""
+        self._load_codes()
+        return bytes(self._code(x) if x else 0 for x in status_names()) + \
+            bytes(256 - len(status_names()))
+
+    def _from_store(self) -> bytes:
+        """A bytes.translate table from the store's status codes to ours."""
+        self._load_codes()
+        table = bytearray(256)
+        for name, code in self._codes.items():
+            table[code] = status_code(name)
+        return bytes(table)
+
+    def _site_key(self, asset_id: int, site_id: str) -> int:
+        self._db.execute("INSERT OR IGNORE INTO sites (asset_id, site_id) "
+                         "VALUES (?, ?)", (asset_id, site_id))
+        return self._db.execute(
+            "SELECT site_key FROM sites WHERE asset_id = ? AND site_id = ?",
+            (asset_id, site_id)).fetchone()[0]
+
+    def record(self, availability, months: list = None,
+               observed_at: datetime = None) -> [Change]:
+        """Records a poll of a campground.
+
+        :param availability: The campground's (unfiltered) availability
+        :type availability: Availability
+        :param months: Which months were polled, defaults to every month the
+            availability has data for
+        :type months: [datetime], optional
+        :param observed_at: When, defaults to now
+        :type observed_at: datetime, optional
+        :return: what changed since the last poll (nights seen for the first
+            time included, with before None)
+        :rtype: [Change]
+        """
+        asset_id = int(availability.asset_id)
+        observed_at = _timestamp(observed_at)
+        if observed_at is None:
+            observed_at = time()
+        if months is None:
+            months = covered_months(availability)
+        # Committed on their own, so the codes we cache are really stored.
+        with self._lock, self._db:
+            to_store = self._to_store()
+            names = {v: k for k, v in self._codes.items()}
+        changes, rows, latest = [], [], []
+        with self._lock, self._db:
+            for month in months:
+                key = this_month(month).toordinal()
+                # Digest the stored codes: the process-local ones differ
+                # from one process to the next.
+                snapshot = snapshot_month(availability, month, to_store)
+                old = self._db.execute(
+                    "SELECT digest FROM months WHERE asset_id = ? AND "
+                    "month = ?", (asset_id, key)).fetchone()
+                if old is not None and old[0] == snapshot.digest:
+                    continue
+                stored = dict(self._db.execute(
+                    "SELECT s.site_id, l.codes FROM latest l JOIN sites s "
+                    "ON s.site_key = l.site_key WHERE s.asset_id = ? AND "
+                    "l.month = ?", (asset_id, key)))
+                for site_id, codes in snapshot.sites.items():
+                    before = stored.get(str(site_id))
+                    if before == codes:
+                        continue
+                    site_key = self._site_key(asset_id, str(site_id))
+                    latest.append((site_key, key, codes))
+                    if before is None:
+                        before = bytes(len(codes))
+                    for i, (was, now) in enumerate(zip(before, codes)):
+                        if was == now or not now:
+                            continue
+                        rows.append((site_key, key + i, observed_at,
+                                     was or None, now))
+                        changes.append(Change(
+                            asset_id, site_id, date.fromordinal(key + i),
+                            names.get(was), names[now], _when(observed_at)))
+                self._db.execute("INSERT OR REPLACE INTO months VALUES "
+                                 "(?, ?, ?)", (asset_id, key,
+                                               snapshot.digest))
+            self._db.executemany("INSERT OR REPLACE INTO latest VALUES "
+                                 "(?, ?, ?)", latest)
+            self._db.executemany("INSERT OR REPLACE INTO observations VALUES "
+                                 "(?, ?, ?, ?, ?)", rows)
+        return changes
+
+    def _sites(self, asset_id: int, site_id: str = None) -> dict:
+        """site_key to site_id for an asset (or just one of its sites)."""
+        query = "SELECT site_key, site_id FROM sites WHERE asset_id = ?"
+        params = [int(asset_id)]
+        if site_id is not None:
+            query += " AND site_id = ?"
+            params.append(str(site_id))
+        return dict(self._db.execute(query, params))
+
+    def changes(self, asset_id: int, site_id: str = None,
+                since: datetime = None, until: datetime = None,
+                to_status: str = None) -> [Change]:
+        """What changed, and when.
+
+        :param asset_id: the campground
+        :type asset_id: int
+        :param site_id: Just this site, defaults to every site
+        :type site_id: str, optional
+        :param since: Seen at or after this, defaults to None
+        :type since: datetime, optional
+        :param until: Seen before this, defaults to None
+        :type until: datetime, optional
+        :param to_status: Only changes to this status, e.g. "Available",
+            defaults to None
+        :type to_status: str, optional
+        :return: changes in the order they were seen, then by site and night
+        :rtype: [Change]
+        """
+        with self._lock:
+            self._load_codes()
+            sites = self._sites(asset_id, site_id)
+            if not sites or (to_status is not None and
+                             to_status not in self._codes):
+                return []
+            names = {v: k for k, v in self._codes.items()}
+            query = "SELECT * FROM observations WHERE site_key IN (%s)" % \
+                ",".join("?" * len(sites))
+            params = list(sites)
+            if since is not None:
+                query += " AND observed_at >= ?"
+                params.append(_timestamp(since))
+            if until is not None:
+                query += " AND observed_at < ?"
+                params.append(_timestamp(until))
+            if to_status is not None:
+                query += " AND after = ?"
+                params.append(self._codes[to_status])
+            rows = self._db.execute(query, params).fetchall()
+        rows.sort(key=lambda x: (x[2], sites[x[0]], x[1]))
+        return [Change(int(asset_id), sites[site_key], date.fromordinal(night),
+                       names.get(before), names[after], _when(observed_at))
+                for site_key, night, observed_at, before, after in rows]
+
+    def open_counts(self, asset_id: int, status: str = "Available",
+                    weekday: int = None, since: datetime = None,
+                    until: datetime = None) -> dict:
+        """How many times each site's nights changed to status.
+
+        :param status: defaults to "Available"
+        :type status: str, optional
+        :param weekday: Only nights on this weekday (Monday is 0, as with
+            date.weekday), defaults to None
+        :type weekday: int, optional
+        :param since: Seen at or after this, defaults to None
+        :type since: datetime, optional
+        :param until: Seen before this, defaults to None
+        :type until: datetime, optional
+        :return: site id to count, for sites that ever did
+        :rtype: dict
+        """
+        with self._lock:
+            self._load_codes()
+            code = self._codes.get(status)
+            if code is None:
+                return {}
+            query = ("SELECT s.site_id, count(*) FROM observations o "
+                     "JOIN sites s ON s.site_key = o.site_key "
+                     "WHERE s.asset_id = ? AND o.after = ? "
+                     "AND o.before IS NOT NULL")
+            params = [int(asset_id), code]
+            if weekday is not None:
+                # Ordinal 1 (0001-01-01) was a Monday.
+                query += " AND (o.night + 6) % 7 = ?"
+                params.append(weekday)
+            if since is not None:
+                query += " AND o.observed_at >= ?"
+                params.append(_timestamp(since))
+            if until is not None:
+                query += " AND o.observed_at < ?"
+                params.append(_timestamp(until))
+            query += " GROUP BY s.site_id"
+            return dict(self._db.execute(query, params))
+
+    def _build(self, asset_id: int, calendars: dict,
+               campsites: CampsiteSet) -> Availability:
+        av = Availability(int(asset_id), campsites=campsites
+                          if campsites is not None else CampsiteSet())
+        for site_id in sorted(calendars, key=str):
+            av[site_id] = Campsite({"campsite_id": site_id,
+                                    "availabilities": calendars[site_id]})
+        return av
+
+    def availability(self, asset_id: int, at: datetime = None,
+                     campsites: CampsiteSet = None) -> Availability:
+        """A campground's availability as we last saw it, or as of a time.
+
+        The sites only have campsite_id and availabilities; use the
+        CampsiteSet's ingest_availability for everything else.
+
+        :param at: As of this time, defaults to the latest poll
+        :type at: datetime, optional
+        :param campsites: Passed on to Availability, defaults to an empty
+            CampsiteSet
+        :type campsites: CampsiteSet, optional
+        :rtype: Availability
+        """
+        pieces = {}
+        with self._lock:
+            sites = self._sites(asset_id)
+            from_store = self._from_store()
+            if at is None:
+                rows = self._db.execute(
+                    "SELECT l.site_key, l.month, l.codes FROM latest l "
+                    "JOIN sites s ON s.site_key = l.site_key "
+                    "WHERE s.asset_id = ?", (int(asset_id),)).fetchall()
+            else:
+                # Each night's last change at or before then.
+                rows = self._db.execute(
+                    "SELECT o.site_key, o.night, o.after FROM observations o "
+                    "JOIN sites s ON s.site_key = o.site_key WHERE "
+                    "s.asset_id = ? AND o.observed_at <= ? "
+                    "ORDER BY o.observed_at",
+                    (int(asset_id), _timestamp(at))).fetchall()
+        for site_key, first, codes in rows:
+            if at is not None:
+                codes = bytes([codes])
+            pieces.setdefault(sites[site_key], {})[first] = \
+                codes.translate(from_store)
+        calendars = {k: _calendar(v) for k, v in pieces.items()}
+        return self._build(asset_id, calendars, campsites)
+
+    def openings(self, asset_id: int, since: datetime = None,
+                 until: datetime = None, status: str = "Available",
+                 campsites: CampsiteSet = None) -> Availability:
+        """The nights that changed to status, as an Availability.
+
+        Only those nights are in each site's calendar, so e.g.
+        filter_dates and available_ranges work on what opened up.
+
+        :param since: Seen at or after this, defaults to None
+        :type since: datetime, optional
+        :param until: Seen before this, defaults to None
+        :type until: datetime, optional
+        :param status: defaults to "Available"
+        :type status: str, optional
+        :rtype: Availability
+        """
+        calendars = {}
+        for change in self.changes(asset_id, since=since, until=until,
+                                   to_status=status):
+            if change.before is None:
+                continue
+            calendars.setdefault(change.site_id, SiteCalendar())[
+                change.night.isoformat() + "T00:00:00Z"] = status
+        return self._build(asset_id, calendars, campsites)
+
+    def prune(self, before: datetime) -> int:
+        """Forgets changes seen before a time.  What each site looks like
+        now is kept.
+
+        :return: how many were forgotten
+        :rtype: int
+        """
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM observations WHERE observed_at < ?",
+                (_timestamp(before),)).rowcount
@@ -0,0 +1,247 @@
+"""Optional timing of requests and pipeline stages.
+
+Nothing is recorded until a hook is added.  A hook is any callable; it's
+called with each event on the thread that did the work:
+
+* RequestEvent for every HTTP attempt RecgovSession sends (retries
+  included), with its latency, status (None if it never got one) and size.
+  A streamed (stream=True) response is reported when it's closed, so its
+  latency includes reading the body.
+* CacheEvent for every ResponseCache lookup: "hit", "miss" or "revalidated".
+* StageEvent when a pipeline stage finishes: "get_campsites",
+  "month_fetch", "json_decode", "merge", "filter_dates", "campsite_filters",
+  "ingest" and whatever you time yourself with stage().  Stages can nest;
+  e.g. a streamed "month_fetch" includes its "merge".
+
+Metrics is a hook that adds them all up and prints them for Prometheus::
+
+    metrics = Metrics().install()
+    ...
+    print(metrics.prometheus())
+
+With no hooks the cost is one check of an empty list per stage or request.
+"""
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+# bytes is the Content-Length, or else how much of the body was read; None
+# if we can't tell.
+RequestEvent = namedtuple("RequestEvent",
+                          ["method", "host", "path", "status", "seconds",
+                           "bytes"])
+CacheEvent = namedtuple("CacheEvent", ["host", "outcome"])
+# ok is False if the stage raised.
+StageEvent = namedtuple("StageEvent", ["stage", "seconds", "ok"])
+
+_hooks = []
+_hooks_lock = Lock()
+_NOOP = nullcontext()
+
+
+def add_hook(hook):
+    """Starts calling hook with every event.
+
+    :param hook: called with a RequestEvent, CacheEvent or StageEvent
+    :type hook: Callable
+    :return: hook, so this works as a decorator.
+    """
+    global _hooks
+    with _hooks_lock:
+        # Replaced rather than changed, so emit never sees it change.
+        _hooks = _hooks + [hook]
+    return hook
+
+
+def remove_hook(hook) -> None:
+    global _hooks
+    with _hooks_lock:
+        _hooks = [x for x in _hooks if x != hook]
+
+
+def enabled() -> bool:
+    """Whether anything is listening."""
+    return bool(_hooks)
+
+
+def emit(event) -> None:
+    for hook in _hooks:
+        hook(event)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        emit(StageEvent(self.name, perf_counter() - self.start,
+                        exc_type is None))
+
+
+def stage(name: str):
+    """Times a block as a pipeline stage::
+
+        with stage("yaml_dump"):
+            dump(config, fh)
+
+    :rtype: ContextManager
+    """
+    return _Stage(name) if _hooks else _NOOP
+
+
+def timed(name: str):
+    """Decorates a function so each call is timed as a stage."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def response_bytes(resp) -> int:
+    """The size of a response body, if we know it without reading it (or
+    as much of it as was read).
+    """
+    length = resp.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length)
+    if resp._content_consumed and isinstance(resp._content, bytes):
+        return len(resp._content)
+    # Streamed: what came over the wire so far.
+    tell = getattr(resp.raw, "tell", None)
+    if tell is not None:
+        try:
+            return tell()
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+            .replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"'
+                          for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    """A hook that keeps running totals, for Prometheus.
+    """
+    # Request latency histogram buckets, in seconds.
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=None):
+        """
+        :param buckets: request latency bucket bounds (seconds), defaults
+            to Metrics.buckets
+        :type buckets: Iterable[float], optional
+        """
+        if buckets is not None:
+            self.buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self.requests = {}    # (host, method, status): count
+        self.latency = {}     # host: [count per bucket, +Inf, sum]
+        self.bytes = {}       # host: total
+        self.cache = {}       # (host, outcome): count
+        self.stages = {}      # stage: [count, sum, errors]
+
+    def install(self) -> "Metrics":
+        add_hook(self)
+        return self
+
+    def uninstall(self) -> None:
+        remove_hook(self)
+
+    def __call__(self, event) -> None:
+        with self._lock:
+            if isinstance(event, RequestEvent):
+                key = (event.host, event.method, event.status)
+                self.requests[key] = self.requests.get(key, 0) + 1
+                latency = self.latency.setdefault(
+                    event.host, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, bound in enumerate(self.buckets):
+                    if event.seconds <= bound:
+                        latency[i] += 1
+                latency[-2] += 1
+                latency[-1] += event.seconds
+                if event.bytes:
+                    self.bytes[event.host] = \
+                        self.bytes.get(event.host, 0) + event.bytes
+            elif isinstance(event, CacheEvent):
+                key = (event.host, event.outcome)
+                self.cache[key] = self.cache.get(key, 0) + 1
+            elif isinstance(event, StageEvent):
+                totals = self.stages.setdefault(event.stage, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += event.seconds
+                if not event.ok:
+                    totals[2] += 1
+
+    def prometheus(self) -> str:
+        """Everything so far, in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        lines = []
+
+        def metric(name: str, kind: str, text: str, samples) -> None:
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        with self._lock:
+            metric("recgov_requests_total", "counter",
+                   "HTTP requests sent, retries included.",
+                   [f"recgov_requests_total"
+                    f"{_labels(host=h, method=m, status=s or 'error')} {n}"
+                    for (h, m, s), n in sorted(self.requests.items(),
+                                               key=str)])
+            samples = []
+            for host, latency in sorted(self.latency.items()):
+                for bound, count in zip(self.buckets, latency):
+                    samples.append(f"recgov_request_duration_seconds_bucket"
+                                   f"{_labels(host=host, le=bound)} {count}")
+                samples.append(f"recgov_request_duration_seconds_bucket"
+                               f"{_labels(host=host, le='+Inf')} "
+                               f"{latency[-2]}")
+                samples.append(f"recgov_request_duration_seconds_sum"
+                               f"{_labels(host=host)} {latency[-1]}")
+                samples.append(f"recgov_request_duration_seconds_count"
+                               f"{_labels(host=host)} {latency[-2]}")
+            metric("recgov_request_duration_seconds", "histogram",
+                   "HTTP request latency.", samples)
+            metric("recgov_response_bytes_total", "counter",
+                   "Response body bytes received.",
+                   [f"recgov_response_bytes_total{_labels(host=h)} {n}"
+                    for h, n in sorted(self.bytes.items())])
+            metric("recgov_cache_lookups_total", "counter",
+                   "ResponseCache lookups by outcome.",
+                   [f"recgov_cache_lookups_total"
+                    f"{_labels(host=h, outcome=o)} {n}"
+                    for (h, o), n in sorted(self.cache.items())])
+            samples = []
+            for name, (count, total, errors) in sorted(self.stages.items()):
+                samples.append(f"recgov_stage_duration_seconds_sum"
+                               f"{_labels(stage=name)} {total}")
+                samples.append(f"recgov_stage_duration_seconds_count"
+                               f"{_labels(stage=name)} {count}")
+            metric("recgov_stage_duration_seconds", "summary",
+                   "Time spent in each pipeline stage.", samples)
+            metric("recgov_stage_errors_total", "counter",
+                   "Pipeline stages that raised.",
+                   [f"recgov_stage_errors_total{_labels(stage=k)} {v[2]}"
+                    for k, v in sorted(self.stages.items())])
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,355 @@
+"""A local copy of RIDB's campsite metadata, loaded from its full export.
+
+RIDB publishes everything it has as one zip of CSV files (EXPORT_URL).
+RIDBStore loads the facilities, campsites, campsite attributes, and
+permitted equipment from it into SQLite, indexed by facility, so a
+campground's CampsiteSet comes back in milliseconds, with no API key and no
+paging::
+
+    store = RIDBStore()
+    store.load_export(download_export("RIDBFullExport_V1_CSV.zip"))
+    campsites = get_campsites(232463, store=store)
+
+Campsites built from the store have the same keys the API gives, with the
+CSV's strings turned back into the API's numbers and booleans.
+"""
+import csv
+import sqlite3
+from io import TextIOWrapper
+from os import listdir, makedirs, path
+from threading import Lock
+from time import time
+from zipfile import ZipFile
+
+from .cache import default_cache_dir
+from .campsites import Campsite, CampsiteSet
+
+EXPORT_URL = "https://ridb.recreation.gov/downloads/RIDBFullExport_V1_CSV.zip"
+
+# The export's files we load.  Names are matched without case or extension.
+_FILES = {"facilities": "facilities_api_v1",
+          "campsites": "campsites_api_v1",
+          "attributes": "campsiteattributes_api_v1",
+          "equipment": "permittedequipment_api_v1"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS facilities (
+    facility_id INTEGER PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    rec_area_id INTEGER,
+    latitude REAL,
+    longitude REAL,
+    reservable INTEGER,
+    enabled INTEGER);
+CREATE TABLE IF NOT EXISTS campsites (
+    campsite_id TEXT PRIMARY KEY,
+    facility_id INTEGER,
+    name TEXT,
+    type TEXT,
+    type_of_use TEXT,
+    loop TEXT,
+    accessible INTEGER,
+    latitude REAL,
+    longitude REAL,
+    created TEXT,
+    updated TEXT);
+CREATE TABLE IF NOT EXISTS attributes (
+    campsite_id TEXT,
+    name TEXT,
+    value TEXT);
+CREATE TABLE IF NOT EXISTS equipment (
+    campsite_id TEXT,
+    name TEXT,
+    max_length REAL);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value);
+"""
+# Built after loading; much faster than keeping them up to date row by row.
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS campsites_facility ON campsites (facility_id);
+CREATE INDEX IF NOT EXISTS attributes_campsite ON attributes (campsite_id);
+CREATE INDEX IF NOT EXISTS equipment_campsite ON equipment (campsite_id);
+"""
+_INDEX_NAMES = ("campsites_facility", "attributes_campsite",
+                "equipment_campsite")
+
+
+def default_store_path() -> str:
+    """Where the store lives if you don't say otherwise.
+
+    :return: ridb.sqlite3 in default_cache_dir()
+    :rtype: str
+    """
+    return path.join(default_cache_dir(), "ridb.sqlite3")
+
+
+def download_export(filename: str, session=None,
+                    url: str = EXPORT_URL) -> str:
+    """Downloads RIDB's full export (a few hundred MB) to filename.
+
+    :param session: defaults to a plain requests Session
+    :type session: requests.Session, optional
+    :return: filename
+    :rtype: str
+    """
+    if session is None:
+        from requests import Session
+        session = Session()
+    with session.get(url, stream=True, timeout=(5, 60)) as resp:
+        resp.raise_for_status()
+        with open(filename, "wb") as fh:
+            for chunk in resp.iter_content(2**20):
+                fh.write(chunk)
+    return filename
+
+
+def _number(value: str):
+    """The API's number for a CSV field: an int if it's whole."""
+    if value is None or value.strip() == "":
+        return None
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _flag(value: str) -> bool:
+    if value is None or value.strip() == "":
+        return None
+    return value.strip().lower() in ("true", "1", "yes", "y")
+
+
+def _campsite_rows(rows):
+    for row in rows:
+        yield (row["CampsiteID"], _number(row["FacilityID"]),
+               row.get("CampsiteName"), row.get("CampsiteType"),
+               row.get("TypeOfUse"), row.get("Loop"),
+               _flag(row.get("CampsiteAccessible")),
+               _number(row.get("CampsiteLatitude")),
+               _number(row.get("CampsiteLongitude")),
+               row.get("CreatedDate"), row.get("LastUpdatedDate"))
+
+
+def _facility_rows(rows):
+    for row in rows:
+        yield (_number(row["FacilityID"]), row.get("FacilityName"),
+               row.get("FacilityTypeDescription"),
+               _number(row.get("ParentRecAreaID")),
+               _number(row.get("FacilityLatitude")),
+               _number(row.get("FacilityLongitude")),
+               _flag(row.get("Reservable")), _flag(row.get("Enabled")))
+
+
+def _campsite_entities(rows):
+    """Rows that belong to campsites (the files also cover other things)."""
+    for row in rows:
+        if row.get("EntityType", "Campsite").lower() == "campsite":
+            yield row
+
+
+def _attribute_rows(rows):
+    for row in _campsite_entities(rows):
+        yield row["EntityID"], row["AttributeName"], row["AttributeValue"]
+
+
+def _equipment_rows(rows):
+    for row in _campsite_entities(rows):
+        yield (row["EntityID"], row["EquipmentName"],
+               _number(row.get("MaxLength")))
+
+
+class _Export:
+    """Opens the CSV files in an export zip, or a directory it was
+    unzipped into.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._zip = ZipFile(source) if not path.isdir(source) else None
+        names = self._zip.namelist() if self._zip else listdir(source)
+        self.names = {}
+        for name in names:
+            key = path.splitext(path.basename(name))[0].lower()
+            self.names[key] = name
+
+    def rows(self, table: str):
+        """Reads a table's rows as dicts, or nothing if it isn't there."""
+        name = self.names.get(_FILES[table])
+        if name is None:
+            return
+        if self._zip is not None:
+            fh = TextIOWrapper(self._zip.open(name), encoding="utf-8-sig",
+                               newline="")
+        else:
+            fh = open(path.join(self.source, name), encoding="utf-8-sig",
+                      newline="")
+        with fh:
+            yield from csv.DictReader(fh)
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+class RIDBStore:
+    """RIDB's facilities and campsites in SQLite.
+    """
+
+    def __init__(self, filename: str = None):
+        """
+        :param filename: The database file, defaults to default_store_path()
+        :type filename: str, optional
+        """
+        self.filename = filename or default_store_path()
+        if self.filename != ":memory:":
+            makedirs(path.dirname(path.abspath(self.filename)),
+                     exist_ok=True)
+        # One connection, shared by threads; queries are short.
+        self._lock = Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "RIDBStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def load_export(self, source: str) -> dict:
+        """Replaces what's stored with an export's contents.
+
+        :param source: the export zip, or the directory it was unzipped into
+        :type source: str
+        :raises ValueError: If source has no campsites file
+        :return: rows loaded per table
+        :rtype: dict
+        """
+        export = _Export(source)
+        if _FILES["campsites"] not in export.names:
+            export.close()
+            raise ValueError(f"{source} doesn't look like an RIDB export")
+        loads = (("facilities", "INSERT OR REPLACE INTO facilities "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", _facility_rows),
+                 ("campsites", "INSERT OR REPLACE INTO campsites "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", _campsite_rows),
+                 ("attributes", "INSERT INTO attributes VALUES (?, ?, ?)",
+                  _attribute_rows),
+                 ("equipment", "INSERT INTO equipment VALUES (?, ?, ?)",
+                  _equipment_rows))
+        counts = {}
+        try:
+            with self._lock, self._db:
+                # The DELETEs start the transaction, so a load that fails
+                # leaves the old data and indexes as they were.
+                for table, _, _ in loads:
+                    self._db.execute(f"DELETE FROM {table}")
+                for name in _INDEX_NAMES:
+                    self._db.execute(f"DROP INDEX IF EXISTS {name}")
+                for table, insert, convert in loads:
+                    cursor = self._db.executemany(
+                        insert, convert(export.rows(table)))
+                    counts[table] = cursor.rowcount
+                for statement in _INDEXES.split(";")[:-1]:
+                    self._db.execute(statement)
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES "
+                                 "('loaded', ?)", (time(),))
+        finally:
+            export.close()
+        return counts
+
+    @property
+    def loaded(self) -> float:
+        """When the export was loaded (a timestamp), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'loaded'").fetchone()
+        return row[0] if row else None
+
+    def records(self, asset: int) -> [dict]:
+        """An asset's campsites as RIDB API records.
+
+        :param asset: the asset (facility) id
+        :type asset: int
+        :rtype: [dict]
+        """
+        with self._lock:
+            sites = self._db.execute(
+                "SELECT * FROM campsites WHERE facility_id = ? "
+                "ORDER BY rowid", (int(asset),)).fetchall()
+            attributes = self._db.execute(
+                "SELECT a.campsite_id, a.name, a.value FROM campsites c "
+                "JOIN attributes a ON a.campsite_id = c.campsite_id "
+                "WHERE c.facility_id = ? ORDER BY a.rowid",
+                (int(asset),)).fetchall()
+            equipment = self._db.execute(
+                "SELECT e.campsite_id, e.name, e.max_length FROM campsites c "
+                "JOIN equipment e ON e.campsite_id = c.campsite_id "
+                "WHERE c.facility_id = ? ORDER BY e.rowid",
+                (int(asset),)).fetchall()
+        records = {}
+        for (campsite_id, facility_id, name, type_, type_of_use, loop,
+             accessible, latitude, longitude, created, updated) in sites:
+            records[campsite_id] = {
+                "CampsiteID": campsite_id,
+                "FacilityID": str(facility_id),
+                "CampsiteName": name,
+                "CampsiteType": type_,
+                "TypeOfUse": type_of_use,
+                "Loop": loop,
+                "CampsiteAccessible": bool(accessible),
+                "CampsiteLatitude": latitude,
+                "CampsiteLongitude": longitude,
+                "CreatedDate": created,
+                "LastUpdatedDate": updated,
+                "ATTRIBUTES": [],
+                "PERMITTEDEQUIPMENT": [],
+                "ENTITYMEDIA": []}
+        for campsite_id, name, value in attributes:
+            records[campsite_id]["ATTRIBUTES"].append(
+                {"AttributeName": name, "AttributeValue": value})
+        for campsite_id, name, max_length in equipment:
+            if max_length is not None and max_length.is_integer():
+                max_length = int(max_length)
+            records[campsite_id]["PERMITTEDEQUIPMENT"].append(
+                {"EquipmentName": name, "MaxLength": max_length})
+        return list(records.values())
+
+    def get(self, asset: int) -> CampsiteSet:
+        """Gets an asset's campsites.
+
+        :param asset: the asset (facility) id
+        :type asset: int
+        :return: its campsites, or None if the export doesn't have it.
+        :rtype: CampsiteSet
+        """
+        records = self.records(asset)
+        if not records and asset not in self:
+            return None
+        return CampsiteSet({x["CampsiteID"]: Campsite(x) for x in records})
+
+    def __contains__(self, asset) -> bool:
+        """Whether the export has this facility (campsites or not)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM facilities WHERE facility_id = ? UNION ALL "
+                "SELECT 1 FROM campsites WHERE facility_id = ? LIMIT 1",
+                (int(asset), int(asset))).fetchone() is not None
+
+    def facilities(self) -> [dict]:
+        """Every facility in the export.
+
+        :return: dicts with facility_id, name, type, rec_area_id, latitude,
+            longitude, reservable, enabled and campsites (how many)
+        :rtype: [dict]
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT f.*, (SELECT count(*) FROM campsites c "
+                "WHERE c.facility_id = f.facility_id) FROM facilities f "
+                "ORDER BY f.facility_id")
+            columns = [x[0] for x in cursor.description[:-1]] + ["campsites"]
+            return [dict(zip(columns, row)) for row in cursor]
@@ -0,0 +1,123 @@
+"""Scans many campgrounds at once.
+
+Each task looks like an entry under "tasks" in examples/config.yml::
+
+    {"name": "Moraine Park Campground",
+     "asset_id": 232463,
+     "campsite_filters": {...},
+     "availability_filters": {"start_date": ..., "end_date": ...}}
+
+Tasks that share an asset share its campsite metadata, and tasks that need
+the same (asset, month) share that request.  Everything runs on one thread
+pool over one pooled session, and results come back as tasks finish.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ._requests import get_anonymous_session
+from .availability import Availability
+from .campsites import CampsiteSet, get_campsites
+
+# availability is the filtered Availability, campsites the filtered
+# CampsiteSet with that availability ingested.  If anything went wrong, both
+# are None and error holds the exception.
+ScanResult = namedtuple("ScanResult",
+                        ["task", "availability", "campsites", "error"])
+
+
+class BatchScanner:
+    """Runs many availability tasks concurrently, without duplicate requests.
+    """
+
+    def __init__(self, max_workers: int = 8, session=None, ridb_session=None,
+                 campsite_cache=None, apikey: str = None):
+        """
+        :param max_workers: How many requests to run at once, defaults to 8
+        :type max_workers: int, optional
+        :param session: Session for the month endpoint, defaults to a new
+            anonymous session pooled for max_workers connections
+        :type session: requests.Session, optional
+        :param ridb_session: Session for RIDB, defaults to get_campsites'
+        :type ridb_session: SessionPaginator, optional
+        :param campsite_cache: Passed on to get_campsites
+        :type campsite_cache: recgov.cache.CampsiteCache, optional
+        :param apikey: Passed on to get_campsites
+        :type apikey: str, optional
+        """
+        self.max_workers = max_workers
+        self.session = session if session is not None else \
+            get_anonymous_session(pool_maxsize=max_workers)
+        self.ridb_session = ridb_session
+        self.campsite_cache = campsite_cache
+        self.apikey = apikey
+
+    def get_campsites(self, asset_id: int) -> CampsiteSet:
+        return get_campsites(asset_id, apikey=self.apikey,
+                             cache=self.campsite_cache,
+                             session=self.ridb_session)
+
+    def scan(self, tasks):
+        """Runs the tasks, yielding each result as soon as it's ready.
+
+        :param tasks: task dicts (see the module docstring)
+        :type tasks: Iterable[dict]
+        :yield: one result per task, in the order they finish.
+        :rtype: Iterator[ScanResult]
+        """
+        tasks = list(tasks)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            metadata, months = {}, {}
+            # For each task: its metadata future and month futures.
+            needs = []
+            # Which tasks are waiting on each future.
+            waiting = {}
+            fetchers = {}
+            for task in tasks:
+                try:
+                    asset_id = task['asset_id']
+                    task_months = Availability.months_for(
+                        task['availability_filters'])
+                    # It keys the shared fetches below.
+                    hash(asset_id)
+                except Exception as exc:
+                    yield ScanResult(task, None, None, exc)
+                    continue
+                if asset_id not in metadata:
+                    metadata[asset_id] = pool.submit(self.get_campsites,
+                                                     asset_id)
+                    # Only used to fetch months, so it needs no campsites.
+                    fetchers[asset_id] = Availability(
+                        asset_id, session=self.session,
+                        campsites=CampsiteSet())
+                month_futures = []
+                for month in task_months:
+                    key = (asset_id, month)
+                    if key not in months:
+                        months[key] = pool.submit(
+                            fetchers[asset_id].get_month_dict, month)
+                    month_futures.append(months[key])
+                needs.append((task, metadata[asset_id], month_futures))
+                for future in set([metadata[asset_id]] + month_futures):
+                    waiting.setdefault(future, []).append(len(needs) - 1)
+
+            pending = [len(set([x[1]] + x[2])) for x in needs]
+            for future in as_completed(waiting):
+                for i in waiting[future]:
+                    pending[i] -= 1
+                    if not pending[i]:
+                        yield self._assemble(*needs[i])
+
+    def _assemble(self, task: dict, metadata, months: list) -> ScanResult:
+        """Builds a task's result from its finished futures."""
+        try:
+            av = Availability(task['asset_id'], session=self.session,
+                              campsites=metadata.result())
+            for month in months:
+                av.merge_availabilities(month.result()['campsites'])
+            filtered = av.filter(task['availability_filters'])
+            sites = av.campsites.apply_filters(
+                task.get('campsite_filters') or {})
+            sites.ingest_availability(filtered)
+        except Exception as exc:
+            return ScanResult(task, None, None, exc)
+        return ScanResult(task, filtered, sites, None)
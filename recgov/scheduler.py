@@ -0,0 +1,329 @@
+"""Polls (asset, month) pairs continuously within a request budget.
+
+Every poll takes a token from a TokenBucket shared by all threads, so
+bursts don't get us throttled.  Each (asset, month) gets its own poll
+interval: months that start soon and months that recently changed are
+polled more often, months that stay the same back off.  When more polls are
+due than the budget allows, the most useful ones (highest priority for
+their interval) go first.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from threading import Condition, Event, Lock
+from time import monotonic
+
+from .utils import this_month
+
+
+class TokenBucket:
+    """A thread-safe token bucket rate limiter.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=monotonic):
+        """
+        :param rate: Tokens added per second (the sustained request rate)
+        :type rate: float
+        :param capacity: Most tokens that can pile up (the largest burst),
+            defaults to rate, or 1 if rate is less than that
+        :type capacity: float, optional
+        :raises ValueError: If rate or capacity isn't positive.
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, not {rate}")
+        if capacity is not None and capacity <= 0:
+            raise ValueError(f"capacity must be positive, not {capacity}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._cond = Condition(Lock())
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Takes tokens if they're available right now.
+
+        :rtype: bool
+        """
+        with self._cond:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        """Waits until tokens are available, then takes them.
+
+        :param timeout: Give up after this many seconds, defaults to None
+            (wait forever)
+        :type timeout: float, optional
+        :return: False if we timed out.
+        :rtype: bool
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+                if deadline is not None:
+                    if self.clock() + wait > deadline:
+                        return False
+                self._cond.wait(wait)
+
+
+class PollJob:
+    """One (asset, month) the scheduler keeps fresh."""
+    __slots__ = ("availability", "month", "priority", "next_due",
+                 "interval", "backoff", "digest", "running", "polls",
+                 "changes", "last_changed", "lock")
+
+    def __init__(self, availability, month: datetime, priority: float,
+                 due: float, lock: Lock = None):
+        self.availability = availability
+        # Shared by every job of this availability: retrieve_month merges
+        # into it, so only one of its months is polled at a time.
+        self.lock = lock if lock is not None else Lock()
+        self.month = this_month(month)
+        self.priority = priority
+        self.next_due = due
+        self.interval = None
+        self.backoff = 0
+        self.digest = None
+        self.running = False
+        self.polls = 0
+        self.changes = 0
+        self.last_changed = None
+
+    @property
+    def key(self) -> tuple:
+        return (self.availability.asset_id, self.month)
+
+
+class PollScheduler:
+    """Keeps many (asset, month) pairs fresh by calling
+    Availability.retrieve_month.
+    """
+
+    def __init__(self, limiter: TokenBucket, min_interval: float = 60,
+                 max_interval: float = 3600, max_backoff: int = 4,
+                 clock=monotonic, today=None):
+        """
+        :param limiter: Every poll takes one token from here.
+        :type limiter: TokenBucket
+        :param min_interval: Shortest time between polls of a month
+            (seconds), defaults to 60
+        :type min_interval: float, optional
+        :param max_interval: Longest time between polls of a month
+            (seconds), defaults to 3600
+        :type max_interval: float, optional
+        :param max_backoff: An unchanged month's interval doubles after each
+            poll, up to 2**max_backoff times, defaults to 4
+        :type max_backoff: int, optional
+        """
+        self.limiter = limiter
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.today = today or (lambda: datetime.now(timezone.utc).date())
+        self.jobs = {}
+        self.errors = 0
+        self._lock = Lock()
+        self._wakeup = Event()
+
+    def add(self, availability, month: datetime,
+            priority: float = 1.0) -> PollJob:
+        """Starts polling a month of an Availability.  It's due right away.
+
+        :param availability: The campground to poll
+        :type availability: Availability
+        :param month: Any date in the month
+        :type month: datetime
+        :param priority: Higher is polled more often, defaults to 1.0
+        :type priority: float, optional
+        :raises ValueError: If priority isn't positive.
+        :rtype: PollJob
+        """
+        if priority <= 0:
+            raise ValueError(f"priority must be positive, not {priority}")
+        with self._lock:
+            lock = next((x.lock for x in self.jobs.values()
+                         if x.availability is availability), None)
+            job = PollJob(availability, month, priority, self.clock(), lock)
+            self.jobs[job.key] = job
+        self._wakeup.set()
+        return job
+
+    def remove(self, asset_id: int, month: datetime) -> None:
+        with self._lock:
+            self.jobs.pop((asset_id, this_month(month)), None)
+
+    def interval_for(self, job: PollJob) -> float:
+        """How long to wait before polling a job again.
+
+        Starts at min_interval for a month that starts today, grows with
+        how far away the month is (one more min_interval for every 30 days)
+        and with how long it has gone unchanged, and shrinks with priority.
+
+        :rtype: float
+        """
+        days_away = max(0, (job.month.date() - self.today()).days)
+        nearness = 1 + days_away / 30
+        interval = self.min_interval * nearness * 2 ** job.backoff \
+            / job.priority
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _score(self, job: PollJob) -> float:
+        return job.priority / self.interval_for(job)
+
+    def due(self) -> [PollJob]:
+        """The jobs that should be polled now, most useful first.
+
+        :rtype: [PollJob]
+        """
+        now = self.clock()
+        with self._lock:
+            jobs = [x for x in self.jobs.values()
+                    if x.next_due <= now and not x.running]
+        return sorted(jobs, key=lambda x: (-self._score(x), x.next_due))
+
+    def poll(self, job: PollJob) -> bool:
+        """Polls one job now (after waiting for a token).
+
+        :return: Whether the month changed.
+        :rtype: bool
+        """
+        changed = False
+        with job.lock:
+            self.limiter.acquire()
+            try:
+                job.availability.retrieve_month(job.month, {})
+                digest = job.availability.snapshot(job.month).digest
+            except Exception:
+                digest = None
+                with self._lock:
+                    self.errors += 1
+        if digest is not None:
+            changed = job.digest is not None and digest != job.digest
+            with self._lock:
+                job.polls += 1
+                if changed:
+                    job.changes += 1
+                    job.last_changed = self.clock()
+                    job.backoff = 0
+                elif job.digest is not None:
+                    job.backoff = min(job.backoff + 1, self.max_backoff)
+                job.digest = digest
+        with self._lock:
+            job.interval = self.interval_for(job)
+            job.next_due = self.clock() + job.interval
+            job.running = False
+        return changed
+
+    def _claim(self) -> PollJob:
+        """Marks the most useful due job running and returns it, or None.
+
+        Jobs of an availability that's being polled already are passed
+        over, since they'd only wait for its lock.
+        """
+        jobs = self.due()
+        with self._lock:
+            busy = {id(x.lock) for x in self.jobs.values() if x.running}
+            for job in jobs:
+                if not job.running and id(job.lock) not in busy:
+                    job.running = True
+                    return job
+        return None
+
+    def run_pending(self, pool: ThreadPoolExecutor = None,
+                    max_workers: int = None, stop: Event = None) -> int:
+        """Polls jobs until none are due, most useful first.
+
+        The next poll is picked when there's room for it, so a month that
+        became due (or more useful) in the meantime doesn't wait behind
+        the ones that were due when we started.
+
+        :param pool: Run polls on this pool, defaults to None (run them
+            here, one at a time)
+        :type pool: ThreadPoolExecutor, optional
+        :param max_workers: Most polls in flight on the pool, defaults to the
+            pool's max_workers
+        :type max_workers: int, optional
+        :param stop: Stop starting polls once this is set, defaults to None
+        :type stop: threading.Event, optional
+        :return: how many polls were started.
+        :rtype: int
+        """
+        started = 0
+        if pool is None:
+            while stop is None or not stop.is_set():
+                job = self._claim()
+                if job is None:
+                    break
+                self.poll(job)
+                started += 1
+            return started
+        if max_workers is None:
+            max_workers = pool._max_workers
+        in_flight = set()
+        while True:
+            while len(in_flight) < max_workers and \
+                    (stop is None or not stop.is_set()):
+                job = self._claim()
+                if job is None:
+                    break
+                in_flight.add(pool.submit(self.poll, job))
+                started += 1
+            if not in_flight:
+                return started
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+
+    def run(self, stop: Event, max_workers: int = 4) -> None:
+        """Polls continuously until stop is set.
+
+        :param stop: Set this to stop.
+        :type stop: threading.Event
+        :param max_workers: How many polls can wait on the network at once,
+            defaults to 4
+        :type max_workers: int, optional
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while not stop.is_set():
+                self.run_pending(pool, max_workers, stop)
+                self._wakeup.clear()
+                with self._lock:
+                    upcoming = [x.next_due for x in self.jobs.values()]
+                delay = min(upcoming) - self.clock() if upcoming else 1
+                self._wakeup.wait(max(0, min(delay, 1)))
+
+    def stats(self) -> dict:
+        """Queue depth and lag, for monitoring.
+
+        queue_depth is how many jobs are due right now; lag is how far past
+        due they are (seconds).
+
+        :rtype: dict
+        """
+        now = self.clock()
+        with self._lock:
+            jobs = list(self.jobs.values())
+            errors = self.errors
+        lags = [now - x.next_due for x in jobs if x.next_due <= now]
+        return {"jobs": len(jobs),
+                "queue_depth": len(lags),
+                "max_lag": max(lags) if lags else 0.0,
+                "mean_lag": sum(lags) / len(lags) if lags else 0.0,
+                "polls": sum(x.polls for x in jobs),
+                "changes": sum(x.changes for x in jobs),
+                "errors": errors}
@@ -0,0 +1,208 @@
+"""Detects what changed between polling sweeps.
+
+A MonthSnapshot is a compact record of one asset's month: a digest of the
+whole month plus each site's status codes (one byte per night).  The
+SnapshotStore keeps the last snapshot of each month per asset on disk.
+Diffing a fresh Availability against it skips months whose digest hasn't
+changed, then sites whose codes haven't changed, and only then looks at
+individual nights, so the work is proportional to what changed.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+from hashlib import blake2b
+from os import fdopen, makedirs, path, remove, replace
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dumps, loads
+from tempfile import mkstemp
+from threading import Lock
+from zlib import compress, decompress, error as ZlibError
+
+from .cache import default_cache_dir
+from .calendars import status_code, status_name, status_names
+from .utils import month_range, next_month, this_month
+
+MonthSnapshot = namedtuple("MonthSnapshot", ["digest", "sites"])
+MonthSnapshot.__doc__ = """One asset's month.
+
+digest fingerprints the whole month; sites maps each site id to the bytes of
+its status codes, one per night from the first of the month.
+"""
+
+# A night whose status changed.  before is None for nights we hadn't seen.
+Transition = namedtuple("Transition",
+                        ["asset_id", "site_id", "night", "before", "after"])
+
+
+def snapshot_month(availability, month: datetime,
+                   table: bytes = None) -> MonthSnapshot:
+    """Takes a snapshot of one month of an Availability.
+
+    :param availability: The campground's availability
+    :type availability: Availability
+    :param month: Any date in the month
+    :type month: datetime
+    :param table: A bytes.translate table to apply to the status codes
+        (before the digest), for codes that outlive this process, defaults
+        to None
+    :type table: bytes, optional
+    :rtype: MonthSnapshot
+    """
+    lo = this_month(month).toordinal()
+    hi = next_month(month).toordinal()
+    sites = {}
+    for site_id, site in availability.items():
+        codes = site.calendar.nights(lo, hi)
+        if codes.count(0) != len(codes):
+            sites[site_id] = codes if table is None else \
+                codes.translate(table)
+    return MonthSnapshot(_digest(sites), sites)
+
+
+def _digest(sites: dict) -> bytes:
+    digest = blake2b(digest_size=16)
+    for site_id in sorted(sites, key=str):
+        digest.update(str(site_id).encode("utf-8") + b"\0")
+        digest.update(sites[site_id])
+    return digest.digest()
+
+
+def covered_months(availability) -> [datetime]:
+    """The months an Availability has any nights in.
+
+    :rtype: [datetime]
+    """
+    calendars = [x.calendar for x in availability.values()]
+    calendars = [x for x in calendars if x.codes]
+    if not calendars:
+        return []
+    first = date.fromordinal(min(x.start for x in calendars))
+    last = date.fromordinal(max(x.end for x in calendars) - 1)
+    return month_range(datetime(first.year, first.month, 1),
+                       datetime(last.year, last.month, 1))
+
+
+class SnapshotStore:
+    """Keeps the last snapshot of every month for each asset on disk.
+    """
+    suffix = ".snapshots"
+
+    def __init__(self, directory: str = None):
+        """
+        :param directory: Where to keep the files, defaults to a
+            "snapshots" directory in default_cache_dir()
+        :type directory: str, optional
+        """
+        self.directory = directory or \
+            path.join(default_cache_dir(), "snapshots")
+        makedirs(self.directory, exist_ok=True)
+        self._assets = {}
+        self._lock = Lock()
+
+    def _path(self, asset_id: int) -> str:
+        return path.join(self.directory, f"{int(asset_id)}{self.suffix}")
+
+    def get(self, asset_id: int) -> dict:
+        """The stored snapshots for an asset.
+
+        :return: month ordinal to MonthSnapshot
+        :rtype: dict
+        """
+        with self._lock:
+            if asset_id not in self._assets:
+                self._assets[asset_id] = self._load(asset_id)
+            return self._assets[asset_id]
+
+    def _load(self, asset_id: int) -> dict:
+        try:
+            with open(self._path(asset_id), "rb") as fh:
+                names, months = loads(decompress(fh.read()))
+        except FileNotFoundError:
+            return {}
+        except (ZlibError, UnpicklingError, EOFError, TypeError,
+                ValueError):
+            # Truncated or corrupt: as good as no snapshots at all.
+            return {}
+        months = {k: MonthSnapshot(*v) for k, v in months.items()}
+        if tuple(names) != status_names()[:len(names)]:
+            # Another process numbered the statuses differently.
+            table = bytes(status_code(x) if x else 0 for x in names) + \
+                bytes(256 - len(names))
+            for k, v in months.items():
+                sites = {site: codes.translate(table)
+                         for site, codes in v.sites.items()}
+                months[k] = MonthSnapshot(_digest(sites), sites)
+        return months
+
+    def save(self, asset_id: int) -> None:
+        """Writes an asset's snapshots to disk."""
+        stored = self.get(asset_id)
+        with self._lock:
+            months = {k: tuple(v) for k, v in stored.items()}
+        fd, tmpname = mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with fdopen(fd, "wb") as fh:
+                fh.write(compress(dumps((status_names(), months),
+                                        protocol=HIGHEST_PROTOCOL)))
+            replace(tmpname, self._path(asset_id))
+        except BaseException:
+            remove(tmpname)
+            raise
+
+    def unchanged(self, asset_id: int, month: datetime,
+                  snapshot: MonthSnapshot) -> bool:
+        """Whether a month looks exactly like it did last time.
+
+        :rtype: bool
+        """
+        old = self.get(asset_id).get(this_month(month).toordinal())
+        return old is not None and old.digest == snapshot.digest
+
+    def diff(self, availability, months: list = None, to_status: str = None,
+             save: bool = True) -> [Transition]:
+        """Finds the nights that changed since the last diff, and remembers
+        the new state.
+
+        :param availability: The campground's (unfiltered) availability
+        :type availability: Availability
+        :param months: Which months to compare, defaults to every month the
+            availability has data for
+        :type months: [datetime], optional
+        :param to_status: Only report nights that changed to this status,
+            e.g. "Available", defaults to None (all changes)
+        :type to_status: str, optional
+        :param save: Write the new snapshots to disk, defaults to True
+        :type save: bool, optional
+        :return: the changed nights, ordered by month, site, then night.
+        :rtype: [Transition]
+        """
+        asset_id = availability.asset_id
+        stored = self.get(asset_id)
+        if months is None:
+            months = covered_months(availability)
+        transitions = []
+        with self._lock:
+            for month in months:
+                key = this_month(month).toordinal()
+                snapshot = snapshot_month(availability, month)
+                old = stored.get(key)
+                if old is not None and old.digest == snapshot.digest:
+                    continue
+                old_sites = old.sites if old is not None else {}
+                for site_id, codes in snapshot.sites.items():
+                    before = old_sites.get(site_id)
+                    if before == codes:
+                        continue
+                    if before is None:
+                        before = bytes(len(codes))
+                    for i, (was, now) in enumerate(zip(before, codes)):
+                        if was == now or not now:
+                            continue
+                        after = status_name(now)
+                        if to_status is not None and after != to_status:
+                            continue
+                        transitions.append(Transition(
+                            asset_id, site_id, date.fromordinal(key + i),
+                            status_name(was) if was else None, after))
+                stored[key] = snapshot
+        if save:
+            self.save(asset_id)
+        return transitions
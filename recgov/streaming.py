@@ -0,0 +1,145 @@
+"""Parses big JSON responses as they download.
+
+Month and RIDB responses are one JSON object with one big field ("campsites"
+or "RECDATA") and a few small ones.  JSONStream walks the object a chunk at a
+time and hands out the big field's members as soon as each one has been
+read, so the whole body is never held at once (as bytes, text and objects
+all together, like ``resp.json()`` does), and the caller can work while the
+rest downloads::
+
+    with session.get(url, stream=True) as resp:
+        stream = JSONStream.from_response(resp)
+        for site_id, site in stream.iter_field("campsites"):
+            ...
+"""
+from codecs import getincrementaldecoder
+from json import JSONDecodeError, JSONDecoder
+
+_WHITESPACE = " \t\n\r"
+_decoder = JSONDecoder()
+
+
+class JSONStream:
+    """Incrementally parses a JSON object from chunks of bytes.
+    """
+    # Bytes to ask the response for at a time.
+    chunk_size = 64 * 1024
+
+    def __init__(self, chunks, encoding: str = "utf-8"):
+        """
+        :param chunks: the body, in pieces
+        :type chunks: Iterable[bytes]
+        :param encoding: defaults to "utf-8", which is what JSON should be
+        :type encoding: str, optional
+        """
+        self._chunks = iter(chunks)
+        self._text = getincrementaldecoder(encoding)()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        # The top-level fields we didn't stream, once they've been read.
+        self.rest = {}
+
+    @classmethod
+    def from_response(cls, resp, chunk_size: int = None) -> "JSONStream":
+        """Streams a requests Response (ideally one made with stream=True).
+
+        :rtype: JSONStream
+        """
+        return cls(resp.iter_content(chunk_size or cls.chunk_size))
+
+    def _read(self) -> bool:
+        """Adds the next chunk to the buffer, dropping what's been parsed.
+
+        :return: False if there's nothing more to read.
+        """
+        if self._eof:
+            return False
+        text = ""
+        for chunk in self._chunks:
+            text = self._text.decode(chunk)
+            if text:
+                break
+        else:
+            self._eof = True
+            text = self._text.decode(b"", final=True)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def _peek(self) -> str:
+        """The next character that isn't whitespace ("" at the end)."""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, "
+                             f"found {char or 'the end'!r}")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Parses the next whole value, reading more until it's complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer might not be finished.
+            if end < len(self._buf) or self._eof:
+                self._pos = end
+                return value
+            self._read()
+
+    def _members(self):
+        close = "}" if self._expect("{[") == "{" else "]"
+        if self._peek() == close:
+            self._pos += 1
+            return
+        while True:
+            if close == "}":
+                key = self._value()
+                self._expect(":")
+                yield key, self._value()
+            else:
+                yield self._value()
+            if self._expect("," + close) == close:
+                return
+
+    def iter_field(self, name: str):
+        """Streams one top-level field of the object.
+
+        Every other top-level field is parsed whole and ends up in rest,
+        which is complete once iteration finishes.
+
+        :param name: the field to stream, e.g. "campsites"
+        :type name: str
+        :raises ValueError: If the JSON is malformed.
+        :yield: (key, value) pairs if the field is an object, or the values
+            if it's an array.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == name and self._peek() in ("{", "["):
+                yield from self._members()
+            else:
+                self.rest[key] = self._value()
+            if self._expect(",}") == "}":
+                return
@@ -0,0 +1,149 @@
+"""Makes up realistic campgrounds, for benchmarks and tests.
+
+The records look like what RIDB and the month endpoint send: the same
+fields, the same string formats, statuses that come in runs, a handful of
+loops and campsite types, attributes and permitted equipment.  Everything
+is derived from a seed, so the same arguments always give the same data.
+"""
+from calendar import monthrange
+from datetime import datetime
+from random import Random
+
+from .utils import month_range
+
+CAMPSITE_TYPES = ("STANDARD NONELECTRIC", "STANDARD ELECTRIC",
+                  "TENT ONLY NONELECTRIC", "RV NONELECTRIC",
+                  "GROUP STANDARD NONELECTRIC", "WALK TO",
+                  "CABIN NONELECTRIC")
+EQUIPMENT = ("Tent", "RV", "Trailer", "Pickup Camper", "Fifth Wheel",
+             "Caravan/Camper Van", "Pop up", "Small Tent")
+# Status and how likely each run is to have it.
+STATUSES = (("Reserved", 60), ("Available", 25), ("Not Reservable", 10),
+            ("Not Available", 5))
+_ATTRIBUTES = (("Max Num of People", ("4", "6", "8", "10")),
+               ("Min Num of People", ("1", )),
+               ("Max Num of Vehicles", ("1", "2")),
+               ("Driveway Entry", ("Back-In", "Pull-Through", "Parallel")),
+               ("Driveway Surface", ("Paved", "Gravel", "Dirt")),
+               ("Shade", ("Full", "Partial", "No")),
+               ("Campfire Allowed", ("Yes", "No")),
+               ("Pets Allowed", ("Yes", "Domestic", "No")),
+               ("Checkin Time", ("2:00 PM", "3:00 PM")),
+               ("Checkout Time", ("12:00 PM", "11:00 AM")),
+               ("Fire Pit", ("Y", "N")),
+               ("Picnic Table", ("Y", "N")))
+
+
+def campsite_records(sites: int, facility_id: int = 1,
+                     seed: int = 0) -> [dict]:
+    """RIDB campsite records for a made-up facility.
+
+    :param sites: how many campsites
+    :type sites: int
+    :param facility_id: defaults to 1
+    :type facility_id: int, optional
+    :rtype: [dict]
+    """
+    rng = Random(f"{seed}-{facility_id}-ridb")
+    loops = [chr(ord("A") + x) for x in range(max(1, min(26, sites // 40)))]
+    records = []
+    for i in range(sites):
+        equipment = rng.sample(EQUIPMENT, rng.randint(1, 5))
+        records.append({
+            "CampsiteID": str(facility_id * 1000000 + i),
+            "FacilityID": str(facility_id),
+            "CampsiteName": f"{i % 1000:03d}",
+            "CampsiteType": rng.choice(CAMPSITE_TYPES),
+            "TypeOfUse": "Overnight",
+            "Loop": loops[i * len(loops) // sites],
+            "CampsiteAccessible": rng.random() < 0.05,
+            "CampsiteLongitude": round(-105.6 + rng.uniform(-0.01, 0.01), 6),
+            "CampsiteLatitude": round(40.3 + rng.uniform(-0.01, 0.01), 6),
+            "CreatedDate": "2014-05-01",
+            "LastUpdatedDate": "2021-03-01",
+            "ATTRIBUTES": [{"AttributeName": name,
+                            "AttributeValue": rng.choice(values)}
+                           for name, values in _ATTRIBUTES],
+            "PERMITTEDEQUIPMENT": [{"EquipmentName": x,
+                                    "MaxLength": rng.choice((0, 20, 25, 30,
+                                                             35, 40, 45))}
+                                   for x in equipment],
+            "ENTITYMEDIA": []})
+    return records
+
+
+def ridb_pages(records: list, page_size: int = 50) -> [dict]:
+    """Splits records into RIDB pages, METADATA and all.
+
+    :rtype: [dict]
+    """
+    pages = []
+    for offset in range(0, max(len(records), 1), page_size):
+        page = records[offset:offset + page_size]
+        pages.append({"RECDATA": page, "METADATA": {
+            "RESULTS": {"CURRENT_COUNT": len(page),
+                        "TOTAL_COUNT": len(records)},
+            "SEARCH_PARAMETERS": {"QUERY": "", "LIMIT": page_size,
+                                  "OFFSET": offset}}})
+    return pages
+
+
+def _statuses(rng: Random, nights: int) -> [str]:
+    names = [x[0] for x in STATUSES]
+    weights = [x[1] for x in STATUSES]
+    statuses = []
+    while len(statuses) < nights:
+        status = rng.choices(names, weights)[0]
+        statuses.extend([status] * rng.randint(1, 7))
+    return statuses[:nights]
+
+
+def month_response(records: list, month: datetime, seed: int = 0) -> dict:
+    """A month endpoint response for the sites in some RIDB records.
+
+    :param records: from campsite_records
+    :type records: [dict]
+    :param month: the first of the month
+    :type month: datetime
+    :rtype: dict
+    """
+    rng = Random(f"{seed}-{month:%Y-%m}")
+    keys = [f"{month:%Y-%m}-{day:02d}T00:00:00Z"
+            for day in range(1, monthrange(month.year, month.month)[1] + 1)]
+    campsites = {}
+    for record in records:
+        site_id = record["CampsiteID"]
+        campsites[site_id] = {
+            "campsite_id": site_id,
+            "site": record["CampsiteName"],
+            "loop": record["Loop"],
+            "campsite_reserve_type": "Site-Specific",
+            "availabilities": dict(zip(keys, _statuses(rng, len(keys)))),
+            "quantities": {},
+            "campsite_type": record["CampsiteType"],
+            "type_of_use": "Overnight",
+            "min_num_people": 1,
+            "max_num_people": 8,
+            "capacity_rating": "Single",
+            "hide_external": False,
+            "campsite_rules": None,
+            "supplemental_camping": None}
+    return {"campsites": campsites, "count": len(campsites)}
+
+
+def month_responses(records: list, months: int, first: datetime = None,
+                    seed: int = 0) -> dict:
+    """month_response for several months in a row.
+
+    :param months: how many months
+    :type months: int
+    :param first: first month, defaults to January 2021
+    :type first: datetime, optional
+    :return: month to response
+    :rtype: dict
+    """
+    first = first or datetime(2021, 1, 1)
+    index = first.month - 1 + months - 1
+    last = datetime(first.year + index // 12, index % 12 + 1, 1)
+    return {x: month_response(records, x, seed)
+            for x in month_range(first, last)}
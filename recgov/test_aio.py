@@ -0,0 +1,134 @@
+from ._requests import RetryPolicy
+from .campsites import CampsiteSet
+from .ridb import RIDBStore
+from .synthetic import campsite_records
+from .test_availability import month_dict
+from .test_ridb import export
+from datetime import datetime, timezone
+import asyncio
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from .aio import AsyncAvailability, AsyncSessionPaginator, \
+    get_campsites_async  # noqa: E402
+
+UTC = timezone.utc
+
+
+def serve(test):
+    """Runs test(base_url, hits) against a little fake recreation.gov."""
+    hits = {"month": 0, "ridb": 0, "failed": 0}
+
+    async def month(request):
+        hits["month"] += 1
+        start = datetime.strptime(request.query["start_date"],
+                                  "%Y-%m-%dT%H:%M:%S.000Z")
+        return web.json_response(month_dict(start))
+
+    async def campsites(request):
+        hits["ridb"] += 1
+        if hits["ridb"] == 2 and not hits["failed"]:
+            hits["failed"] += 1
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        offset, limit = int(request.query["offset"]), \
+            int(request.query["limit"])
+        records = [{"CampsiteID": str(x)}
+                   for x in range(offset, min(offset + limit, 120))]
+        return web.json_response({
+            "RECDATA": records,
+            "METADATA": {"RESULTS": {"CURRENT_COUNT": len(records),
+                                     "TOTAL_COUNT": 120}}})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get(
+            "/api/camps/availability/campground/{asset}/month", month)
+        app.router.add_get("/api/v1/facilities/{asset}/campsites", campsites)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            await test(f"http://127.0.0.1:{port}", hits)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def session() -> AsyncSessionPaginator:
+    return AsyncSessionPaginator(aiohttp.ClientSession(),
+                                 RetryPolicy(backoff_factor=0))
+
+
+class TestAsync:
+    def test_record_iterator(self):
+        async def test(base, hits):
+            async with session() as sess:
+                records = [x["CampsiteID"] async for x in
+                           sess.get_record_iterator(
+                               base + "/api/v1/facilities/1/campsites",
+                               page_size=10)]
+            assert records == [str(x) for x in range(120)]
+            # 12 pages, and one retry.
+            assert hits["ridb"] == 13
+
+        serve(test)
+
+    def test_apply_filters(self):
+        async def test(base, hits):
+            async with session() as sess:
+                av = AsyncAvailability(1, campsites=CampsiteSet(),
+                                       session=sess)
+                av._URL_MONTH = base + \
+                    "/api/camps/availability/campground/{asset_id}/month"
+                result = await av.apply_filters(
+                    {"start_date": datetime(2021, 3, 1, tzinfo=UTC),
+                     "end_date": datetime(2021, 5, 31, tzinfo=UTC)})
+            assert hits["month"] == 3
+            assert result["1"].available_nights == 3 * 28
+
+        serve(test)
+
+    def test_concurrent_months_share(self):
+        async def test(base, hits):
+            async with session() as sess:
+                avs = [AsyncAvailability(1, campsites=CampsiteSet(),
+                                         session=sess) for _ in range(3)]
+                for av in avs:
+                    av._URL_MONTH = base + \
+                        "/api/camps/availability/campground/{asset_id}/month"
+                results = await asyncio.gather(
+                    *[x.get_month_dict(datetime(2021, 3, 1)) for x in avs])
+            assert hits["month"] == 1
+            assert results[0] is results[2]
+
+        serve(test)
+
+    def test_needs_campsites(self):
+        with pytest.raises(ValueError):
+            AsyncAvailability(1)
+
+    def test_iter_month(self):
+        async def test(base, hits):
+            async with session() as sess:
+                av = AsyncAvailability(1, campsites=CampsiteSet(),
+                                       session=sess)
+                av._URL_MONTH = base + \
+                    "/api/camps/availability/campground/{asset_id}/month"
+                sites = [x async for x in av.iter_month(datetime(2021, 3, 1))]
+            assert [x[0] for x in sites] == ["1"]
+
+        serve(test)
+
+    def test_store(self, tmp_path):
+        with RIDBStore(str(tmp_path / "ridb.sqlite3")) as store:
+            store.load_export(export(str(tmp_path / "export.zip"),
+                                     campsite_records(3, facility_id=7)))
+            av = asyncio.run(AsyncAvailability.create(
+                7, ridb_session=object(), store=store))
+            assert len(av.campsites) == 3
+            assert asyncio.run(get_campsites_async(
+                7, session=object(), store=store)) == store.get(7)
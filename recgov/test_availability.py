@@ -0,0 +1,193 @@
+from . import availability
+from .availability import Availability, RECGOV
+from .campsites import CampsiteSet
+from ._requests import default_anonymous_session
+from .test_requests import FakeResponse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from time import sleep
+import pytest
+
+UTC = timezone.utc
+
+
+def month_dict(month: datetime) -> dict:
+    """Builds a month response with one site available every day."""
+    days = [datetime(month.year, month.month, d)
+            for d in range(1, 29)]
+    return {"campsites": {
+        "1": {"campsite_id": "1", "loop": "A", "site": "001",
+              "availabilities": {
+                  x.strftime("%Y-%m-%dT00:00:00Z"): "Available"
+                  for x in days}}}}
+
+
+@pytest.fixture
+def avail(monkeypatch):
+    monkeypatch.setattr(availability, "get_campsites",
+                        lambda *args, **kwargs: CampsiteSet({}))
+    return Availability(1)
+
+
+class TestAvailability:
+    def test_apply_filters_requires_start_date(self, avail):
+        with pytest.raises(RuntimeError):
+            avail.apply_filters({})
+
+    def test_retrieve_months_concurrently(self, avail, monkeypatch):
+        """All months are in flight at once, and merge in month order."""
+        lock = Lock()
+        state = {"active": 0, "peak": 0}
+        merged = []
+
+        def get_month_dict(month):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            # Later months return sooner.
+            sleep(0.05 * (12 - month.month))
+            with lock:
+                state["active"] -= 1
+            return month_dict(month)
+
+        original_merge = avail.merge_availabilities
+
+        def merge_availabilities(other):
+            merged.append(next(iter(other["1"]["availabilities"])))
+            original_merge(other)
+
+        monkeypatch.setattr(avail, "get_month_dict", get_month_dict)
+        monkeypatch.setattr(avail, "merge_availabilities",
+                            merge_availabilities)
+        result = avail.apply_filters(
+            {"start_date": datetime(2021, 3, 1, tzinfo=UTC),
+             "end_date": datetime(2021, 6, 30, tzinfo=UTC)})
+
+        assert state["peak"] == 4
+        assert merged == ["2021-03-01T00:00:00Z", "2021-04-01T00:00:00Z",
+                          "2021-05-01T00:00:00Z", "2021-06-01T00:00:00Z"]
+        assert result["1"].available_nights == 4 * 28
+
+    def test_retrieve_months_serial(self, avail, monkeypatch):
+        calls = []
+
+        def iter_month(month):
+            calls.append(month)
+            return month_dict(month)['campsites'].items()
+
+        monkeypatch.setattr(avail, "iter_month", iter_month)
+        avail.apply_filters(
+            {"start_date": datetime(2021, 3, 1, tzinfo=UTC),
+             "end_date": datetime(2021, 4, 30, tzinfo=UTC)},
+            max_workers=1)
+        assert calls == [datetime(2021, 3, 1), datetime(2021, 4, 1)]
+
+    def test_injected_session(self, monkeypatch):
+        monkeypatch.setattr(availability, "get_campsites",
+                            lambda *args, **kwargs: CampsiteSet({}))
+        calls = []
+
+        class Session:
+            def get(self, url, params=None, **kwargs):
+                calls.append((url, params))
+                return FakeResponse(month_dict(datetime(2021, 3, 1)))
+
+        avail = Availability(232463, session=Session())
+        avail.retrieve_month(datetime(2021, 3, 1), {})
+        assert calls == [
+            (RECGOV + "/api/camps/availability/campground/232463/month",
+             {"start_date": "2021-03-01T00:00:00.000Z"})]
+        assert avail["1"].available_nights == 28
+
+    def test_concurrent_month_requests_share(self):
+        calls = []
+
+        class Session:
+            def get(self, url, params=None, **kwargs):
+                calls.append(params["start_date"])
+                sleep(0.1)
+                return FakeResponse(month_dict(datetime(2021, 3, 1)))
+
+        sess = Session()
+        avails = [Availability(1, session=sess, campsites=CampsiteSet())
+                  for _ in range(4)]
+        months = [datetime(2021, 3, 1)] * 3 + [datetime(2021, 4, 1)]
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda x: x[0].get_month_dict(x[1]),
+                                    zip(avails, months)))
+        assert sorted(calls) == ["2021-03-01T00:00:00.000Z",
+                                 "2021-04-01T00:00:00.000Z"]
+        assert results[0] is results[1] is results[2]
+
+    def test_module_sess(self):
+        assert availability.sess is default_anonymous_session()
+
+
+def reference_filter(avail, start=None, end=None) -> dict:
+    """How date filtering used to work: strptime every key."""
+    def keep(key):
+        when = datetime.strptime(key, Availability.datefmt)
+        return (start is None or when >= start) and \
+            (end is None or when <= end)
+    return {k: {key: status for key, status in v['availabilities'].items()
+                if keep(key)}
+            for k, v in avail.items()}
+
+
+class TestFilterDates:
+    @pytest.fixture
+    def filled(self, avail):
+        for month in [datetime(2021, 3, 1), datetime(2021, 4, 1)]:
+            avail.merge_availabilities(month_dict(month)['campsites'])
+        return avail
+
+    @pytest.mark.parametrize("start,end", [
+        (datetime(2021, 3, 10, tzinfo=UTC), datetime(2021, 4, 5, tzinfo=UTC)),
+        (datetime(2021, 3, 10, 1, tzinfo=UTC), None),
+        (None, datetime(2021, 3, 9, 23, tzinfo=UTC)),
+        (datetime(2021, 3, 10, tzinfo=timezone(timedelta(hours=-7))),
+         datetime(2021, 3, 12, tzinfo=timezone(timedelta(hours=5)))),
+        (datetime(2022, 1, 1, tzinfo=UTC), None),
+    ])
+    def test_matches_reference(self, filled, start, end):
+        filters = {}
+        if start is not None:
+            filters['start_date'] = start
+        if end is not None:
+            filters['end_date'] = end
+        expected = reference_filter(filled, start, end)
+        result = filled.filter(filters)
+        assert {k: dict(v['availabilities'])
+                for k, v in result.items()} == expected
+        # Filtering chains the same way.
+        result = filled
+        for name, value in filters.items():
+            result = getattr(result, f"filter_{name}")(value)
+        assert {k: dict(v['availabilities'])
+                for k, v in result.items()} == expected
+
+    def test_original_untouched(self, filled):
+        before = {k: dict(v['availabilities']) for k, v in filled.items()}
+        result = filled.filter_start_date(datetime(2021, 4, 1, tzinfo=UTC))
+        result["1"]['availabilities']["2021-04-02T00:00:00Z"] = "Reserved"
+        assert {k: dict(v['availabilities'])
+                for k, v in filled.items()} == before
+        assert result.asset_id == filled.asset_id
+        assert result.campsites is filled.campsites
+
+    def test_naive_dates(self, filled):
+        with pytest.raises(TypeError):
+            filled.filter_start_date(datetime(2021, 3, 1))
+
+    def test_unknown_filter(self, filled):
+        with pytest.raises(RuntimeError):
+            filled.filter({"start_date": datetime(2021, 3, 1, tzinfo=UTC),
+                           "spam": 1})
+
+    def test_find_stays(self, filled):
+        stays = filled.find_stays(min_nights=3, limit=2)
+        # Each month has nights 1-28 available.
+        assert [(x.site_id, x.arrival.isoformat(), x.nights)
+                for x in stays] == [("1", "2021-03-01", 28),
+                                    ("1", "2021-04-01", 28)]
@@ -0,0 +1,74 @@
+from . import cache as cache_module
+from .cache import CampsiteCache
+from .campsites import CampsiteSet
+from .test_campsites import SORTED_CAMPSITES
+from os import listdir, remove, utime
+from pickle import dumps
+from threading import Thread
+from time import time
+import pytest
+
+cset = CampsiteSet.from_list(SORTED_CAMPSITES)
+
+
+class TestCampsiteCache:
+    def test_round_trip(self, tmp_path):
+        cache = CampsiteCache(str(tmp_path))
+        assert cache.get(1) is None
+        cache.put(1, cset)
+        assert cache.get(1) == cset
+        cache.invalidate(1)
+        assert cache.get(1) is None
+
+    def test_evicted_while_reading(self, tmp_path, monkeypatch):
+        cache = CampsiteCache(str(tmp_path))
+        cache.put(1, cset)
+
+        def evicted(filename):
+            remove(filename)
+            utime(filename)
+        monkeypatch.setattr(cache_module, "utime", evicted)
+        assert cache.get(1) == cset
+
+    def test_dumps_is_compact(self):
+        assert CampsiteSet.loads(cset.dumps()) == cset
+        assert len(cset.dumps()) < len(dumps([dict(x) for x in cset.values()]))
+
+    @pytest.mark.parametrize("damage", [
+        lambda data: data[:5], lambda data: data[:20],
+        lambda data: data[:8] + b"not zlib"])
+    def test_corrupt_files_are_misses(self, tmp_path, damage):
+        cache = CampsiteCache(str(tmp_path))
+        cache.put(1, cset)
+        data = (tmp_path / "1.campsites").read_bytes()
+        (tmp_path / "1.campsites").write_bytes(damage(data))
+        assert cache.get(1) is None
+        assert listdir(tmp_path) == []
+
+    def test_concurrent_puts(self, tmp_path):
+        caches = [CampsiteCache(str(tmp_path)) for _ in range(2)]
+        threads = [Thread(target=x.put, args=(1, cset))
+                   for x in caches * 4]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert caches[0].get(1) == cset
+        assert listdir(tmp_path) == ["1.campsites"]
+
+    def test_ttl(self, tmp_path):
+        cache = CampsiteCache(str(tmp_path), ttl=-1)
+        cache.put(1, cset)
+        assert cache.get(1) is None
+
+    def test_eviction(self, tmp_path):
+        cache = CampsiteCache(str(tmp_path))
+        cache.put(1, cset)
+        size = (tmp_path / "1.campsites").stat().st_size
+        cache.max_bytes = 2 * size
+        # Asset 2 is the least recently used once we read asset 1.
+        cache.put(2, cset)
+        utime(tmp_path / "2.campsites", (time() - 60, time() - 60))
+        assert cache.get(1) == cset
+        cache.put(3, cset)
+        assert sorted(listdir(tmp_path)) == ["1.campsites", "3.campsites"]
@@ -0,0 +1,116 @@
+from .calendars import SiteCalendar, status_code, status_name, key_ordinal, \
+    night_key, find_stays, Stay, AVAILABLE
+from .test_campsites import CAMPSITE
+from datetime import date
+from copy import deepcopy
+from random import Random
+
+AVAIL = CAMPSITE["availabilities"]
+
+
+class TestSiteCalendar:
+    def test_round_trip(self):
+        cal = SiteCalendar(AVAIL)
+        assert dict(cal) == AVAIL
+        assert list(cal) == list(AVAIL)
+        assert cal == AVAIL
+        assert len(cal.codes) == len(AVAIL)
+
+    def test_mapping(self):
+        cal = SiteCalendar(AVAIL)
+        assert cal["2021-01-03T00:00:00Z"] == "Reserved"
+        assert "2021-01-09T00:00:00Z" not in cal
+        del cal["2021-01-03T00:00:00Z"]
+        assert len(cal) == len(AVAIL) - 1
+        cal["2020-12-30T00:00:00Z"] = "Available"
+        assert cal.start == key_ordinal("2020-12-30T00:00:00Z")
+        assert next(iter(cal)) == "2020-12-30T00:00:00Z"
+        # Nothing known about 12/31.
+        assert "2020-12-31T00:00:00Z" not in cal
+
+    def test_update_months(self):
+        cal = SiteCalendar({"2021-02-01T00:00:00Z": "Reserved"})
+        cal.update(AVAIL)
+        cal.update(SiteCalendar({"2021-01-04T00:00:00Z": "Available"}))
+        assert cal["2021-01-04T00:00:00Z"] == "Available"
+        assert cal["2021-02-01T00:00:00Z"] == "Reserved"
+        assert len(cal) == len(AVAIL) + 1
+
+    def test_unordered_keys(self):
+        avail = dict(reversed(list(AVAIL.items())))
+        assert SiteCalendar(avail) == AVAIL
+
+    def test_new_status(self):
+        code = status_code("Spam")
+        assert status_name(code) == "Spam"
+        assert SiteCalendar({"2021-01-01T00:00:00Z": "Spam"}).count(
+            "Spam") == 1
+
+    def test_available_ranges(self):
+        assert SiteCalendar(AVAIL).available_ranges() == [
+            (date(2021, 1, 1), date(2021, 1, 2)),
+            (date(2021, 1, 6), date(2021, 1, 6))]
+
+    def test_copy(self):
+        cal = SiteCalendar(AVAIL)
+        other = deepcopy(cal)
+        other["2021-01-03T00:00:00Z"] = "Available"
+        assert cal == AVAIL
+
+    def test_night_key(self):
+        assert night_key(key_ordinal("2021-03-01T00:00:00Z")) == \
+            "2021-03-01T00:00:00Z"
+
+
+def brute_force_stays(rows, min_nights, max_nights, weekdays):
+    """Night by night, the slow way."""
+    stays = []
+    for asset_id, site_id, cal in rows:
+        for i in range(len(cal.codes)):
+            run = 0
+            while i + run < len(cal.codes) and \
+                    cal.codes[i + run] == AVAILABLE:
+                run += 1
+            arrival = date.fromordinal(cal.start + i)
+            if run >= min_nights and arrival.weekday() in weekdays:
+                stays.append(Stay(asset_id, site_id, arrival,
+                                  min(run, max_nights)))
+    return sorted(stays, key=lambda x: (-x.nights, x.arrival,
+                                       str(x.asset_id), str(x.site_id)))
+
+
+class TestFindStays:
+    rows = [(1, "a", SiteCalendar(AVAIL))]
+
+    def test_stays(self):
+        assert find_stays(self.rows) == [
+            Stay(1, "a", date(2021, 1, 1), 2),
+            Stay(1, "a", date(2021, 1, 2), 1),
+            Stay(1, "a", date(2021, 1, 6), 1)]
+        assert find_stays(self.rows, min_nights=2) == [
+            Stay(1, "a", date(2021, 1, 1), 2)]
+        assert find_stays(self.rows)[0].departure == date(2021, 1, 3)
+
+    def test_arrival_window(self):
+        assert find_stays(self.rows, arrival_start=date(2021, 1, 2),
+                          arrival_end=date(2021, 1, 5)) == [
+            Stay(1, "a", date(2021, 1, 2), 1)]
+
+    def test_weekdays_and_limit(self):
+        # 2021-01-01 was a Friday.
+        assert find_stays(self.rows, weekdays=[4, 5], limit=1) == [
+            Stay(1, "a", date(2021, 1, 1), 2)]
+
+    def test_many_sites(self):
+        rng = Random(42)
+        rows = []
+        for site in range(50):
+            cal = SiteCalendar(start=date(2021, 3, 1).toordinal() + site % 3)
+            cal.codes = bytearray(rng.choice([1, 1, 1, 2])
+                                  for _ in range(60))
+            rows.append((site // 10, site, cal))
+        for min_nights, max_nights in [(1, 3), (2, 5), (4, 4)]:
+            assert find_stays(rows, min_nights=min_nights,
+                              max_nights=max_nights,
+                              weekdays=[4, 5]) == \
+                brute_force_stays(rows, min_nights, max_nights, {4, 5})
@@ -1,6 +1,11 @@
-from .campsites import Campsite, CampsiteSet
+from .campsites import Campsite, CampsiteSet, get_campsites
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from json import dumps, loads
+from pickle import dumps as pickle_dumps
+from pickle import loads as pickle_loads
 from random import sample
+from time import sleep
 
 CAMPSITE = {
     "CampsiteID": 1,
@@ -120,6 +125,43 @@ class TestCampsite():
         # Just to be sure . . . the shuffle actually did something.
         assert shuffled_sites != sites
 
+    def test_no_instance_dict(self):
+        assert not hasattr(self.campsite, "__dict__")
+
+    def test_strings_interned(self):
+        a = Campsite(loads(dumps(CAMPSITE)))
+        b = Campsite(loads(dumps(CAMPSITE)))
+        assert a['Loop'] is b['Loop']
+        assert a['CampsiteType'] is b['CampsiteType']
+        assert a['ATTRIBUTES'][0]['AttributeName'] is \
+            b['ATTRIBUTES'][0]['AttributeName']
+
+    def test_derived_fields_cached(self):
+        cs = Campsite(deepcopy(CAMPSITE))
+        assert cs.attributes is cs.attributes
+        assert cs.permitted_equipment_lengths is \
+            cs.permitted_equipment_lengths
+
+    def test_caches_forgotten_on_change(self):
+        cs = Campsite(deepcopy(CAMPSITE))
+        assert cs.supports_equipment("Tent", 10)
+        assert cs.sort_key == "Ni042"
+        cs['PERMITTEDEQUIPMENT'] = [{"EquipmentName": "Tent",
+                                     "MaxLength": 5}]
+        assert not cs.supports_equipment("Tent", 10)
+        cs.update(Loop="Shrubbery")
+        assert cs.sort_key == "Shrubbery042"
+        cs['ATTRIBUTES'] = []
+        assert cs.attributes == {}
+
+    def test_pickle(self):
+        cs = Campsite(CAMPSITE)
+        cs.attributes
+        copied = pickle_loads(pickle_dumps(cs))
+        assert isinstance(copied, Campsite)
+        assert copied == cs
+        assert copied.attributes == cs.attributes
+
 
 cset = CampsiteSet.from_list(SORTED_CAMPSITES)
 emptycset = CampsiteSet({})
@@ -162,4 +204,63 @@ class TestCampsiteSet():
             {"filter_by_campsite_type": {"args": ["lame"]}}) == cset
 
     def test_with_availability(self):
-        assert cset.with_availability() == cset
\ No newline at end of file
+        assert cset.with_availability() == cset
+
+    def test_filter_by_loop(self):
+        assert list(cset.filter_by_loop("B")) == [153, 213]
+        assert list(cset.filter_by_loop("C", "A")) == \
+            [223, 133, 113, 155, 134, 625, 234]
+        assert cset.filter_by_loop("Z") == emptycset
+
+    def test_filters_share_campsites(self):
+        filtered = cset.filter_by_campsite_type("lame")
+        assert all(filtered[k] is cset[k] for k in cset)
+
+    def test_equipment_index_thresholds(self):
+        sites = CampsiteSet.from_list([
+            {"CampsiteID": i, "CampsiteType": "x", "Loop": "A",
+             "PERMITTEDEQUIPMENT": [{"EquipmentName": "RV",
+                                     "MaxLength": length}]}
+            for i, length in enumerate([30, 10, 20, 40])])
+        assert list(sites.filter_by_equipment("RV", 20)) == [0, 2, 3]
+        assert list(sites.filter_by_equipment("RV", 41)) == []
+        assert list(sites.filter_by_equipment("Tent", 0)) == []
+
+    def test_indexes_follow_changes(self):
+        sites = CampsiteSet(cset)
+        assert len(sites.filter_by_loop("A")) == 3
+        site = Campsite(sites[153], Loop="A")
+        sites[153] = site
+        assert list(sites.filter_by_loop("A")) == [223, 133, 113, 153]
+        del sites[223]
+        assert list(sites.filter_by_loop("A")) == [133, 113, 153]
+        sites.update({1: Campsite(CAMPSITE)})
+        assert sites.unique_campsite_types == {"lame", "Spam"}
+
+    def test_apply_filters_intersects(self):
+        assert list(cset.apply_filters({
+            "filter_by_loop": {"args": ["A", "B"]},
+            "filter_by_equipment": {"args": ["Trailer", 40]},
+            "with_availability": {}})) == [223, 133, 113, 153, 213]
+        assert cset.apply_filters({
+            "filter_by_loop": {"args": ["A"]},
+            "exclude_by_campsite_type": {"args": ["lame"]}}) == emptycset
+
+
+class TestGetCampsites:
+    def test_concurrent_calls_share_a_fetch(self):
+        class SlowSession:
+            pages = 0
+
+            def get_record_iterator(self, url):
+                self.pages += 1
+                sleep(0.1)
+                return [{"CampsiteID": str(x)} for x in range(3)]
+
+        sess = SlowSession()
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(
+                lambda _: get_campsites(1, session=sess), range(4)))
+        assert sess.pages == 1
+        assert len(set(id(x) for x in results)) == 4
+        assert results[0]["1"] is results[1]["1"]
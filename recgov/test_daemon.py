@@ -0,0 +1,110 @@
+from ._requests import RecgovSession, RetryPolicy, SessionPaginator
+from .daemon import Daemon
+from .fakeserver import FakeRecgov
+from os import listdir, utime
+from threading import Thread
+import pytest
+
+yaml = pytest.importorskip("yaml")
+
+JULY, JUNE = "2021-07-01T00:00:00+00:00", "2021-06-01T00:00:00+00:00"
+CONFIG = """
+tasks:
+- name: One
+  asset_id: 1
+  campsite_filters:
+    filter_by_equipment:
+      args: ["Tent", 0]
+  availability_filters:
+    start_date: {start}
+    end_date: 2021-07-20T00:00:00+00:00
+"""
+
+
+def session(cls=RecgovSession):
+    sess = cls()
+    sess.retry_policy = RetryPolicy(sleep=lambda x: None)
+    return sess
+
+
+@pytest.fixture
+def server():
+    with FakeRecgov(assets=2, sites=60) as server, server.pointed_at():
+        yield server
+
+
+def write_config(config_path, start, mtime):
+    config_path.write_text(CONFIG.format(start=start))
+    utime(str(config_path), (mtime, mtime))
+
+
+class TestDaemon:
+    def make(self, tmp_path, **kwargs):
+        write_config(tmp_path / "config.yml", JULY, 1000)
+        return Daemon(str(tmp_path / "config.yml"), session=session(),
+                      ridb_session=session(SessionPaginator), **kwargs)
+
+    def test_sweeps_keep_metadata(self, tmp_path, server):
+        daemon = self.make(tmp_path)
+        assert daemon.sweep() == 0
+        assert daemon.sweep() == 0
+        assert server.hits["ridb"] == 2
+        assert server.hits["month"] == 2
+        status = yaml.load((tmp_path / "status.yml").read_text(),
+                           Loader=yaml.FullLoader)
+        assert status["tasks"][0]["status"]["available_campsites"]
+
+    def test_metadata_ttl(self, tmp_path, server):
+        daemon = self.make(tmp_path, metadata_ttl=0)
+        daemon.sweep()
+        daemon.sweep()
+        assert server.hits["ridb"] == 4
+
+    def test_reload(self, tmp_path, server):
+        daemon = self.make(tmp_path)
+        daemon.sweep()
+        write_config(tmp_path / "config.yml", JUNE, 2000)
+        daemon.sweep()
+        # June is new; July is fetched again.
+        assert server.hits["month"] == 3
+        assert daemon.config["tasks"][0]["availability_filters"][
+            "start_date"].month == 6
+
+    def test_bad_reload_keeps_config(self, tmp_path, server):
+        daemon = self.make(tmp_path)
+        daemon.sweep()
+        (tmp_path / "config.yml").write_text("tasks: [")
+        utime(str(tmp_path / "config.yml"), (3000, 3000))
+        assert daemon.sweep() == 0
+        assert daemon.sweeps == 2
+
+    def test_status_not_half_written(self, tmp_path, server, monkeypatch):
+        daemon = self.make(tmp_path)
+        daemon.sweep()
+        status = (tmp_path / "status.yml").read_text()
+
+        def broken(*args):
+            raise RuntimeError("disk full")
+        monkeypatch.setattr(yaml, "dump", broken)
+        with pytest.raises(RuntimeError):
+            daemon.write_status()
+        assert (tmp_path / "status.yml").read_text() == status
+        assert sorted(listdir(tmp_path)) == ["config.yml", "status.yml"]
+
+    def test_failures(self, tmp_path, server):
+        daemon = self.make(tmp_path)
+        (tmp_path / "config.yml").write_text(
+            CONFIG.format(start=JULY).replace(
+                "asset_id: 1", "asset_id: 5"))
+        assert daemon.sweep() == 1
+
+    def test_stop(self, tmp_path, server):
+        daemon = self.make(tmp_path, interval=60)
+        thread = Thread(target=daemon.run)
+        thread.start()
+        while not daemon.sweeps:
+            thread.join(0.01)
+        daemon.stop()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert daemon.sweeps == 1
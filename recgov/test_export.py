@@ -0,0 +1,97 @@
+from .availability import Availability
+from .campsites import CampsiteSet
+from .export import campsite_columns, status_matrix, to_arrow, to_numpy, \
+    write_csv, write_parquet
+from .test_availability import month_dict
+from .test_campsites import SORTED_CAMPSITES
+from datetime import date, datetime
+from io import StringIO
+import csv
+import pytest
+
+cset = CampsiteSet.from_list(SORTED_CAMPSITES)
+
+
+def make_avail(asset_id: int, *months) -> Availability:
+    avail = Availability(asset_id, campsites=CampsiteSet())
+    for month in months:
+        avail.merge_availabilities(month_dict(month)['campsites'])
+    return avail
+
+
+class TestCampsiteColumns:
+    def test_columns(self):
+        columns = cset.columns()
+        assert columns["CampsiteID"] == list(cset)
+        assert columns["Loop"][:3] == ["A", "A", "A"]
+        # Fields the records don't have come out as None.
+        assert columns["CampsiteLatitude"] == [None] * len(cset)
+
+    def test_fields(self):
+        columns = campsite_columns(SORTED_CAMPSITES[:2],
+                                   ["CampsiteName", "Loop"])
+        assert columns == {"CampsiteName": ["001", "002"],
+                           "Loop": ["A", "A"]}
+
+    def test_csv(self):
+        fh = StringIO(newline="")
+        write_csv(campsite_columns(cset, ["CampsiteID", "Loop"]), fh)
+        rows = list(csv.reader(StringIO(fh.getvalue())))
+        assert rows[0] == ["CampsiteID", "Loop"]
+        assert rows[1] == ["223", "A"]
+        assert len(rows) == len(cset) + 1
+
+
+class TestStatusMatrix:
+    def test_matrix(self):
+        matrix = status_matrix([make_avail(1, datetime(2021, 3, 1)),
+                                make_avail(2, datetime(2021, 4, 1))])
+        assert matrix.keys == [(1, "1"), (2, "1")]
+        assert matrix.start == date(2021, 3, 1).toordinal()
+        # month_dict has data for the first 28 nights of each month.
+        assert matrix.nights == 31 + 28
+        assert matrix.row(0) == b"\1" * 28 + bytes(31)
+        assert matrix.row(1) == bytes(31) + b"\1" * 28
+        assert matrix.column(0) == b"\1\0"
+
+    def test_window(self):
+        avail = make_avail(1, datetime(2021, 3, 1))
+        matrix = avail.status_matrix(date(2021, 2, 27), date(2021, 3, 2))
+        assert matrix.dates[0] == date(2021, 2, 27)
+        assert matrix.codes == b"\0\0\1\1"
+
+    def test_empty(self):
+        matrix = status_matrix([])
+        assert matrix.keys == [] and matrix.nights == 0
+        assert matrix.columns() == {"asset_id": [], "site_id": []}
+
+    def test_columns_csv(self):
+        matrix = make_avail(1, datetime(2021, 3, 1)).status_matrix(
+            date(2021, 3, 28), date(2021, 3, 29))
+        fh = StringIO(newline="")
+        write_csv(matrix.columns(names=True), fh)
+        assert list(csv.reader(StringIO(fh.getvalue()))) == [
+            ["asset_id", "site_id", "2021-03-28", "2021-03-29"],
+            ["1", "1", "Available", ""]]
+
+    def test_numpy(self):
+        numpy = pytest.importorskip("numpy")
+        matrix = make_avail(1, datetime(2021, 3, 1)).status_matrix()
+        array = matrix.to_numpy()
+        assert array.shape == (1, 28)
+        assert array.dtype == numpy.uint8
+        assert int(array.sum()) == 28
+        table = to_numpy(matrix.columns())
+        assert table["asset_id"][0] == 1
+        assert table["2021-03-01"].dtype == numpy.uint8
+
+    def test_parquet(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        from pyarrow.parquet import read_table
+        matrix = make_avail(1, datetime(2021, 3, 1)).status_matrix()
+        assert to_arrow(matrix.columns()).num_rows == 1
+        where = str(tmp_path / "nights.parquet")
+        write_parquet(matrix.columns(), where)
+        table = read_table(where)
+        assert table.column("2021-03-01").to_pylist() == [1]
+        assert table.column("site_id").to_pylist() == ["1"]
@@ -0,0 +1,90 @@
+from .facilities import Facility, FacilityCatalog, distance_miles
+from .ridb import RIDBStore
+from .synthetic import campsite_records
+from .test_ridb import export
+from random import Random
+import pytest
+
+
+def facilities(count: int, seed: int = 0) -> [Facility]:
+    rng = Random(seed)
+    return [Facility(i, f"Campground {i}", rng.uniform(-89, 89),
+                     rng.uniform(-180, 180), "Campground", True)
+            for i in range(1, count + 1)]
+
+
+class TestFacilityCatalog:
+    sites = facilities(3000)
+    catalog = FacilityCatalog(sites, cell_degrees=2)
+
+    def test_distance(self):
+        # Denver to Boulder is about 25 miles.
+        assert 23 < distance_miles(39.74, -104.99, 40.01, -105.27) < 27
+        assert distance_miles(0, 179.9, 0, -179.9) < 14
+
+    @pytest.mark.parametrize("lat,lon,miles", [
+        (40, -105, 300), (0, 179.5, 500), (0, -179.5, 500), (88, 0, 400),
+        (-60, 20, 2000), (10, 10, 20000)])
+    def test_within_matches_brute_force(self, lat, lon, miles):
+        expected = sorted(
+            (distance_miles(lat, lon, x.latitude, x.longitude), x.facility_id)
+            for x in self.sites
+            if distance_miles(lat, lon, x.latitude, x.longitude) <= miles)
+        found = self.catalog.within_distances(lat, lon, miles)
+        assert [(d, x.facility_id) for d, x in found] == expected
+        assert self.catalog.within(lat, lon, miles) == [x for _, x in found]
+
+    @pytest.mark.parametrize("box", [
+        (30, -110, 45, -95), (-10, 170, 10, -170), (-90, -180, 90, 180),
+        (-25.35, 84.71, -19.58, 10.0), (-40, 179.5, 40, 179.4)])
+    # 0.7, 7 and 17 don't divide 360, so the last column is narrower.
+    @pytest.mark.parametrize("cell_degrees", [2, 0.7, 7, 17])
+    def test_bbox_matches_brute_force(self, box, cell_degrees):
+        south, west, north, east = box
+        catalog = FacilityCatalog(self.sites, cell_degrees=cell_degrees)
+
+        def inside(x):
+            in_lon = west <= x.longitude <= east if west <= east else \
+                x.longitude >= west or x.longitude <= east
+            return south <= x.latitude <= north and in_lon
+        assert catalog.in_bbox(*box) == \
+            [x for x in self.sites if inside(x)]
+
+    @pytest.mark.parametrize("cell_degrees", [0.7, 7, 17])
+    def test_box_edges_with_uneven_cells(self, cell_degrees):
+        edges = [Facility(1, "East edge", -20, 9.9, "Campground", True),
+                 Facility(2, "West edge", -20, 84.8, "Campground", True),
+                 Facility(3, "Antimeridian", -20, 179.9, "Campground", True),
+                 Facility(4, "Outside", -20, 50, "Campground", True)]
+        catalog = FacilityCatalog(edges, cell_degrees=cell_degrees)
+        assert [x.facility_id for x in catalog.in_bbox(
+            -25.35, 84.71, -19.58, 10.0)] == [1, 2, 3]
+
+    def test_no_location(self):
+        catalog = FacilityCatalog.from_records([
+            {"FacilityID": "1", "FacilityLatitude": 0,
+             "FacilityLongitude": 0},
+            {"FacilityID": "2", "FacilityLatitude": "",
+             "FacilityLongitude": ""},
+            {"FacilityID": "3", "FacilityName": "Here",
+             "FacilityLatitude": 40.3, "FacilityLongitude": -105.6}])
+        assert len(catalog) == 1 and 3 in catalog
+
+    def test_tasks(self):
+        near = self.catalog.within(40, -105, 300)
+        tasks = FacilityCatalog.tasks(near, {"start_date": None})
+        assert [x["asset_id"] for x in tasks] == \
+            [x.facility_id for x in near]
+        assert tasks[0]["name"] == near[0].name
+        assert tasks[0]["campsite_filters"] == {}
+
+    def test_from_store(self, tmp_path):
+        with RIDBStore(str(tmp_path / "ridb.sqlite3")) as store:
+            store.load_export(export(str(tmp_path / "export.zip"),
+                                     campsite_records(3, facility_id=7)))
+            catalog = FacilityCatalog.from_store(store)
+            assert list(catalog.facilities) == [7]
+            assert catalog.within(40.3, -105.6, 1)[0].name == "Seven"
+            # 9 has no campsites or location.
+            assert len(FacilityCatalog.from_store(store,
+                                                  campgrounds=False)) == 1
@@ -0,0 +1,91 @@
+from . import availability, campsites
+from ._requests import RecgovSession, ResponseCache, RetryPolicy, \
+    SessionPaginator
+from .availability import Availability
+from .campsites import get_campsites
+from .fakeserver import FakeRecgov
+from datetime import datetime
+import pytest
+import requests
+
+
+def session(cls=RecgovSession, **kwargs):
+    sess = cls()
+    sess.retry_policy = RetryPolicy(sleep=lambda x: None, **kwargs)
+    return sess
+
+
+class TestFakeRecgov:
+    def test_scan(self):
+        with FakeRecgov(assets=3, sites=120, first_asset=5) as server, \
+                server.pointed_at():
+            assert campsites.campsites_url(6).startswith(server.ridb_url)
+            sites = get_campsites(6, session=session(SessionPaginator))
+            assert len(sites) == 120
+            av = Availability(6, session=session(), campsites=sites)
+            av.retrieve_months([datetime(2021, 7, 1), datetime(2021, 8, 1)],
+                               {}, max_workers=2)
+            assert set(av) == set(sites)
+            stays = [x for site in av.values() for x in site.availabilities]
+            assert any(x.startswith("2021-08") for x in stays)
+            assert server.hits["ridb"] == 3
+            assert server.hits["month"] == 2
+        assert availability.RECGOV != server.url
+
+    def test_errors(self):
+        with FakeRecgov(assets=1) as server:
+            url = server.url + "/api/camps/availability/campground/{}/month"
+            good = {"start_date": "2021-07-01T00:00:00.000Z"}
+            assert requests.get(url.format(1), params=good).ok
+            assert requests.get(url.format(2), params=good) \
+                .status_code == 404
+            assert requests.get(url.format(1), params={
+                "start_date": "2021-07-02T00:00:00.000Z"}).status_code == 400
+            assert requests.get(server.url + "/nope").status_code == 404
+            page = requests.get(server.ridb_url + "/facilities/1/campsites",
+                                params={"limit": 500}).json()
+            assert len(page["RECDATA"]) == 50
+
+    def test_etag(self):
+        with FakeRecgov(assets=1) as server:
+            url = server.url + "/api/camps/availability/campground/1/month"
+            params = {"start_date": "2021-07-01T00:00:00.000Z"}
+            first = requests.get(url, params=params)
+            again = requests.get(url, params=params, headers={
+                "If-None-Match": first.headers["ETag"]})
+            assert again.status_code == 304
+            assert server.hits["not_modified"] == 1
+
+    def test_throttle(self):
+        with FakeRecgov(assets=1, throttle=0.5, retry_after=0.01) as server, \
+                server.pointed_at():
+            av = Availability(1, session=session(max_retries=20),
+                              campsites={})
+            for month in range(1, 13):
+                av.get_month_dict(datetime(2021, month, 1))
+            assert server.hits["throttled"] > 0
+            assert server.hits["month"] == 12
+
+    def test_cached_months_stream(self):
+        with FakeRecgov(assets=1, sites=30) as server, server.pointed_at():
+            sess = session()
+            sess.response_cache = ResponseCache(ttl=60)
+            first = Availability(1, session=sess, campsites={})
+            first.retrieve_month(datetime(2021, 7, 1), {})
+            # The second one is a cache hit, read through JSONStream.
+            again = Availability(1, session=sess, campsites={})
+            again.retrieve_month(datetime(2021, 7, 1), {})
+            assert server.hits["month"] == 1
+            assert sess.response_cache.hits == 1
+            assert dict(again) == dict(first) and len(again) == 30
+
+    def test_page_shortfall(self):
+        with FakeRecgov(assets=1, sites=120, page_shortfall=3) as server, \
+                server.pointed_at():
+            with pytest.raises(ValueError):
+                get_campsites(1, session=session(SessionPaginator))
+
+    def test_latency(self):
+        with FakeRecgov(assets=1, latency=(0.01, 0.02)) as server:
+            resp = requests.get(server.ridb_url + "/facilities/1/campsites")
+            assert resp.elapsed.total_seconds() >= 0.01
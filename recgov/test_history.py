@@ -0,0 +1,118 @@
+from .availability import Availability
+from .campsites import CampsiteSet
+from .history import Change, HistoryStore
+from .snapshots import snapshot_month
+from .test_availability import month_dict
+from datetime import date, datetime, timedelta, timezone
+import pytest
+
+T0 = datetime(2021, 2, 1, 12, tzinfo=timezone.utc)
+T1 = T0 + timedelta(minutes=5)
+T2 = T1 + timedelta(minutes=5)
+
+
+@pytest.fixture
+def make_avail():
+    def make(*changes):
+        avail = Availability(1, campsites=CampsiteSet())
+        for month in [datetime(2021, 3, 1), datetime(2021, 4, 1)]:
+            avail.merge_availabilities(month_dict(month)['campsites'])
+        for key, status in changes:
+            avail["1"]["availabilities"][key] = status
+        return avail
+    return make
+
+
+@pytest.fixture
+def history(tmp_path):
+    with HistoryStore(str(tmp_path / "history.sqlite3")) as store:
+        yield store
+
+
+class TestHistoryStore:
+    def test_only_changes_are_kept(self, history, make_avail):
+        first = history.record(make_avail(), observed_at=T0)
+        assert len(first) == 56
+        assert first[0] == Change(1, "1", date(2021, 3, 1), None,
+                                  "Available", T0)
+        assert history.record(make_avail(), observed_at=T1) == []
+        changes = history.record(
+            make_avail(("2021-03-05T00:00:00Z", "Reserved")), observed_at=T2)
+        assert changes == [Change(1, "1", date(2021, 3, 5), "Available",
+                                  "Reserved", T2)]
+        count = history._db.execute(
+            "SELECT count(*) FROM observations").fetchone()[0]
+        assert count == 57
+
+    def test_changes(self, history, make_avail):
+        history.record(make_avail(("2021-03-05T00:00:00Z", "Reserved")),
+                       observed_at=T0)
+        history.record(make_avail(), observed_at=T1)
+        history.record(make_avail(("2021-04-02T00:00:00Z", "Reserved")),
+                       observed_at=T2)
+        assert history.changes(1, since=T1) == [
+            Change(1, "1", date(2021, 3, 5), "Reserved", "Available", T1),
+            Change(1, "1", date(2021, 4, 2), "Available", "Reserved", T2)]
+        assert history.changes(1, since=T1, to_status="Reserved") == [
+            Change(1, "1", date(2021, 4, 2), "Available", "Reserved", T2)]
+        assert history.changes(1, site_id="2") == []
+        assert history.changes(2) == []
+
+    def test_open_counts(self, history, make_avail):
+        history.record(make_avail(("2021-03-05T00:00:00Z", "Reserved"),
+                                  ("2021-03-06T00:00:00Z", "Reserved")),
+                       observed_at=T0)
+        history.record(make_avail(), observed_at=T1)
+        assert history.open_counts(1) == {"1": 2}
+        # 2021-03-05 was a Friday.
+        assert history.open_counts(1, weekday=4) == {"1": 1}
+        assert history.open_counts(1, since=T2) == {}
+
+    def test_availability(self, history, make_avail):
+        history.record(make_avail(("2021-03-05T00:00:00Z", "Reserved")),
+                       observed_at=T0)
+        history.record(make_avail(), observed_at=T1)
+        now = history.availability(1)
+        then = history.availability(1, at=T0)
+        key = "2021-03-05T00:00:00Z"
+        assert now["1"]["availabilities"][key] == "Available"
+        assert then["1"]["availabilities"][key] == "Reserved"
+        assert len(then["1"]["availabilities"]) == 56
+        assert len(history.availability(1, at=T0 - timedelta(1))) == 0
+        opened = history.openings(1)
+        assert dict(opened["1"]["availabilities"]) == {key: "Available"}
+
+    def test_prune(self, history, make_avail):
+        history.record(make_avail(("2021-03-05T00:00:00Z", "Reserved")),
+                       observed_at=T0)
+        history.record(make_avail(), observed_at=T1)
+        assert history.prune(T1) == 56
+        assert len(history.changes(1)) == 1
+        assert len(history.availability(1)["1"]["availabilities"]) == 56
+
+    def test_digests_use_stored_codes(self, history, make_avail):
+        # Another process gave the store its codes, so ours don't match.
+        history._code("Closed")
+        avail = make_avail(("2021-03-05T00:00:00Z", "Reserved"))
+        history.record(avail, observed_at=T0)
+        month = datetime(2021, 3, 1)
+        stored = history._db.execute(
+            "SELECT digest FROM months WHERE month = ?",
+            (month.toordinal(), )).fetchone()[0]
+        assert stored == snapshot_month(avail, month,
+                                        history._to_store()).digest
+        assert stored != snapshot_month(avail, month).digest
+
+    def test_two_stores_one_file(self, tmp_path, make_avail):
+        filename = str(tmp_path / "history.sqlite3")
+        with HistoryStore(filename) as first, \
+                HistoryStore(filename) as second:
+            first.record(make_avail(), observed_at=T0)
+            second.record(make_avail(("2021-03-05T00:00:00Z", "Reserved")),
+                          observed_at=T1)
+            key = "2021-03-05T00:00:00Z"
+            assert first.availability(1)["1"]["availabilities"][key] == \
+                "Reserved"
+            assert first.changes(1, to_status="Reserved") == [
+                Change(1, "1", date(2021, 3, 5), "Available", "Reserved",
+                       T1)]
@@ -0,0 +1,42 @@
+"""Guards the cost of `import recgov`.
+
+Run this file directly to print how long the import takes.
+"""
+from subprocess import check_output
+import json
+import sys
+
+# Generous enough for slow CI machines; importing requests is most of it.
+IMPORT_BUDGET = 1.0
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import recgov
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed,
+                  "fake_useragent": "fake_useragent" in sys.modules}))
+"""
+
+
+def measure_import() -> dict:
+    """Imports recgov in a fresh interpreter and reports what it cost."""
+    return json.loads(check_output([sys.executable, "-c", _PROBE]))
+
+
+class TestImport:
+    result = None
+
+    def setup_method(self):
+        if TestImport.result is None:
+            TestImport.result = measure_import()
+
+    def test_no_user_agent_on_import(self):
+        assert not self.result["fake_useragent"]
+
+    def test_import_time(self):
+        assert self.result["seconds"] < IMPORT_BUDGET
+
+
+if __name__ == "__main__":
+    print(measure_import())
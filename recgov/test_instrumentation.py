@@ -0,0 +1,140 @@
+from . import instrumentation
+from ._requests import RecgovSession, ResponseCache, RetryPolicy
+from .availability import Availability
+from .campsites import CampsiteSet
+from .instrumentation import CacheEvent, Metrics, RequestEvent, StageEvent, \
+    stage
+from .streaming import JSONStream
+from .test_availability import month_dict
+from .test_requests import make_response
+from datetime import datetime
+from requests.adapters import BaseAdapter
+import pytest
+
+
+@pytest.fixture
+def events():
+    events = []
+    instrumentation.add_hook(events.append)
+    yield events
+    instrumentation.remove_hook(events.append)
+
+
+class Adapter(BaseAdapter):
+    """Fails the first request with a 503, then says ok."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        resp = make_response(503 if self.sent == 1 else 200, b'{"a": 1}',
+                             {"Content-Length": "8"})
+        resp.request, resp.url = request, request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def session() -> RecgovSession:
+    sess = RecgovSession()
+    sess.retry_policy = RetryPolicy(sleep=lambda x: None)
+    sess.response_cache = ResponseCache(ttl=60)
+    sess.mount("https://", Adapter())
+    return sess
+
+
+class TestHooks:
+    def test_off(self):
+        assert not instrumentation.enabled()
+        assert stage("anything") is instrumentation._NOOP
+
+    def test_requests_and_cache(self, events):
+        sess = session()
+        sess.get("https://example.com/month")
+        sess.get("https://example.com/month")
+        requests = [x for x in events if isinstance(x, RequestEvent)]
+        assert [x.status for x in requests] == [503, 200]
+        assert requests[1].host == "example.com"
+        assert requests[1].path == "/month"
+        assert requests[1].bytes == 8
+        assert [x.outcome for x in events if isinstance(x, CacheEvent)] == \
+            ["miss", "hit"]
+
+    def test_streamed_requests_report_on_close(self, events):
+        body = b'{"a": [1, 2, 3]}'
+
+        class Streaming(Adapter):
+            def send(self, request, **kwargs):
+                resp = make_response(200, body)
+                resp._content, resp._content_consumed = False, False
+                resp.request, resp.url = request, request.url
+                return resp
+
+        sess = session()
+        sess.response_cache = None
+        sess.mount("https://", Streaming())
+        with sess.get("https://example.com/month", stream=True) as resp:
+            assert events == []
+            assert list(JSONStream.from_response(resp).iter_field("a")) == \
+                [1, 2, 3]
+        assert [x.bytes for x in events] == [len(body)]
+
+    def test_stages(self, events):
+        avail = Availability(1, campsites=CampsiteSet())
+        avail.merge_availabilities(month_dict(datetime(2021, 3, 1))
+                                   ['campsites'])
+        with pytest.raises(KeyError):
+            with stage("mine"):
+                raise KeyError()
+        assert [(x.stage, x.ok) for x in events] == [("merge", True),
+                                                     ("mine", False)]
+        assert all(x.seconds >= 0 for x in events)
+
+    def test_remove(self, events):
+        instrumentation.remove_hook(events.append)
+        with stage("mine"):
+            pass
+        assert events == []
+
+
+class TestMetrics:
+    def test_prometheus(self):
+        metrics = Metrics(buckets=[0.1, 1])
+        metrics(RequestEvent("GET", "example.com", "/", 200, 0.5, 100))
+        metrics(RequestEvent("GET", "example.com", "/", None, 2.0, None))
+        metrics(CacheEvent("example.com", "hit"))
+        metrics(StageEvent("merge", 0.25, True))
+        metrics(StageEvent("merge", 0.25, False))
+        text = metrics.prometheus()
+        for line in [
+                'recgov_requests_total{host="example.com",method="GET",'
+                'status="200"} 1',
+                'recgov_requests_total{host="example.com",method="GET",'
+                'status="error"} 1',
+                'recgov_request_duration_seconds_bucket{host="example.com",'
+                'le="0.1"} 0',
+                'recgov_request_duration_seconds_bucket{host="example.com",'
+                'le="1"} 1',
+                'recgov_request_duration_seconds_bucket{host="example.com",'
+                'le="+Inf"} 2',
+                'recgov_request_duration_seconds_sum{host="example.com"} 2.5',
+                'recgov_response_bytes_total{host="example.com"} 100',
+                'recgov_cache_lookups_total{host="example.com",'
+                'outcome="hit"} 1',
+                'recgov_stage_duration_seconds_sum{stage="merge"} 0.5',
+                'recgov_stage_duration_seconds_count{stage="merge"} 2',
+                'recgov_stage_errors_total{stage="merge"} 1',
+                '# TYPE recgov_request_duration_seconds histogram']:
+            assert line in text.splitlines()
+
+    def test_install(self):
+        metrics = Metrics().install()
+        try:
+            session().get("https://example.com/month")
+        finally:
+            metrics.uninstall()
+        assert sum(metrics.requests.values()) == 2
+        assert not instrumentation.enabled()
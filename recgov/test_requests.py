@@ -0,0 +1,286 @@
+from ._requests import SessionPaginator, ResponseCache, \
+    MemoryCacheBackend, DiskCacheBackend, RetryPolicy, CircuitOpenError, \
+    RecgovSession
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError
+from io import BytesIO
+from json import dumps
+from os import listdir, utime
+from threading import Lock
+from time import sleep, time
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size=1):
+        content = dumps(self.data).encode("utf-8")
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def ridb_get(total: int, delay: float = 0, short_by: int = 0):
+    """Builds a fake RIDB get for a listing of `total` records."""
+    lock = Lock()
+    state = {"active": 0, "peak": 0, "offsets": []}
+
+    def get(url, params=None, **kwargs):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["offsets"].append(params["offset"])
+        offset, limit = params["offset"], params["limit"]
+        # Later pages come back first.
+        sleep(delay * (total - offset) / max(total, 1))
+        records = [{"id": x}
+                   for x in range(offset, min(offset + limit, total))]
+        if offset and short_by:
+            records = records[short_by:]
+        with lock:
+            state["active"] -= 1
+        return FakeResponse({
+            "RECDATA": records,
+            "METADATA": {"RESULTS": {"CURRENT_COUNT": len(records),
+                                     "TOTAL_COUNT": total}}})
+    return get, state
+
+
+class TestSessionPaginator:
+    def test_records_in_order(self):
+        sess = SessionPaginator()
+        sess.get, state = ridb_get(1234, delay=0.05)
+        records = list(sess.get_record_iterator("url", page_size=100,
+                                                max_workers=4))
+        assert [x["id"] for x in records] == list(range(1234))
+        assert sorted(state["offsets"]) == list(range(0, 1234, 100))
+        assert state["peak"] == 4
+
+    def test_single_page(self):
+        sess = SessionPaginator()
+        sess.get, state = ridb_get(7)
+        assert len(list(sess.get_record_iterator("url"))) == 7
+        assert state["offsets"] == [0]
+
+    def test_empty(self):
+        sess = SessionPaginator()
+        sess.get, state = ridb_get(0)
+        assert list(sess.get_record_iterator("url")) == []
+
+    def test_count_mismatch(self):
+        sess = SessionPaginator()
+        sess.get, state = ridb_get(120, short_by=1)
+        with pytest.raises(ValueError):
+            list(sess.get_record_iterator("url"))
+
+
+def make_response(status: int, content: bytes = b"", headers=None):
+    resp = Response()
+    resp.status_code = status
+    resp._content = content
+    resp.raw = BytesIO(content)
+    resp.headers.update(headers or {})
+    return resp
+
+
+class Server:
+    """Answers like a server that supports conditional requests."""
+
+    def __init__(self, etag="v1"):
+        self.etag = etag
+        self.requests = []
+
+    def send(self, headers):
+        self.requests.append(headers)
+        if headers.get("If-None-Match") == self.etag:
+            return make_response(304)
+        return make_response(200, b'{"etag": "%s"}' % self.etag.encode(),
+                             {"ETag": self.etag})
+
+
+class TestResponseCache:
+    key = ResponseCache.key("https://example.com/month",
+                            {"start_date": "2021-03-01T00:00:00.000Z"})
+
+    def test_key(self):
+        assert self.key == "https://example.com/month?" \
+            "start_date=2021-03-01T00%3A00%3A00.000Z"
+
+    def test_fresh_hit(self):
+        cache, server = ResponseCache(ttl=60), Server()
+        assert cache.fetch(self.key, server.send).json() == {"etag": "v1"}
+        assert cache.fetch(self.key, server.send).json() == {"etag": "v1"}
+        assert len(server.requests) == 1
+        assert cache.stats == {"hits": 1, "misses": 1, "revalidations": 0,
+                               "hit_rate": 0.5}
+
+    @pytest.mark.parametrize("backend", ["memory", "disk"])
+    def test_revalidation(self, backend, tmp_path):
+        backend = MemoryCacheBackend() if backend == "memory" \
+            else DiskCacheBackend(str(tmp_path))
+        cache, server = ResponseCache(backend, ttl=0), Server()
+        cache.fetch(self.key, server.send)
+        # Stale, but the server says it's unchanged.
+        assert cache.fetch(self.key, server.send).json() == {"etag": "v1"}
+        assert server.requests[-1] == {"If-None-Match": "v1"}
+        assert cache.revalidations == 1
+        # Now it changed.
+        server.etag = "v2"
+        assert cache.fetch(self.key, server.send).json() == {"etag": "v2"}
+        assert cache.stats["misses"] == 2
+
+    def test_errors_are_not_cached(self):
+        cache = ResponseCache(ttl=60)
+        cache.fetch(self.key, lambda headers: make_response(503))
+        assert len(cache.backend) == 0
+
+    def test_lru(self):
+        backend = MemoryCacheBackend(maxsize=2)
+        cache, server = ResponseCache(backend), Server()
+        for key in ["a", "b", "a", "c"]:
+            cache.fetch(key, server.send)
+        assert backend.get("a") is not None
+        assert backend.get("b") is None
+
+    def test_disk_lru(self, tmp_path):
+        backend = DiskCacheBackend(str(tmp_path), maxsize=2)
+        cache, server = ResponseCache(backend), Server()
+        for key in ["a", "b"]:
+            cache.fetch(key, server.send)
+        old = time() - 60
+        utime(backend._path("b"), (old, old))
+        cache.fetch("c", server.send)
+        assert backend.get("a") is not None
+        assert backend.get("b") is None
+        assert len(listdir(tmp_path)) == 2
+
+    def test_corrupt_disk_entries_are_misses(self, tmp_path):
+        backend = DiskCacheBackend(str(tmp_path))
+        cache, server = ResponseCache(backend, ttl=60), Server()
+        cache.fetch(self.key, server.send)
+        with open(backend._path(self.key), "r+b") as fh:
+            fh.truncate(10)
+        assert backend.get(self.key) is None
+        assert listdir(tmp_path) == []
+        assert cache.fetch(self.key, server.send).json() == {"etag": "v1"}
+        assert len(server.requests) == 2
+
+
+class Replay:
+    """Hands out canned responses (or raises canned exceptions) in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        resp = self.responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+
+class TestRetryPolicy:
+    def policy(self, **kwargs):
+        sleeps = []
+        return RetryPolicy(sleep=sleeps.append, **kwargs), sleeps
+
+    def test_retries_then_succeeds(self):
+        policy, sleeps = self.policy(backoff_factor=1)
+        replay = Replay(make_response(503), ConnectionError(),
+                        make_response(200))
+        assert policy.send("host", replay).status_code == 200
+        assert replay.calls == 3
+        assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+    def test_retry_after(self):
+        policy, sleeps = self.policy()
+        replay = Replay(
+            make_response(429, headers={"Retry-After": "7"}),
+            make_response(429, headers={
+                "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+            make_response(200))
+        policy.send("host", replay)
+        assert sleeps == [7, 0]
+
+    def test_gives_up(self):
+        policy, sleeps = self.policy(max_retries=2)
+        replay = Replay(*[make_response(500)] * 3)
+        assert policy.send("host", replay).status_code == 500
+        assert len(sleeps) == 2
+        with pytest.raises(ConnectionError):
+            policy.send("other", Replay(*[ConnectionError()] * 3))
+
+    def test_client_errors_are_not_retried(self):
+        policy, sleeps = self.policy()
+        assert policy.send("host", Replay(make_response(404))
+                           ).status_code == 404
+        assert sleeps == []
+
+    def test_circuit_breaker(self):
+        policy, sleeps = self.policy(max_retries=0, failure_threshold=2,
+                                     reset_timeout=60)
+        policy.send("host", Replay(make_response(503)))
+        policy.send("host", Replay(make_response(503)))
+        with pytest.raises(CircuitOpenError):
+            policy.send("host", Replay(make_response(200)))
+        # Other hosts don't care.
+        assert policy.send("other", Replay(make_response(200)))
+        # After the timeout, one request gets through and closes it.
+        breaker = policy.breaker("host")
+        breaker.opened_at -= 60
+        policy.send("host", Replay(make_response(200)))
+        assert not breaker.is_open
+
+    def test_throttling_keeps_circuit_closed(self):
+        policy, sleeps = self.policy(max_retries=4, failure_threshold=5)
+        replay = Replay(*[make_response(429, headers={"Retry-After": "1"})]
+                        * 5)
+        assert policy.send("host", replay).status_code == 429
+        assert not policy.breaker("host").is_open
+        assert policy.breaker("host").failures == 0
+
+    def test_retries_count_once(self):
+        policy, sleeps = self.policy(max_retries=4, failure_threshold=2)
+        policy.send("host", Replay(*[make_response(503)] * 5))
+        assert policy.breaker("host").failures == 1
+        assert not policy.breaker("host").is_open
+
+
+class TestRecgovSession:
+    def test_policy_applies_to_requests(self):
+        seen = []
+
+        class Adapter(BaseAdapter):
+            def send(self, request, **kwargs):
+                seen.append(kwargs["timeout"])
+                resp = make_response(503 if len(seen) < 3 else 200)
+                resp.request, resp.url = request, request.url
+                return resp
+
+            def close(self):
+                pass
+
+        sess = RecgovSession()
+        sess.retry_policy = RetryPolicy(timeout=3, sleep=lambda x: None)
+        sess.mount("https://", Adapter())
+        assert sess.get("https://example.com").status_code == 200
+        assert seen == [3, 3, 3]
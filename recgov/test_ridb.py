@@ -0,0 +1,105 @@
+from .campsites import get_campsites
+from .ridb import RIDBStore
+from .synthetic import campsite_records
+from zipfile import ZipFile
+import csv
+import io
+import pytest
+
+CAMPSITE_COLUMNS = ["CampsiteID", "FacilityID", "CampsiteName",
+                    "CampsiteType", "TypeOfUse", "Loop", "CampsiteAccessible",
+                    "CampsiteLongitude", "CampsiteLatitude", "CreatedDate",
+                    "LastUpdatedDate"]
+
+
+def to_csv(columns, rows) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def export(filename, records):
+    """Writes records out the way RIDB's full export has them."""
+    sites = [dict(x, CampsiteAccessible=str(x["CampsiteAccessible"]).lower())
+             for x in records]
+    attributes = [dict(x, EntityID=site["CampsiteID"], EntityType="Campsite",
+                       AttributeID=i)
+                  for site in records
+                  for i, x in enumerate(site["ATTRIBUTES"])]
+    attributes.append({"AttributeName": "Checkin Time", "EntityID": "1",
+                       "EntityType": "Facility", "AttributeValue": "2pm"})
+    equipment = [dict(x, EntityID=site["CampsiteID"], EntityType="Campsite")
+                 for site in records for x in site["PERMITTEDEQUIPMENT"]]
+    facilities = [{"FacilityID": "7", "FacilityName": "Seven",
+                   "FacilityLatitude": "40.3", "FacilityLongitude": "-105.6",
+                   "Reservable": "true", "Enabled": "true"},
+                  {"FacilityID": "9", "FacilityName": "No sites"}]
+    with ZipFile(filename, "w") as zf:
+        zf.writestr("Campsites_API_v1.csv",
+                    "\ufeff" + to_csv(CAMPSITE_COLUMNS, sites))
+        zf.writestr("CampsiteAttributes_API_v1.csv", to_csv(
+            ["AttributeID", "AttributeName", "AttributeValue", "EntityID",
+             "EntityType"], attributes))
+        zf.writestr("PermittedEquipment_API_v1.csv", to_csv(
+            ["EquipmentName", "MaxLength", "EntityID", "EntityType"],
+            equipment))
+        zf.writestr("Facilities_API_v1.csv", to_csv(
+            ["FacilityID", "FacilityName", "FacilityTypeDescription",
+             "ParentRecAreaID", "FacilityLatitude", "FacilityLongitude",
+             "Reservable", "Enabled"], facilities))
+    return filename
+
+
+class TestRIDBStore:
+    records = campsite_records(30, facility_id=7) + \
+        campsite_records(5, facility_id=8)
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        store = RIDBStore(str(tmp_path / "ridb.sqlite3"))
+        counts = store.load_export(export(str(tmp_path / "export.zip"),
+                                          self.records))
+        assert counts["campsites"] == 35
+        assert counts["attributes"] == sum(len(x["ATTRIBUTES"])
+                                           for x in self.records)
+        yield store
+        store.close()
+
+    def test_records(self, store):
+        assert store.records(7) == self.records[:30]
+        assert store.loaded is not None
+
+    def test_get(self, store):
+        sites = store.get(8)
+        assert list(sites) == [x["CampsiteID"] for x in self.records[30:]]
+        assert sites.filter_by_equipment("Tent", 0) is not None
+        assert len(store.get(9)) == 0
+        assert store.get(10) is None
+        assert 7 in store and 10 not in store
+
+    def test_get_campsites(self, store):
+        class NoSession:
+            def get_record_iterator(self, url):
+                raise AssertionError("shouldn't ask RIDB")
+        sites = get_campsites(7, store=store, session=NoSession())
+        assert len(sites) == 30
+
+    def test_reload(self, store, tmp_path):
+        store.load_export(export(str(tmp_path / "small.zip"),
+                                 self.records[:2]))
+        assert len(store.get(7)) == 2
+        assert store.get(8) is None
+
+    def test_facilities(self, store):
+        facilities = store.facilities()
+        assert [x["facility_id"] for x in facilities] == [7, 9]
+        assert facilities[0]["campsites"] == 30
+        assert facilities[0]["latitude"] == 40.3
+
+    def test_not_an_export(self, tmp_path):
+        with ZipFile(str(tmp_path / "nope.zip"), "w") as zf:
+            zf.writestr("README.txt", "hi")
+        with RIDBStore(":memory:") as store, pytest.raises(ValueError):
+            store.load_export(str(tmp_path / "nope.zip"))
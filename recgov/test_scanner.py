@@ -0,0 +1,56 @@
+from . import scanner
+from .availability import Availability
+from .campsites import CampsiteSet
+from .scanner import BatchScanner
+from .test_availability import month_dict
+from .test_campsites import SORTED_CAMPSITES
+from collections import Counter
+from datetime import datetime, timezone
+from threading import Lock
+
+UTC = timezone.utc
+
+
+def task(name, asset_id, start, end):
+    return {"name": name, "asset_id": asset_id,
+            "campsite_filters": {},
+            "availability_filters": {
+                "start_date": datetime(2021, start, 1, tzinfo=UTC),
+                "end_date": datetime(2021, end, 28, tzinfo=UTC)}}
+
+
+class TestBatchScanner:
+    def test_scan(self, monkeypatch):
+        lock = Lock()
+        calls = Counter()
+        sites = CampsiteSet.from_list(
+            [dict(x, CampsiteID="1") for x in SORTED_CAMPSITES[:1]])
+
+        def get_campsites(asset_id, **kwargs):
+            with lock:
+                calls[asset_id] += 1
+            return sites
+
+        def get_month_dict(self, month):
+            with lock:
+                calls[(self.asset_id, month.month)] += 1
+            return month_dict(month)
+
+        monkeypatch.setattr(scanner, "get_campsites", get_campsites)
+        monkeypatch.setattr(Availability, "get_month_dict", get_month_dict)
+        tasks = [task("a", 1, 3, 4), task("b", 1, 4, 5), task("c", 2, 3, 3),
+                 dict(task("bad", 3, 3, 3), availability_filters={}),
+                 {"name": "no asset", "availability_filters": {}}]
+        results = {x.task["name"]: x
+                   for x in BatchScanner(session=object()).scan(tasks)}
+
+        assert calls == {1: 1, 2: 1, (1, 3): 1, (1, 4): 1, (1, 5): 1,
+                         (2, 3): 1}
+        assert isinstance(results["bad"].error, RuntimeError)
+        assert isinstance(results["no asset"].error, KeyError)
+        assert results["a"].error is None
+        assert results["a"].availability["1"].available_nights == 56
+        assert results["c"].campsites["1"].available_nights == 28
+        # The shared metadata wasn't touched.
+        assert sites["1"]["availabilities"] == \
+            SORTED_CAMPSITES[0]["availabilities"]
@@ -0,0 +1,206 @@
+from .scheduler import TokenBucket, PollScheduler
+from .snapshots import MonthSnapshot
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from threading import Event, Lock, Thread
+from time import sleep
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAvailability:
+    """Changes its months whenever `changing` says so."""
+
+    def __init__(self, asset_id, changing=()):
+        self.asset_id = asset_id
+        self.changing = set(changing)
+        self.version = {}
+        self.retrieved = []
+        self.polled = Event()
+
+    def retrieve_month(self, month, filters):
+        self.retrieved.append(month)
+        self.polled.set()
+        if month in self.changing or month not in self.version:
+            self.version[month] = self.version.get(month, 0) + 1
+
+    def snapshot(self, month):
+        return MonthSnapshot(self.version[month], {})
+
+
+class TestTokenBucket:
+    def test_burst_then_rate(self):
+        clock = Clock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+        assert all(bucket.try_acquire() for _ in range(3))
+        assert not bucket.try_acquire()
+        clock.now = 0.5
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        # Can't wait for a token that's a second away.
+        assert not bucket.acquire(timeout=0.1)
+
+    def test_bad_rates(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=1, capacity=-1)
+        assert TokenBucket(rate=0.5).capacity == 1
+
+    def test_threads_share_the_budget(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        bucket.acquire()
+        taken = []
+
+        def take():
+            for _ in range(5):
+                taken.append(bucket.acquire())
+
+        threads = [Thread(target=take) for _ in range(4)]
+        start = bucket.clock()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(taken) == 20
+        assert bucket.clock() - start >= 0.18
+
+
+class TestPollScheduler:
+    def make(self, **kwargs):
+        clock = Clock()
+        limiter = TokenBucket(rate=1000, clock=clock)
+        return clock, PollScheduler(limiter, min_interval=60,
+                                    max_interval=3600, clock=clock,
+                                    today=lambda: date(2021, 3, 1), **kwargs)
+
+    def test_near_months_poll_more_often(self):
+        clock, sched = self.make()
+        av = FakeAvailability(1)
+        near = sched.add(av, datetime(2021, 3, 1))
+        far = sched.add(av, datetime(2021, 6, 1))
+        assert sched.run_pending() == 2
+        assert near.interval == 60
+        assert far.interval == 60 * (1 + 92 / 30)
+
+    def test_backoff_and_reset(self):
+        clock, sched = self.make()
+        av = FakeAvailability(1)
+        job = sched.add(av, datetime(2021, 3, 1))
+        intervals = []
+        for _ in range(7):
+            clock.now = job.next_due
+            sched.run_pending()
+            intervals.append(job.interval)
+        assert intervals == [60, 120, 240, 480, 960, 960, 960]
+        av.changing.add(datetime(2021, 3, 1))
+        clock.now = job.next_due
+        sched.run_pending()
+        assert job.interval == 60
+        assert job.changes == 1
+
+    def test_priority_order_and_stats(self):
+        clock, sched = self.make()
+        av = FakeAvailability(1)
+        low = sched.add(av, datetime(2021, 5, 1))
+        high = sched.add(FakeAvailability(2), datetime(2021, 5, 1),
+                         priority=4)
+        clock.now = 30
+        assert sched.due() == [high, low]
+        stats = sched.stats()
+        assert stats["queue_depth"] == 2
+        assert stats["max_lag"] == 30
+        sched.run_pending()
+        assert sched.stats()["queue_depth"] == 0
+        assert sched.stats()["polls"] == 2
+
+    def test_one_month_of_an_availability_at_a_time(self):
+        clock, sched = self.make()
+        overlaps = []
+
+        class Slow(FakeAvailability):
+            def __init__(self, asset_id):
+                super().__init__(asset_id)
+                self.busy = Lock()
+
+            def retrieve_month(self, month, filters):
+                if not self.busy.acquire(blocking=False):
+                    overlaps.append(month)
+                    return super().retrieve_month(month, filters)
+                sleep(0.02)
+                super().retrieve_month(month, filters)
+                self.busy.release()
+
+        av = Slow(1)
+        for month in range(3, 7):
+            sched.add(av, datetime(2021, month, 1))
+        other = sched.add(Slow(2), datetime(2021, 3, 1))
+        assert other.lock is not sched.jobs[(1, datetime(2021, 3, 1))].lock
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            assert sched.run_pending(pool) == 5
+        assert len(av.retrieved) == 4
+        assert overlaps == []
+
+    def test_free_slots_go_to_the_most_useful_job(self):
+        clock, sched = self.make()
+        order, active, most = [], [], []
+        lock = Lock()
+
+        class Recording(FakeAvailability):
+            def retrieve_month(self, month, filters):
+                with lock:
+                    order.append(self.asset_id)
+                    active.append(self)
+                    most.append(len(active))
+                if self.asset_id == 1 and 9 not in order:
+                    # Becomes due while the first batch is still going.
+                    sched.add(Recording(9), month, priority=8)
+                sleep(0.01)
+                super().retrieve_month(month, filters)
+                with lock:
+                    active.remove(self)
+
+        for asset_id in range(1, 6):
+            sched.add(Recording(asset_id), datetime(2021, 3, 1),
+                      priority=2 if asset_id == 1 else 1)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            assert sched.run_pending(pool, max_workers=2) == 6
+        # 9 goes ahead of the jobs that were due before it.
+        assert order[0] == 1 and order.index(9) <= 2
+        assert max(most) == 2
+
+    def test_bad_priority(self):
+        clock, sched = self.make()
+        with pytest.raises(ValueError):
+            sched.add(FakeAvailability(1), datetime(2021, 3, 1), priority=0)
+        assert sched.jobs == {}
+
+    def test_errors_are_counted(self):
+        clock, sched = self.make()
+
+        class Broken(FakeAvailability):
+            def retrieve_month(self, month, filters):
+                raise RuntimeError("503")
+
+        sched.add(Broken(1), datetime(2021, 3, 1))
+        sched.run_pending()
+        assert sched.stats()["errors"] == 1
+
+    def test_run_stops(self):
+        sched = PollScheduler(TokenBucket(rate=1000))
+        av = FakeAvailability(1)
+        sched.add(av, datetime(2021, 3, 1))
+        stop = Event()
+        thread = Thread(target=sched.run, args=(stop, 2))
+        thread.start()
+        assert av.polled.wait(5)
+        stop.set()
+        thread.join(5)
+        assert not thread.is_alive()
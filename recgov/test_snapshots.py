@@ -0,0 +1,105 @@
+from . import availability
+from .availability import Availability
+from .campsites import CampsiteSet
+from .snapshots import SnapshotStore, Transition, covered_months
+from .test_availability import month_dict
+from datetime import date, datetime
+from os import listdir
+from pickle import dumps, loads
+from threading import Thread
+from zlib import compress, decompress
+import pytest
+
+SWAP = bytes([0, 2, 1]) + bytes(range(3, 256))
+
+
+@pytest.fixture
+def make_avail(monkeypatch):
+    monkeypatch.setattr(availability, "get_campsites",
+                        lambda *args, **kwargs: CampsiteSet({}))
+
+    def make(*changes):
+        avail = Availability(1)
+        for month in [datetime(2021, 3, 1), datetime(2021, 4, 1)]:
+            avail.merge_availabilities(month_dict(month)['campsites'])
+        for key, status in changes:
+            avail["1"]["availabilities"][key] = status
+        return avail
+    return make
+
+
+class TestSnapshotStore:
+    def test_first_diff_reports_everything(self, tmp_path, make_avail):
+        store = SnapshotStore(str(tmp_path))
+        transitions = store.diff(make_avail())
+        assert len(transitions) == 56
+        assert transitions[0] == Transition(1, "1", date(2021, 3, 1), None,
+                                            "Available")
+
+    def test_diff(self, tmp_path, make_avail):
+        store = SnapshotStore(str(tmp_path))
+        store.diff(make_avail(("2021-04-02T00:00:00Z", "Reserved")))
+        # Nothing changed.
+        assert store.diff(make_avail(
+            ("2021-04-02T00:00:00Z", "Reserved"))) == []
+        # A fresh store reads what the first one saved.
+        store = SnapshotStore(str(tmp_path))
+        avail = make_avail(("2021-03-05T00:00:00Z", "Reserved"))
+        assert store.diff(avail) == [
+            Transition(1, "1", date(2021, 3, 5), "Available", "Reserved"),
+            Transition(1, "1", date(2021, 4, 2), "Reserved", "Available")]
+
+    @pytest.mark.parametrize("data", [
+        b"garbage", compress(b"not a pickle"), compress(dumps(1)),
+        compress(dumps(1))[:5]], ids=["zlib", "pickle", "shape", "short"])
+    def test_corrupt_file_is_a_fresh_start(self, tmp_path, make_avail,
+                                           data):
+        (tmp_path / "1.snapshots").write_bytes(data)
+        store = SnapshotStore(str(tmp_path))
+        assert len(store.diff(make_avail())) == 56
+        assert SnapshotStore(str(tmp_path)).diff(make_avail()) == []
+
+    def test_threads_share_a_store(self, tmp_path, make_avail):
+        store = SnapshotStore(str(tmp_path))
+        avails = [make_avail(("2021-03-05T00:00:00Z", "Reserved")),
+                  make_avail()] * 4
+        threads = [Thread(target=store.diff, args=(x, )) for x in avails]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert listdir(tmp_path) == ["1.snapshots"]
+
+    def test_to_status(self, tmp_path, make_avail):
+        store = SnapshotStore(str(tmp_path))
+        store.diff(make_avail(("2021-04-02T00:00:00Z", "Reserved")))
+        avail = make_avail(("2021-03-05T00:00:00Z", "Reserved"))
+        assert store.diff(avail, to_status="Available") == [
+            Transition(1, "1", date(2021, 4, 2), "Reserved", "Available")]
+
+    def test_unchanged(self, tmp_path, make_avail):
+        store = SnapshotStore(str(tmp_path))
+        avail = make_avail()
+        store.diff(avail, months=[datetime(2021, 3, 1)])
+        assert store.unchanged(1, datetime(2021, 3, 1),
+                               avail.snapshot(datetime(2021, 3, 1)))
+        assert not store.unchanged(1, datetime(2021, 4, 1),
+                                   avail.snapshot(datetime(2021, 4, 1)))
+
+    def test_covered_months(self, make_avail):
+        assert covered_months(make_avail()) == [datetime(2021, 3, 1),
+                                                datetime(2021, 4, 1)]
+
+    def test_status_codes_remapped(self, tmp_path, make_avail):
+        """Snapshots written with different status codes still compare."""
+        store = SnapshotStore(str(tmp_path))
+        store.diff(make_avail())
+        path = tmp_path / "1.snapshots"
+        names, months = loads(decompress(path.read_bytes()))
+        # Swap the codes for "Available" and "Reserved".
+        names = (None, names[2], names[1]) + names[3:]
+        months = {k: (digest, {site: codes.translate(SWAP)
+                               for site, codes in sites.items()})
+                  for k, (digest, sites) in months.items()}
+        path.write_bytes(compress(dumps((names, months))))
+        assert SnapshotStore(str(tmp_path)).diff(make_avail()) == []
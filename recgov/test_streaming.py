@@ -0,0 +1,71 @@
+from .streaming import JSONStream
+from .test_availability import month_dict
+from datetime import datetime
+from io import BytesIO
+from json import dumps
+from requests import Response
+import pytest
+
+SITE = month_dict(datetime(2021, 3, 1))['campsites']['1']
+MONTH = {"campsites": {str(x): dict(SITE, campsite_id=str(x))
+                       for x in range(20)},
+         "count": 20}
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestJSONStream:
+    @pytest.mark.parametrize("size", [1, 3, 100, 1 << 20])
+    def test_object_field(self, size):
+        body = dumps(MONTH, indent=1).encode("utf-8")
+        stream = JSONStream(chunked(body, size))
+        assert dict(stream.iter_field("campsites")) == MONTH["campsites"]
+        assert stream.rest == {"count": 20}
+
+    @pytest.mark.parametrize("size", [1, 7])
+    def test_array_field(self, size):
+        page = {"RECDATA": [{"id": x, "name": "ñ"} for x in range(5)],
+                "METADATA": {"RESULTS": {"CURRENT_COUNT": 5,
+                                         "TOTAL_COUNT": 12345}}}
+        body = dumps(page, ensure_ascii=False).encode("utf-8")
+        stream = JSONStream(chunked(body, size))
+        assert list(stream.iter_field("RECDATA")) == page["RECDATA"]
+        assert stream.rest == {"METADATA": page["METADATA"]}
+
+    def test_numbers_split_across_chunks(self):
+        stream = JSONStream([b'{"a": [1, 2', b'3], "b": 4', b'5}'])
+        assert list(stream.iter_field("a")) == [1, 23]
+        assert stream.rest == {"b": 45}
+
+    def test_empty(self):
+        assert list(JSONStream([b"{}"]).iter_field("a")) == []
+        stream = JSONStream([b'{"a": {}}'])
+        assert list(stream.iter_field("a")) == []
+
+    def test_incremental(self):
+        consumed = []
+
+        def chunks():
+            for chunk in chunked(dumps(MONTH).encode("utf-8"), 64):
+                consumed.append(chunk)
+                yield chunk
+
+        members = JSONStream(chunks()).iter_field("campsites")
+        next(members)
+        assert len(consumed) < len(chunked(dumps(MONTH).encode("utf-8"),
+                                           64)) / 4
+
+    @pytest.mark.parametrize("body", [b'{"a": 1 "b": 2}', b'{"a": [1, 2',
+                                      b'[1]', b''])
+    def test_malformed(self, body):
+        with pytest.raises(ValueError):
+            list(JSONStream([body]).iter_field("a"))
+
+    def test_from_response(self):
+        resp = Response()
+        resp.status_code = 200
+        resp.raw = BytesIO(dumps(MONTH).encode("utf-8"))
+        stream = JSONStream.from_response(resp, chunk_size=10)
+        assert len(list(stream.iter_field("campsites"))) == 20
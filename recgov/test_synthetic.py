@@ -0,0 +1,45 @@
+from .availability import Availability
+from .campsites import CampsiteSet
+from .synthetic import campsite_records, month_response, month_responses, \
+    ridb_pages
+from datetime import datetime
+
+
+class TestSynthetic:
+    records = campsite_records(120, facility_id=7)
+
+    def test_records(self):
+        assert len(self.records) == 120
+        assert len(set(x["CampsiteID"] for x in self.records)) == 120
+        assert self.records[0]["FacilityID"] == "7"
+        sites = CampsiteSet.from_list(self.records)
+        assert sites.unique_campsite_types
+        assert sites.filter_by_loop("A")
+
+    def test_deterministic(self):
+        assert campsite_records(120, facility_id=7) == self.records
+        assert campsite_records(120, facility_id=7, seed=1) != self.records
+
+    def test_pages(self):
+        pages = ridb_pages(self.records, page_size=50)
+        assert [len(x["RECDATA"]) for x in pages] == [50, 50, 20]
+        assert pages[2]["METADATA"]["RESULTS"] == {"CURRENT_COUNT": 20,
+                                                   "TOTAL_COUNT": 120}
+        assert len(ridb_pages([])) == 1
+
+    def test_month(self):
+        month = month_response(self.records, datetime(2021, 2, 1))
+        assert month["count"] == 120
+        site = month["campsites"][self.records[0]["CampsiteID"]]
+        assert len(site["availabilities"]) == 28
+        assert "2021-02-28T00:00:00Z" in site["availabilities"]
+
+    def test_months_merge(self):
+        months = month_responses(self.records[:5], 3, datetime(2021, 11, 1))
+        assert list(months) == [datetime(2021, 11, 1), datetime(2021, 12, 1),
+                                datetime(2022, 1, 1)]
+        av = Availability(7, campsites=CampsiteSet())
+        for month in months.values():
+            av.merge_availabilities(month["campsites"])
+        assert len(av) == 5
+        assert all(len(x.calendar) == 30 + 31 + 31 for x in av.values())
@@ -1,5 +1,9 @@
-from .utils import next_month, this_month, tokenize, represents_int
+from .utils import next_month, this_month, tokenize, represents_int, \
+    month_range, SingleFlight
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from threading import Event
+import pytest
 
 class TestUtils:
     """Tests utils.
@@ -28,4 +32,51 @@ class TestUtils:
         good="124"
         assert represents_int(good)
         bad="123.14"
-        assert not represents_int(bad)
\ No newline at end of file
+        assert not represents_int(bad)
+
+    def test_month_range(self):
+        assert month_range(datetime(2021, 11, 15), datetime(2022, 2, 3)) == \
+            [datetime(2021, 11, 1), datetime(2021, 12, 1),
+             datetime(2022, 1, 1), datetime(2022, 2, 1)]
+
+
+class TestSingleFlight:
+    def run(self, func, callers=4):
+        """Calls func through one SingleFlight from several threads at
+        once.
+        """
+        flight, started, calls = SingleFlight(), Event(), []
+
+        def call():
+            calls.append(1)
+            started.set()
+            # Let the other callers pile up.
+            Event().wait(0.1)
+            return func()
+
+        with ThreadPoolExecutor(callers) as pool:
+            first = pool.submit(flight.do, "key", call)
+            started.wait()
+            rest = [pool.submit(flight.do, "key", call)
+                    for _ in range(callers - 1)]
+        assert len(calls) == 1
+        assert len(flight) == 0
+        return [first] + rest
+
+    def test_shared(self):
+        result = object()
+        futures = self.run(lambda: result)
+        assert [x.result() for x in futures] == \
+            [(result, False)] + [(result, True)] * 3
+
+    def test_errors_shared(self):
+        def fail():
+            raise ValueError("nope")
+        for future in self.run(fail):
+            with pytest.raises(ValueError):
+                future.result()
+
+    def test_one_after_another(self):
+        flight = SingleFlight()
+        assert flight.do("key", lambda: 1) == (1, False)
+        assert flight.do("key", lambda: 2) == (2, False)
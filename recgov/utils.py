@@ -1,6 +1,8 @@
 """Just a place to put some handy utility functions.
 """
+from concurrent.futures import Future
 from datetime import datetime, timedelta
+from threading import Lock
 
 # To find the next month easily: Add 31 days, then truncate back to day 1.
 
@@ -31,6 +33,24 @@ def next_month(month: datetime) -> datetime:
     return datetime((dt+_A_MONTH).year, (dt+_A_MONTH).month, 1)
 
 
+def month_range(start: datetime, end: datetime) -> [datetime]:
+    """List the first day of every month from start through end, inclusive.
+
+    :param start: a date in the first month
+    :type start: datetime
+    :param end: a date in the last month
+    :type end: datetime
+    :return: The first day of each month, in order.
+    :rtype: [datetime]
+    """
+    months = []
+    mo, last = this_month(start), this_month(end)
+    while mo <= last:
+        months.append(mo)
+        mo = next_month(mo)
+    return months
+
+
 def tokenize(string: str) -> [str]:
     """Tokenize a string.
 
@@ -55,3 +75,46 @@ def represents_int(s: str) -> bool:
         return True
     except ValueError:
         return False
+
+
+class SingleFlight:
+    """Lets threads asking for the same thing at the same time share one
+    call: the first caller for a key runs it, and the rest wait for its
+    result (or its exception).  Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs) -> tuple:
+        """Calls func(*args, **kwargs), or waits for the call already
+        running for key.
+
+        :param key: What's being fetched; must be hashable
+        :return: (result, shared), where shared is True if another caller
+            ran func.
+        :rtype: tuple
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result(), True
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+    def __len__(self) -> int:
+        """How many calls are in flight."""
+        return len(self._calls)